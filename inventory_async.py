@@ -0,0 +1,153 @@
+"""
+Asyncio facade for the inventory controller.
+Runs database work on dedicated executors so event-loop services can use it.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from inventory_controller import InventoryController
+
+
+class AsyncInventoryController:
+    """Async mirror of InventoryController.
+
+    Reads run in parallel on a pool of worker threads (each thread gets its
+    own pooled SQLite connection, and WAL lets them proceed alongside a
+    writer). Writes go to a single-thread executor so they are serialized.
+    A semaphore bounds the number of operations in flight.
+
+    Cancelling an awaiting coroutine frees its slot immediately. A database
+    call that has already started on a worker thread still runs to
+    completion; its result is discarded.
+    """
+
+    def __init__(self, controller=None, max_concurrency=16, read_workers=4):
+        """Wrap an existing controller or create a new one."""
+        self.controller = controller or InventoryController()
+        self._semaforo = asyncio.Semaphore(max_concurrency)
+        self._lectores = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="inventario-lectura")
+        self._escritor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inventario-escritura")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.shutdown()
+
+    async def _ejecutar(self, executor, func, *args, **kwargs):
+        async with self._semaforo:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    async def _leer(self, func, *args, **kwargs):
+        return await self._ejecutar(self._lectores, func, *args, **kwargs)
+
+    async def _escribir(self, func, *args, **kwargs):
+        return await self._ejecutar(self._escritor, func, *args, **kwargs)
+
+    # Writes
+
+    async def add_product(self, nombre, cantidad, precio, stock_minimo=10):
+        """Add a new product after validation."""
+        return await self._escribir(self.controller.add_product, nombre, cantidad, precio, stock_minimo)
+
+    async def add_products_bulk(self, productos, chunk_size=None):
+        """Validate and insert many products."""
+        # Materialize here: the iterable must not be consumed on the worker thread
+        return await self._escribir(self.controller.add_products_bulk, list(productos), chunk_size)
+
+    async def upsert_products_bulk(self, productos, chunk_size=None):
+        """Validate a feed and insert or update products by name."""
+        return await self._escribir(self.controller.upsert_products_bulk, list(productos), chunk_size)
+
+    async def update_product(self, producto_id, nombre, cantidad, precio, stock_minimo=None):
+        """Update an existing product after validation."""
+        return await self._escribir(
+            self.controller.update_product, producto_id, nombre, cantidad, precio, stock_minimo
+        )
+
+    async def delete_product(self, producto_id):
+        """Delete a product."""
+        return await self._escribir(self.controller.delete_product, producto_id)
+
+    async def reprice_products(self, porcentaje=None, importe=None, filtro=None, ids=None):
+        """Reprice a filter or ID selection in one transaction."""
+        ids = list(ids) if ids is not None else None
+        return await self._escribir(self.controller.reprice_products, porcentaje, importe, filtro, ids)
+
+    async def set_minimum_stock(self, stock_minimo, filtro=None, ids=None):
+        """Set the minimum stock of a filter or ID selection."""
+        ids = list(ids) if ids is not None else None
+        return await self._escribir(self.controller.set_minimum_stock, stock_minimo, filtro, ids)
+
+    async def delete_products(self, filtro=None, ids=None):
+        """Delete a filter or ID selection in one transaction."""
+        ids = list(ids) if ids is not None else None
+        return await self._escribir(self.controller.delete_products, filtro, ids)
+
+    async def record_movements(self, movimientos, chunk_size=None, location_id=None):
+        """Apply a batch of stock movements."""
+        return await self._escribir(self.controller.record_movements, list(movimientos), chunk_size, location_id)
+
+    async def adjust_stock(self, producto_id, delta, tipo='ajuste'):
+        """Add a signed delta to a product's stock."""
+        return await self._escribir(self.controller.adjust_stock, producto_id, delta, tipo)
+
+    async def adjust_stock_bulk(self, ajustes, tipo='ajuste'):
+        """Apply many (producto_id, delta) adjustments atomically."""
+        return await self._escribir(self.controller.adjust_stock_bulk, list(ajustes), tipo)
+
+    async def transfer_stock(self, producto_id, origen_id, destino_id, cantidad):
+        """Move stock of a product between locations."""
+        return await self._escribir(self.controller.transfer_stock, producto_id, origen_id, destino_id, cantidad)
+
+    async def rebuild_statistics(self):
+        """Recompute the statistics summary table."""
+        return await self._escribir(self.controller.rebuild_statistics)
+
+    async def restore_database(self, backup_path):
+        """Restore database from backup."""
+        return await self._escribir(self.controller.restore_database, backup_path)
+
+    # Reads
+
+    async def get_products(self, filtro="", limit=None):
+        """Get all products, or the best full-text matches for a filter."""
+        return await self._leer(self.controller.get_products, filtro, limit)
+
+    async def get_products_page(self, after_key=None, limit=None, order_by='id', filtro=""):
+        """Get one keyset-paginated page of products."""
+        return await self._leer(self.controller.get_products_page, after_key, limit, order_by, filtro)
+
+    async def get_product_by_id(self, producto_id):
+        """Get a specific product by ID."""
+        return await self._leer(self.controller.get_product_by_id, producto_id)
+
+    async def get_statistics(self):
+        """Get inventory statistics."""
+        return await self._leer(self.controller.get_statistics)
+
+    async def get_low_stock_products(self, location_id=None):
+        """Get products with low stock."""
+        return await self._leer(self.controller.get_low_stock_products, location_id)
+
+    async def get_locations(self):
+        """Get every location with its stock rollup."""
+        return await self._leer(self.controller.get_locations)
+
+    async def get_stock_as_of(self, producto_id, fecha):
+        """Get a product's stock as it was on a given date."""
+        return await self._leer(self.controller.get_stock_as_of, producto_id, fecha)
+
+    async def backup_database(self, backup_path, progress=None):
+        """Create an online backup; it only reads, so writers keep going."""
+        return await self._leer(self.controller.backup_database, backup_path, progress)
+
+    async def shutdown(self):
+        """Wait for in-flight work, then shut down executors and the controller."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(self._escritor.shutdown, wait=True))
+        await loop.run_in_executor(None, functools.partial(self._lectores.shutdown, wait=True))
+        self.controller.shutdown()
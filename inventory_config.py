@@ -33,12 +33,53 @@ class Config:
         self.config_data = {
             "database": {
                 "name": "inventario.db",
-                "backup_folder": "backups"
+                "backend": "sqlite",
+                "backup_folder": "backups",
+                "batch_size": 1000,
+                "purge_after_days": 30,
+                "archive_name": "archive.db",
+                "archive_after_days": 365,
+                "vacuum_pages": 256,
+                "maintenance_interval_minutes": 15,
+                "auto_backup_interval_minutes": 60,
+                "auto_backup_times": ["02:00"],
+                "profile": "balanced",
+                "bulk_profile": "bulk-load",
+                "profiles": {
+                    "durable": {
+                        "journal_mode": "WAL",
+                        "synchronous": "FULL",
+                        "cache_size": -8000,
+                        "mmap_size": 0,
+                        "temp_store": "DEFAULT",
+                        "page_size": 4096
+                    },
+                    "balanced": {
+                        "journal_mode": "WAL",
+                        "synchronous": "NORMAL",
+                        "cache_size": -65536,
+                        "mmap_size": 268435456,
+                        "temp_store": "MEMORY",
+                        "page_size": 4096
+                    },
+                    "bulk-load": {
+                        "journal_mode": "WAL",
+                        "synchronous": "OFF",
+                        "cache_size": -262144,
+                        "mmap_size": 1073741824,
+                        "temp_store": "MEMORY",
+                        "page_size": 4096
+                    }
+                }
             },
             "ui": {
                 "theme": "superhero",
                 "geometry": "700x500",
-                "title": "Gestor de Inventario"
+                "title": "Gestor de Inventario",
+                "page_size": 200,
+                "search_limit": 200,
+                "result_cache_size": 256,
+                "change_poll_ms": 2000
             },
             "validation": {
                 "min_nombre_length": 2,
@@ -57,7 +98,8 @@ class Config:
             "export": {
                 "csv_encoding": "utf-8",
                 "pdf_page_size": "A4",
-                "backup_retention_days": 30
+                "backup_retention_days": 30,
+                "backup_compression": "gzip"
             },
             "alerts": {
                 "show_startup_alerts": True,
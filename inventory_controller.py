@@ -3,21 +3,40 @@ Controller module for inventory management system.
 Handles business logic and coordinates between Model and View.
 """
 
-from inventory_model import InventarioModel
-from inventory_validation import ProductValidator
+from inventory_storage import create_backend
+from inventory_validation import ProductValidator, DatabaseValidator, FilterValidator
 from inventory_config import Config
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import copy
 import logging
+import os
+import sqlite3
+import threading
+import time
 
 
 class InventoryController:
     """Controller class that manages application logic."""
     
-    def __init__(self):
+    def __init__(self, config_file="config.json"):
         """Initialize controller with model and configuration."""
-        self.config = Config()
-        self.model = InventarioModel(self.config.get('database', 'name'))
+        self.config = Config(config_file)
+        self.model = create_backend(self.config)
         self.validator = ProductValidator()
         self.ui = None
+        self._mantenimiento = None
+        self._detener_mantenimiento = threading.Event()
+        self._backups = None
+        self._detener_backups = threading.Event()
+        self._version_ultimo_backup = None
+        # LRU of read results; each entry carries the backend's data token
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_generacion = 0
+        self._cache_max = self.config.get('ui', 'result_cache_size', 256)
+        self.cache_hits = 0
+        self.cache_misses = 0
         self._setup_logging()
     
     def _setup_logging(self):
@@ -33,12 +52,71 @@ class InventoryController:
         """Start inventory application."""
         try:
             self.logger.info("Starting inventory application")
+            self.start_maintenance()
+            self.start_backup_scheduler()
             from inventory_ui import InventarioUI
             self.ui = InventarioUI(controller=self)
         except Exception as e:
             self.logger.error(f"Failed to start application: {e}")
             raise
     
+    def _cacheado(self, clave, calcular):
+        """Return calcular()'s result for `clave`, from the cache while the data is unchanged.
+        
+        Entries are stamped with model.version_datos(), so commits made
+        elsewhere (the UI, another process) make them miss as well; this
+        controller's own writes also drop them through invalidate_cache().
+        None results are not cached.
+        """
+        if not self._cache_max:
+            return calcular()
+        version = self.model.version_datos()
+        with self._cache_lock:
+            entrada = self._cache.get(clave)
+            if entrada is not None and entrada[0] == version:
+                self._cache.move_to_end(clave)
+                self.cache_hits += 1
+                return copy.copy(entrada[1])
+            self.cache_misses += 1
+            generacion = self._cache_generacion
+        
+        valor = calcular()
+        with self._cache_lock:
+            # A write that invalidated while we were reading wins
+            if valor is not None and generacion == self._cache_generacion:
+                self._cache[clave] = (version, valor)
+                self._cache.move_to_end(clave)
+                while len(self._cache) > self._cache_max:
+                    self._cache.popitem(last=False)
+        return copy.copy(valor)
+    
+    def invalidate_cache(self, producto_ids=None):
+        """Drop cached results after a write.
+        
+        Lists and statistics always go; single-product lookups only for
+        `producto_ids`, or all of them when it is None.
+        """
+        with self._cache_lock:
+            self._cache_generacion += 1
+            if producto_ids is None:
+                self._cache.clear()
+                return
+            ids = set(producto_ids)
+            for clave in [c for c in self._cache if c[0] != 'get_product_by_id' or c[1] in ids]:
+                del self._cache[clave]
+    
+    def cache_stats(self):
+        """Hit/miss counters and size of the result cache."""
+        with self._cache_lock:
+            consultas = self.cache_hits + self.cache_misses
+            return {
+                'hits': self.cache_hits,
+                'misses': self.cache_misses,
+                'tasa_aciertos': self.cache_hits / consultas if consultas else 0.0,
+                'entradas': len(self._cache),
+                'capacidad': self._cache_max,
+            }
+    
     def add_product(self, nombre, cantidad, precio, stock_minimo=10):
         """Add a new product after validation."""
         try:
@@ -48,19 +126,87 @@ class InventoryController:
             if not validation_result.is_valid:
                 return {'success': False, 'errors': validation_result.errors}
             
-            # Check for duplicates
-            if self.model.producto_existe(nombre):
-                return {'success': False, 'errors': [f"El producto '{nombre}' ya existe"]}
-            
-            # Add product
+            # Add product; the unique index on nombre (triggers on legacy files) rejects duplicates
+            nombre = str(nombre).strip()
             self.model.agregar_producto(nombre, cantidad, precio, stock_minimo)
+            self.invalidate_cache(())
             self.logger.info(f"Product added: {nombre}")
             return {'success': True}
             
+        except sqlite3.IntegrityError:
+            return {'success': False, 'errors': [f"El producto '{nombre}' ya existe"]}
         except Exception as e:
             self.logger.error(f"Error adding product: {e}")
             return {'success': False, 'errors': [f"Error al agregar producto: {str(e)}"]}
     
+    def _filas_validas(self, productos, errors, stock_minimo_defecto=10):
+        """Yield normalized (nombre, cantidad, precio, stock_minimo) rows, collecting errors."""
+        for i, fila in enumerate(productos, start=1):
+            if len(fila) < 3:
+                errors.append(f"Fila {i}: Se requieren nombre, cantidad y precio")
+                continue
+            nombre, cantidad, precio = fila[0], fila[1], fila[2]
+            stock_minimo = fila[3] if len(fila) > 3 else None
+            if stock_minimo is None:
+                stock_minimo = stock_minimo_defecto
+            
+            validation_result = self.validator.validate_product(
+                nombre, cantidad, precio, 10 if stock_minimo is None else stock_minimo
+            )
+            if not validation_result.is_valid:
+                errors.append(f"Fila {i}: {'; '.join(validation_result.errors)}")
+                continue
+            
+            yield (
+                str(nombre).strip(), int(cantidad), float(precio),
+                int(stock_minimo) if stock_minimo is not None else None
+            )
+    
+    def add_products_bulk(self, productos, chunk_size=None):
+        """Validate and insert many products, one transaction per chunk."""
+        try:
+            chunk_size = chunk_size or self.config.get('database', 'batch_size', 1000)
+            errors = []
+            
+            # Duplicates are rejected by the unique index on nombre
+            with self.model.perfil_temporal(self.config.get('database', 'bulk_profile', 'bulk-load')):
+                result = self.model.agregar_productos_lote(self._filas_validas(productos, errors), chunk_size)
+            self.invalidate_cache(())
+            result['rechazados'] += len(errors)
+            self.logger.info(
+                f"Bulk insert: {result['insertados']} inserted, {result['rechazados']} rejected "
+                f"({result['filas_por_segundo']:.0f} rows/s)"
+            )
+            return {'success': True, 'data': result, 'errors': errors}
+            
+        except Exception as e:
+            self.logger.error(f"Error adding products in bulk: {e}")
+            return {'success': False, 'errors': [f"Error al agregar productos: {str(e)}"]}
+    
+    def upsert_products_bulk(self, productos, chunk_size=None):
+        """Validate a feed and insert new products or update existing ones by name."""
+        try:
+            chunk_size = chunk_size or self.config.get('database', 'batch_size', 1000)
+            errors = []
+            
+            # Rows without stock_minimo keep the stored one
+            with self.model.perfil_temporal(self.config.get('database', 'bulk_profile', 'bulk-load')):
+                result = self.model.upsert_productos_lote(
+                    self._filas_validas(productos, errors, stock_minimo_defecto=None), chunk_size
+                )
+            self.invalidate_cache()
+            result['rechazados'] += len(errors)
+            self.logger.info(
+                f"Bulk upsert: {result['insertados']} inserted, {result['actualizados']} updated, "
+                f"{result['sin_cambios']} unchanged, {result['rechazados']} rejected "
+                f"({result['filas_por_segundo']:.0f} rows/s)"
+            )
+            return {'success': True, 'data': result, 'errors': errors}
+            
+        except Exception as e:
+            self.logger.error(f"Error upserting products in bulk: {e}")
+            return {'success': False, 'errors': [f"Error al importar productos: {str(e)}"]}
+    
     def update_product(self, producto_id, nombre, cantidad, precio, stock_minimo=None):
         """Update an existing product after validation."""
         try:
@@ -70,15 +216,18 @@ class InventoryController:
             if not validation_result.is_valid:
                 return {'success': False, 'errors': validation_result.errors}
             
-            # Check for duplicates (excluding current product)
-            if self.model.producto_existe(nombre, producto_id):
-                return {'success': False, 'errors': [f"El producto '{nombre}' ya existe"]}
-            
-            # Update product
+            # Update product; the unique index on nombre rejects duplicates
+            nombre = str(nombre).strip()
             self.model.actualizar_producto(producto_id, nombre, cantidad, precio, stock_minimo)
+            self.invalidate_cache((producto_id,))
             self.logger.info(f"Product updated: {nombre} (ID: {producto_id})")
             return {'success': True}
             
+        except sqlite3.IntegrityError:
+            return {'success': False, 'errors': [f"El producto '{nombre}' ya existe"]}
+        except ValueError as e:
+            # The new quantity would leave a location short (stock moved elsewhere)
+            return {'success': False, 'errors': [str(e)]}
         except Exception as e:
             self.logger.error(f"Error updating product: {e}")
             return {'success': False, 'errors': [f"Error al actualizar producto: {str(e)}"]}
@@ -86,25 +235,104 @@ class InventoryController:
     def delete_product(self, producto_id):
         """Delete a product after confirmation."""
         try:
-            product = self.model.obtener_producto_por_id(producto_id)
-            if not product:
-                return {'success': False, 'errors': ['Producto no encontrado']}
-            
-            self.model.eliminar_producto(producto_id)
-            self.logger.info(f"Product deleted: {product[1]} (ID: {producto_id})")
+            # Lookup and delete in one unit of work so they see the same row
+            with self.model.transaction():
+                product = self.model.obtener_producto_por_id(producto_id)
+                if not product:
+                    return {'success': False, 'errors': ['Producto no encontrado']}
+                
+                self.model.eliminar_producto(producto_id)
+            self.invalidate_cache((producto_id,))
+            self.logger.info(f"Product deleted: {product.nombre} (ID: {producto_id})")
             return {'success': True}
             
         except Exception as e:
             self.logger.error(f"Error deleting product: {e}")
             return {'success': False, 'errors': [f"Error al eliminar producto: {str(e)}"]}
     
-    def get_products(self, filtro=""):
-        """Get all products, optionally filtered."""
+    def _validar_seleccion(self, filtro, ids):
+        """Validate a bulk operation's filter and ID list once; return the errors."""
+        if not filtro and ids is None:
+            return ["Indique un filtro o seleccione productos"]
+        errors = list(FilterValidator.validate_search_filter(filtro).errors)
+        for producto_id in ids or ():
+            errors.extend(DatabaseValidator.validate_producto_id(producto_id).errors)
+        return errors
+    
+    def reprice_products(self, porcentaje=None, importe=None, filtro=None, ids=None):
+        """Change the price of every selected product by a percentage and/or an amount."""
+        try:
+            errors = self.validator.validate_repricing(porcentaje, importe).errors
+            errors += self._validar_seleccion(filtro, ids)
+            if errors:
+                return {'success': False, 'errors': errors}
+            
+            # One UPDATE for the whole set, rejected as a unit if any price leaves the range
+            cambiados = self.model.actualizar_precios_lote(
+                float(porcentaje or 0), float(importe or 0), filtro, ids,
+                self.validator.min_precio, self.validator.max_precio
+            )
+            self.invalidate_cache()
+            self.logger.info(f"Repriced {cambiados} products ({porcentaje or 0}% + {importe or 0})")
+            return {'success': True, 'data': cambiados}
+            
+        except ValueError as e:
+            return {'success': False, 'errors': [str(e)]}
+        except Exception as e:
+            self.logger.error(f"Error repricing products: {e}")
+            return {'success': False, 'errors': [f"Error al cambiar precios: {str(e)}"]}
+    
+    def set_minimum_stock(self, stock_minimo, filtro=None, ids=None):
+        """Set the minimum stock of every selected product."""
+        try:
+            # Optional on a single product (defaulting to 10), but here it is the whole change
+            if stock_minimo is None or not str(stock_minimo).strip():
+                errors = ["El stock mínimo es obligatorio"]
+            else:
+                errors = self.validator.validate_stock_minimo(stock_minimo)
+            errors += self._validar_seleccion(filtro, ids)
+            if errors:
+                return {'success': False, 'errors': errors}
+            
+            cambiados = self.model.actualizar_stock_minimo_lote(int(stock_minimo), filtro, ids)
+            self.invalidate_cache()
+            self.logger.info(f"Minimum stock set to {stock_minimo} on {cambiados} products")
+            return {'success': True, 'data': cambiados}
+            
+        except ValueError as e:
+            return {'success': False, 'errors': [str(e)]}
+        except Exception as e:
+            self.logger.error(f"Error setting minimum stock: {e}")
+            return {'success': False, 'errors': [f"Error al cambiar el stock mínimo: {str(e)}"]}
+    
+    def delete_products(self, filtro=None, ids=None):
+        """Delete every selected product in one transaction."""
         try:
-            productos = self.model.obtener_productos()
+            errors = self._validar_seleccion(filtro, ids)
+            if errors:
+                return {'success': False, 'errors': errors}
+            
+            eliminados = self.model.eliminar_productos_lote(filtro, ids)
+            self.invalidate_cache()
+            self.logger.info(f"Deleted {eliminados} products")
+            return {'success': True, 'data': eliminados}
             
+        except ValueError as e:
+            return {'success': False, 'errors': [str(e)]}
+        except Exception as e:
+            self.logger.error(f"Error deleting products: {e}")
+            return {'success': False, 'errors': [f"Error al eliminar productos: {str(e)}"]}
+    
+    def get_products(self, filtro="", limit=None):
+        """Get all products, or the best full-text matches for a filter."""
+        try:
             if filtro:
-                productos = [p for p in productos if filtro.lower() in str(p[1]).lower()]
+                limit = limit or self.config.get('ui', 'search_limit', 200)
+                productos = self._cacheado(
+                    ('get_products', filtro, limit), lambda: self.model.buscar_productos(filtro, limit)
+                )
+            else:
+                productos = self._cacheado(('get_products', '', None), self.model.obtener_productos)
             
             return {'success': True, 'data': productos}
             
@@ -112,10 +340,23 @@ class InventoryController:
             self.logger.error(f"Error getting products: {e}")
             return {'success': False, 'errors': [f"Error al obtener productos: {str(e)}"]}
     
+    def get_products_page(self, after_key=None, limit=None, order_by='id', filtro=""):
+        """Get one keyset-paginated page of products plus the next-page cursor."""
+        try:
+            limit = limit or self.config.get('ui', 'page_size', 200)
+            page = self.model.obtener_productos_pagina(after_key, limit, order_by, filtro)
+            return {'success': True, 'data': page['productos'], 'next_cursor': page['siguiente']}
+            
+        except Exception as e:
+            self.logger.error(f"Error getting products page: {e}")
+            return {'success': False, 'errors': [f"Error al obtener productos: {str(e)}"]}
+    
     def get_product_by_id(self, producto_id):
         """Get a specific product by ID."""
         try:
-            product = self.model.obtener_producto_por_id(producto_id)
+            product = self._cacheado(
+                ('get_product_by_id', producto_id), lambda: self.model.obtener_producto_por_id(producto_id)
+            )
             if product:
                 return {'success': True, 'data': product}
             else:
@@ -128,27 +369,170 @@ class InventoryController:
     def get_statistics(self):
         """Get inventory statistics."""
         try:
-            stats = self.model.obtener_estadisticas()
+            stats = self._cacheado(('get_statistics',), self.model.obtener_estadisticas)
             return {'success': True, 'data': stats}
             
         except Exception as e:
             self.logger.error(f"Error getting statistics: {e}")
             return {'success': False, 'errors': [f"Error al obtener estadísticas: {str(e)}"]}
     
-    def get_low_stock_products(self):
-        """Get products with low stock."""
+    def rebuild_statistics(self):
+        """Recompute the statistics summary table from the products table."""
+        try:
+            stats = self.model.reconstruir_estadisticas()
+            self.invalidate_cache(())
+            self.logger.info("Statistics summary rebuilt")
+            return {'success': True, 'data': stats}
+            
+        except Exception as e:
+            self.logger.error(f"Error rebuilding statistics: {e}")
+            return {'success': False, 'errors': [f"Error al recalcular estadísticas: {str(e)}"]}
+    
+    def record_movements(self, movimientos, chunk_size=None, location_id=None):
+        """Apply a batch of (producto_id, tipo, cantidad[, fecha]) stock movements."""
+        try:
+            chunk_size = chunk_size or self.config.get('database', 'batch_size', 1000)
+            with self.model.perfil_temporal(self.config.get('database', 'bulk_profile', 'bulk-load')):
+                aplicados = self.model.registrar_movimientos(movimientos, chunk_size, location_id)
+            self.invalidate_cache()
+            self.logger.info(f"Stock movements recorded: {aplicados}")
+            return {'success': True, 'data': {'aplicados': aplicados}}
+            
+        except Exception as e:
+            self.logger.error(f"Error recording stock movements: {e}")
+            return {'success': False, 'errors': [f"Error al registrar movimientos: {str(e)}"]}
+    
+    def adjust_stock(self, producto_id, delta, tipo='ajuste'):
+        """Add a signed delta to a product's stock without rewriting the product."""
+        try:
+            errors = DatabaseValidator.validate_producto_id(producto_id).errors + self.validator.validate_delta(delta)
+            if errors:
+                return {'success': False, 'errors': errors}
+            
+            cantidad = self.model.ajustar_stock(int(producto_id), int(delta), tipo)
+            self.invalidate_cache((int(producto_id),))
+            self.logger.info(f"Stock adjusted: product {producto_id} {int(delta):+d} -> {cantidad}")
+            return {'success': True, 'data': cantidad}
+            
+        except ValueError as e:
+            return {'success': False, 'errors': [str(e)]}
+        except Exception as e:
+            self.logger.error(f"Error adjusting stock: {e}")
+            return {'success': False, 'errors': [f"Error al ajustar stock: {str(e)}"]}
+    
+    def adjust_stock_bulk(self, ajustes, tipo='ajuste'):
+        """Apply many (producto_id, delta) adjustments; all of them or none."""
+        try:
+            errors = []
+            for i, (producto_id, delta) in enumerate(ajustes, start=1):
+                fila_errors = DatabaseValidator.validate_producto_id(producto_id).errors + self.validator.validate_delta(delta)
+                errors.extend(f"Fila {i}: {error}" for error in fila_errors)
+            if errors:
+                return {'success': False, 'errors': errors}
+            
+            cantidades = self.model.ajustar_stock_lote(
+                [(int(producto_id), int(delta)) for producto_id, delta in ajustes], tipo
+            )
+            self.invalidate_cache(cantidades)
+            self.logger.info(f"Stock adjusted for {len(cantidades)} products")
+            return {'success': True, 'data': cantidades}
+            
+        except ValueError as e:
+            return {'success': False, 'errors': [str(e)]}
+        except Exception as e:
+            self.logger.error(f"Error adjusting stock in bulk: {e}")
+            return {'success': False, 'errors': [f"Error al ajustar stock: {str(e)}"]}
+    
+    def get_stock_as_of(self, producto_id, fecha):
+        """Get a product's stock as it was on a given date."""
+        try:
+            validation_result = DatabaseValidator.validate_producto_id(producto_id)
+            if not validation_result.is_valid:
+                return {'success': False, 'errors': validation_result.errors}
+            
+            stock = self.model.stock_a_fecha(int(producto_id), fecha)
+            return {'success': True, 'data': stock}
+            
+        except Exception as e:
+            self.logger.error(f"Error getting stock as of {fecha}: {e}")
+            return {'success': False, 'errors': [f"Error al obtener stock histórico: {str(e)}"]}
+    
+    def add_location(self, nombre):
+        """Add a stock location such as a warehouse or store."""
+        try:
+            nombre = str(nombre).strip()
+            if not nombre:
+                return {'success': False, 'errors': ['El nombre de la ubicación es obligatorio']}
+            
+            ubicacion_id = self.model.crear_ubicacion(nombre)
+            self.invalidate_cache(())
+            self.logger.info(f"Location added: {nombre} (ID: {ubicacion_id})")
+            return {'success': True, 'data': ubicacion_id}
+            
+        except sqlite3.IntegrityError:
+            return {'success': False, 'errors': [f"La ubicación '{nombre}' ya existe"]}
+        except Exception as e:
+            self.logger.error(f"Error adding location: {e}")
+            return {'success': False, 'errors': [f"Error al agregar ubicación: {str(e)}"]}
+    
+    def get_locations(self):
+        """Get every location with its stock rollup."""
+        try:
+            return {'success': True, 'data': self.model.obtener_ubicaciones()}
+            
+        except Exception as e:
+            self.logger.error(f"Error getting locations: {e}")
+            return {'success': False, 'errors': [f"Error al obtener ubicaciones: {str(e)}"]}
+    
+    def get_product_locations(self, producto_id):
+        """Get a product's stock split by location."""
+        try:
+            return {'success': True, 'data': self.model.obtener_stock_ubicaciones(producto_id)}
+            
+        except Exception as e:
+            self.logger.error(f"Error getting product locations: {e}")
+            return {'success': False, 'errors': [f"Error al obtener stock por ubicación: {str(e)}"]}
+    
+    def transfer_stock(self, producto_id, origen_id, destino_id, cantidad):
+        """Move stock of a product from one location to another."""
         try:
-            products = self.model.obtener_productos_bajo_stock()
+            validation_result = DatabaseValidator.validate_producto_id(producto_id)
+            if not validation_result.is_valid:
+                return {'success': False, 'errors': validation_result.errors}
+            
+            self.model.transferir_stock(int(producto_id), origen_id, destino_id, cantidad)
+            self.invalidate_cache((int(producto_id),))
+            self.logger.info(
+                f"Stock transferred: {cantidad} of product {producto_id} from location {origen_id} to {destino_id}"
+            )
+            return {'success': True}
+            
+        except ValueError as e:
+            return {'success': False, 'errors': [str(e)]}
+        except Exception as e:
+            self.logger.error(f"Error transferring stock: {e}")
+            return {'success': False, 'errors': [f"Error al transferir stock: {str(e)}"]}
+    
+    def get_low_stock_products(self, location_id=None):
+        """Get products with low stock, company-wide or at one location."""
+        try:
+            if location_id is not None:
+                products = self._cacheado(
+                    ('get_low_stock_products', location_id),
+                    lambda: self.model.obtener_productos_bajo_stock_ubicacion(location_id)
+                )
+            else:
+                products = self._cacheado(('get_low_stock_products', None), self.model.obtener_productos_bajo_stock)
             return {'success': True, 'data': products}
             
         except Exception as e:
             self.logger.error(f"Error getting low stock products: {e}")
             return {'success': False, 'errors': [f"Error al obtener productos con stock bajo: {str(e)}"]}
     
-    def backup_database(self, backup_path):
-        """Create a database backup."""
+    def backup_database(self, backup_path, progress=None):
+        """Create an online database backup, reporting progress(copied, total)."""
         try:
-            success = self.model.backup_database(backup_path)
+            success = self.model.backup_database(backup_path, progreso=progress)
             if success:
                 self.logger.info(f"Database backed up to: {backup_path}")
                 return {'success': True}
@@ -159,10 +543,128 @@ class InventoryController:
             self.logger.error(f"Error backing up database: {e}")
             return {'success': False, 'errors': [f"Error al crear copia de seguridad: {str(e)}"]}
     
+    # Extension used for each database.backup_compression setting
+    EXTENSIONES_BACKUP = {'gzip': '.db.gz', 'lzma': '.db.xz', 'none': '.db'}
+    PREFIJO_BACKUP = 'inventario_backup_'
+    
+    def default_backup_path(self):
+        """Timestamped backup path in the backup folder, using the configured compression.
+
+        Names have microsecond resolution and get a numeric suffix if the
+        file already exists, so backups taken close together never overwrite
+        each other.
+        """
+        carpeta = self.config.get('database', 'backup_folder', 'backups')
+        compresion = self.config.get('export', 'backup_compression', 'gzip')
+        extension = self.EXTENSIONES_BACKUP.get(compresion, '.db')
+        os.makedirs(carpeta, exist_ok=True)
+        base = os.path.join(carpeta, f"{self.PREFIJO_BACKUP}{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}")
+        ruta = f"{base}{extension}"
+        sufijo = 1
+        while os.path.exists(ruta):
+            ruta = f"{base}_{sufijo}{extension}"
+            sufijo += 1
+        return ruta
+    
+    def purge_old_backups(self, retention_days=None):
+        """Delete backups in the backup folder older than export.backup_retention_days."""
+        try:
+            if retention_days is None:
+                retention_days = self.config.get('export', 'backup_retention_days', 30)
+            carpeta = self.config.get('database', 'backup_folder', 'backups')
+            if not retention_days or not os.path.isdir(carpeta):
+                return {'success': True, 'data': 0}
+            
+            limite = time.time() - retention_days * 86400
+            eliminados = 0
+            # Only files named like our backups; the folder may hold other things
+            with os.scandir(carpeta) as entradas:
+                for entrada in entradas:
+                    if (entrada.is_file() and entrada.name.startswith(self.PREFIJO_BACKUP)
+                            and entrada.stat().st_mtime < limite):
+                        os.unlink(entrada.path)
+                        eliminados += 1
+            if eliminados:
+                self.logger.info(f"Removed {eliminados} backups older than {retention_days} days")
+            return {'success': True, 'data': eliminados}
+            
+        except Exception as e:
+            self.logger.error(f"Error purging old backups: {e}")
+            return {'success': False, 'errors': [f"Error al limpiar copias de seguridad: {str(e)}"]}
+    
+    def run_scheduled_backup(self, force=False):
+        """Back up into the backup folder unless nothing changed since the last automatic backup."""
+        try:
+            # Read before copying, so anything committed meanwhile triggers the next run
+            version = self.model.version_datos()
+            if not force and version is not None and version == self._version_ultimo_backup:
+                self.logger.debug("Scheduled backup skipped: no changes since the last one")
+                return {'success': True, 'data': None}
+            
+            ruta = self.default_backup_path()
+            self.model.backup_database(ruta)
+            self._version_ultimo_backup = version
+            self.logger.info(f"Scheduled backup written to: {ruta}")
+            return {'success': True, 'data': ruta}
+            
+        except Exception as e:
+            self.logger.error(f"Error in scheduled backup: {e}")
+            return {'success': False, 'errors': [f"Error en la copia de seguridad automática: {str(e)}"]}
+    
+    def _proximo_backup(self, ahora, ultimo):
+        """When the next automatic backup is due, or None if none is configured.
+        
+        database.auto_backup_interval_minutes counts from the previous run;
+        database.auto_backup_times lists daily "HH:MM" times.
+        """
+        candidatos = []
+        intervalo = self.config.get('database', 'auto_backup_interval_minutes', 0)
+        if intervalo:
+            candidatos.append(ultimo + timedelta(minutes=intervalo))
+        for hora in self.config.get('database', 'auto_backup_times', []) or []:
+            momento = datetime.combine(ahora.date(), datetime.strptime(hora, '%H:%M').time())
+            if momento <= ahora:
+                momento += timedelta(days=1)
+            candidatos.append(momento)
+        return min(candidatos, default=None)
+    
+    def start_backup_scheduler(self):
+        """Take automatic backups on a background thread, per the database.auto_backup_* settings."""
+        if self._backups:
+            return
+        try:
+            if self._proximo_backup(datetime.now(), datetime.now()) is None:
+                return
+        except ValueError as e:
+            self.logger.error(f"Invalid automatic backup schedule: {e}")
+            return
+        
+        def bucle():
+            ultimo = datetime.now()
+            while True:
+                ahora = datetime.now()
+                espera = (self._proximo_backup(ahora, ultimo) - ahora).total_seconds()
+                if self._detener_backups.wait(max(0, espera)):
+                    break
+                self.run_scheduled_backup()
+                ultimo = datetime.now()
+        
+        self._detener_backups.clear()
+        self._backups = threading.Thread(target=bucle, name="inventario-backups", daemon=True)
+        self._backups.start()
+    
+    def stop_backup_scheduler(self):
+        """Stop automatic backups, waiting for one in progress."""
+        if self._backups:
+            self._detener_backups.set()
+            self._backups.join()
+            self._backups = None
+    
     def restore_database(self, backup_path):
         """Restore database from backup."""
         try:
             success = self.model.restore_database(backup_path)
+            self.invalidate_cache()
             if success:
                 self.logger.info(f"Database restored from: {backup_path}")
                 return {'success': True}
@@ -173,11 +675,118 @@ class InventoryController:
             self.logger.error(f"Error restoring database: {e}")
             return {'success': False, 'errors': [f"Error al restaurar copia de seguridad: {str(e)}"]}
     
+    def run_maintenance(self):
+        """Archive idle products, purge old soft-deleted ones, reclaim free pages and expire backups.
+
+        Also promotes a legacy database's name triggers to the unique index
+        once its duplicate names have been resolved.
+        """
+        try:
+            archivados = self.model.archivar_inactivos(self.config.get('database', 'archive_after_days', 365))
+            purgados = self.model.purgar_eliminados(self.config.get('database', 'purge_after_days', 30))
+            if archivados or purgados:
+                self.invalidate_cache()
+            liberadas = self.model.vacuum_incremental(self.config.get('database', 'vacuum_pages', 256))
+            # Legacy databases keep trigger-enforced names until their duplicates are resolved
+            self.model.activar_nombres_unicos()
+            backups = self.purge_old_backups()
+            if archivados or purgados or liberadas:
+                self.logger.info(
+                    f"Maintenance: {archivados} products archived, {purgados} purged, {liberadas} pages reclaimed"
+                )
+            return {
+                'success': True,
+                'data': {
+                    'archivados': archivados, 'purgados': purgados, 'paginas_liberadas': liberadas,
+                    'backups_eliminados': backups.get('data', 0)
+                }
+            }
+            
+        except Exception as e:
+            self.logger.error(f"Error running maintenance: {e}")
+            return {'success': False, 'errors': [f"Error en el mantenimiento: {str(e)}"]}
+    
+    def enable_auto_vacuum(self):
+        """Convert a legacy database file so maintenance can reclaim free pages.
+
+        Runs a full VACUUM on files that need it, which blocks other users of
+        the database while it lasts; a failure (disk full, busy file) is
+        reported and the database is left as it was.
+        """
+        try:
+            convertida = self.model.activar_auto_vacuum()
+            if convertida:
+                self.logger.info("Database converted to incremental auto_vacuum")
+            return {'success': True, 'data': convertida}
+            
+        except Exception as e:
+            self.logger.error(f"Error enabling auto_vacuum: {e}")
+            return {'success': False, 'errors': [f"Error al compactar la base de datos: {str(e)}"]}
+    
+    def archive_inactive_products(self, days=None):
+        """Move out-of-stock products idle for `days` days to the archive database."""
+        try:
+            days = days if days is not None else self.config.get('database', 'archive_after_days', 365)
+            archivados = self.model.archivar_inactivos(days)
+            self.invalidate_cache()
+            self.logger.info(f"Archived {archivados} inactive products")
+            return {'success': True, 'data': archivados}
+            
+        except Exception as e:
+            self.logger.error(f"Error archiving products: {e}")
+            return {'success': False, 'errors': [f"Error al archivar productos: {str(e)}"]}
+    
+    def search_archived_products(self, texto=''):
+        """Search the archive by product name."""
+        try:
+            limite = self.config.get('ui', 'search_limit', 200)
+            return {'success': True, 'data': self.model.buscar_archivados(texto, limite)}
+        except Exception as e:
+            self.logger.error(f"Error searching archived products: {e}")
+            return {'success': False, 'errors': [f"Error al buscar en el archivo: {str(e)}"]}
+    
+    def restore_archived_products(self, producto_ids):
+        """Bring archived products and their history back into the catalogue."""
+        try:
+            restaurados = self.model.restaurar_archivados(producto_ids)
+            self.invalidate_cache(())
+            self.logger.info(f"Restored {restaurados} archived products")
+            return {'success': True, 'data': restaurados}
+            
+        except sqlite3.IntegrityError:
+            return {'success': False, 'errors': ["Ya existe un producto activo con el nombre de uno de los archivados"]}
+        except Exception as e:
+            self.logger.error(f"Error restoring archived products: {e}")
+            return {'success': False, 'errors': [f"Error al restaurar productos archivados: {str(e)}"]}
+    
+    def start_maintenance(self, interval_minutes=None):
+        """Run maintenance periodically on a background thread."""
+        interval_minutes = interval_minutes or self.config.get('database', 'maintenance_interval_minutes', 15)
+        if self._mantenimiento or not interval_minutes:
+            return
+        
+        def bucle():
+            while not self._detener_mantenimiento.wait(interval_minutes * 60):
+                self.run_maintenance()
+        
+        self._detener_mantenimiento.clear()
+        self._mantenimiento = threading.Thread(target=bucle, name="inventario-mantenimiento", daemon=True)
+        self._mantenimiento.start()
+    
+    def stop_maintenance(self):
+        """Stop the background maintenance thread, waiting for a running pass."""
+        if self._mantenimiento:
+            self._detener_mantenimiento.set()
+            self._mantenimiento.join()
+            self._mantenimiento = None
+    
     def shutdown(self):
         """Clean shutdown of application."""
         try:
-            if self.model and hasattr(self.model, 'conn'):
-                self.model.conn.close()
+            self.stop_maintenance()
+            self.stop_backup_scheduler()
+            if self.model:
+                self.model.close()
             self.logger.info("Application shutdown complete")
         except Exception as e:
             self.logger.error(f"Error during shutdown: {e}")
\ No newline at end of file
@@ -1,15 +1,481 @@
+import json
+import os
+import re
 import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
+from inventory_storage import COLUMNAS_PRODUCTO, Producto, StorageBackend
 
-class InventarioModel:
-    def __init__(self, db_name="inventario.db"):
+
+_SELECT_PRODUCTO = ", ".join(COLUMNAS_PRODUCTO)
+
+
+def _fila_producto(cursor, fila):
+    return Producto(*fila)
+
+
+class _TestigoHilo:
+    """Kept in a thread's local storage, so it is collected when the thread ends."""
+    __slots__ = ('__weakref__',)
+
+
+def _liberar_conexion(modelo_ref, conn):
+    """Drop a finished thread's connection from its model's pool and close it."""
+    modelo = modelo_ref()
+    if modelo is not None:
+        with modelo._pool_lock:
+            if conn in modelo._conexiones:
+                modelo._conexiones.remove(conn)
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+class InventarioModel(StorageBackend):
+    MULTIPLES_UBICACIONES = True
+
+    # Ordered schema migrations; step N upgrades PRAGMA user_version N-1 -> N
+    _MIGRACIONES = (
+        '_crear_tabla',
+        '_crear_indices',
+        '_crear_estadisticas',
+        '_crear_busqueda',
+        '_crear_movimientos',
+        '_crear_papelera',
+        '_crear_ubicaciones',
+        '_crear_archivo',
+        '_proteger_nombres_duplicados',
+    )
+    VERSION_ESQUEMA = len(_MIGRACIONES)
+
+    # A product gets a fresh stock snapshot after this many ledger movements
+    MOVIMIENTOS_POR_SNAPSHOT = 100
+
+    # Performance presets; config.json's database.profiles can override or add to these.
+    # cache_size < 0 is KiB; journal_mode and page_size are database-wide, the rest per connection.
+    PERFILES = {
+        'durable': {
+            'journal_mode': 'WAL', 'synchronous': 'FULL', 'cache_size': -8000,
+            'mmap_size': 0, 'temp_store': 'DEFAULT', 'page_size': 4096,
+        },
+        'balanced': {
+            'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -65536,
+            'mmap_size': 268435456, 'temp_store': 'MEMORY', 'page_size': 4096,
+        },
+        'bulk-load': {
+            'journal_mode': 'WAL', 'synchronous': 'OFF', 'cache_size': -262144,
+            'mmap_size': 1073741824, 'temp_store': 'MEMORY', 'page_size': 4096,
+        },
+    }
+    _PRAGMAS_CONEXION = ('synchronous', 'cache_size', 'mmap_size', 'temp_store')
+    _VALORES_PRAGMA = {
+        'journal_mode': ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'),
+        'synchronous': ('OFF', 'NORMAL', 'FULL', 'EXTRA'),
+        'temp_store': ('DEFAULT', 'FILE', 'MEMORY'),
+    }
+
+    def __init__(self, db_name="inventario.db", busy_timeout=5000, perfil='balanced', perfiles=None, archivo=None):
         self.db_name = db_name
-        self.conn = sqlite3.connect(db_name)
-        self.cursor = self.conn.cursor()
-        self._crear_tabla()
+        # Cold storage for archived products, attached only while it is used
+        self.archivo = archivo or f"{os.path.splitext(db_name)[0]}_archive.db"
+        self.busy_timeout = busy_timeout
+        self.perfiles = {nombre: dict(ajustes) for nombre, ajustes in self.PERFILES.items()}
+        for nombre, ajustes in (perfiles or {}).items():
+            self.perfiles.setdefault(nombre, {}).update(ajustes)
+        self.perfil = self._resolver_perfil(perfil)
+        # One connection per thread, tracked so they can all be closed together
+        self._local = threading.local()
+        self._pool_lock = threading.Lock()
+        self._conexiones = []
+        self._generacion = 0
+        # Connections in use across threads; restore_database() waits for zero
+        # and holds new work back while it swaps the file
+        self._uso = threading.Condition()
+        self._en_uso = 0
+        self._cambiando_archivo = False
+        # Change detection: a private connection whose data_version moves
+        # whenever any other connection (any process) commits
+        self._detector_lock = threading.Lock()
+        self._conexion_detector = None
+        self._aperturas_detector = 0
+        self._version_vista = None
+        self._suscriptores = []
+        self._detector = None
+        self._detener_detector = threading.Event()
+        self._migrar()
+
+    def _abrir_conexion(self):
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=self.busy_timeout / 1000,
+            check_same_thread=False
+        )
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        # Lets vacuum_incremental() hand free pages back; only sticks on a new file.
+        # Setting it rewrites the header even when unchanged, so check first.
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # page_size only takes effect before the file is created (or on VACUUM outside WAL)
+        for pragma in ('page_size', 'journal_mode') + self._PRAGMAS_CONEXION:
+            if pragma in self.perfil:
+                conn.execute(f"PRAGMA {pragma} = {self.perfil[pragma]}")
+        return conn
+
+    def _resolver_perfil(self, nombre):
+        """Return the named profile with every value checked and normalized.
+
+        Values end up interpolated into PRAGMA statements, so anything that
+        is not a known keyword or an integer is rejected.
+        """
+        if nombre not in self.perfiles:
+            raise ValueError(f"Perfil de rendimiento desconocido: {nombre}")
+        perfil = {}
+        for pragma, valor in self.perfiles[nombre].items():
+            if pragma in self._VALORES_PRAGMA:
+                valido = str(valor).upper() in self._VALORES_PRAGMA[pragma]
+                valor = str(valor).upper()
+            else:
+                valido = pragma in ('page_size', 'cache_size', 'mmap_size') and isinstance(valor, int)
+            if not valido:
+                raise ValueError(f"Ajuste no válido en el perfil {nombre}: {pragma}={valor}")
+            perfil[pragma] = valor
+        return perfil
+
+    @contextmanager
+    def perfil_temporal(self, nombre):
+        """Run the block with the calling thread's connection under another profile.
+
+        Only the per-connection settings (synchronous, cache_size, mmap_size,
+        temp_store) switch; journal_mode and page_size are database-wide and
+        stay as opened. The previous values are restored when the block exits.
+        """
+        perfil = self._resolver_perfil(nombre)
+        with self._en_uso_hilo():
+            conn = self._obtener_conexion()
+            anteriores = {
+                pragma: conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+                for pragma in self._PRAGMAS_CONEXION if pragma in perfil
+            }
+            for pragma in anteriores:
+                conn.execute(f"PRAGMA {pragma} = {perfil[pragma]}")
+            try:
+                yield conn
+            finally:
+                for pragma, valor in anteriores.items():
+                    conn.execute(f"PRAGMA {pragma} = {valor}")
+
+    def _obtener_conexion(self):
+        """Return the calling thread's connection, opening it on first use.
+
+        The connection is closed and leaves the pool when the thread ends,
+        so short-lived worker threads do not accumulate open connections.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.generacion != self._generacion:
+            conn = self._abrir_conexion()
+            with self._pool_lock:
+                self._conexiones.append(conn)
+                self._local.generacion = self._generacion
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
+            self._local.testigo = _TestigoHilo()
+            weakref.finalize(self._local.testigo, _liberar_conexion, weakref.ref(self), conn)
+        return conn
+
+    @property
+    def conn(self):
+        return self._obtener_conexion()
+
+    @property
+    def cursor(self):
+        self._obtener_conexion()
+        return self._local.cursor
+
+    @contextmanager
+    def _en_uso_hilo(self):
+        """Count the calling thread as using its connection for the block."""
+        nivel = getattr(self._local, 'uso', 0)
+        if nivel == 0:
+            with self._uso:
+                while self._cambiando_archivo:
+                    self._uso.wait()
+                self._en_uso += 1
+        self._local.uso = nivel + 1
+        try:
+            yield
+        finally:
+            self._local.uso = nivel
+            if nivel == 0:
+                with self._uso:
+                    self._en_uso -= 1
+                    if not self._en_uso:
+                        self._uso.notify_all()
+
+    @contextmanager
+    def _archivo_exclusivo(self):
+        """Wait until no thread is using a connection and keep new ones out for the block."""
+        if getattr(self._local, 'uso', 0):
+            raise RuntimeError("No se puede reemplazar la base de datos dentro de una transacción")
+        with self._uso:
+            while self._cambiando_archivo:
+                self._uso.wait()
+            self._cambiando_archivo = True
+            while self._en_uso:
+                self._uso.wait()
+        try:
+            yield
+        finally:
+            with self._uso:
+                self._cambiando_archivo = False
+                self._uso.notify_all()
+
+    @contextmanager
+    def conexion(self):
+        """Hand out the calling thread's pooled connection.
+
+        Any uncommitted work is rolled back if the block raises.
+        """
+        with self._en_uso_hilo():
+            conn = self._obtener_conexion()
+            try:
+                yield conn
+            except Exception:
+                # Inside a unit of work the enclosing transaction() decides
+                if not getattr(self._local, 'nivel_transaccion', 0):
+                    conn.rollback()
+                raise
+
+    def _consultar_productos(self, conn, sql, params=()):
+        """Execute a query projecting COLUMNAS_PRODUCTO and yield Producto rows."""
+        cursor = conn.cursor()
+        cursor.row_factory = _fila_producto
+        return cursor.execute(sql, params)
+
+    @contextmanager
+    def transaction(self):
+        """Unit of work: mutators inside the block commit once when it exits.
+
+        The outermost block runs BEGIN IMMEDIATE ... COMMIT and rolls back if
+        the block raises. Nested blocks become savepoints, so an inner
+        failure only undoes the inner block's work.
+        """
+        with self._en_uso_hilo():
+            conn = self._obtener_conexion()
+            nivel = getattr(self._local, 'nivel_transaccion', 0)
+            if nivel == 0:
+                conn.execute("BEGIN IMMEDIATE")
+            else:
+                conn.execute(f"SAVEPOINT sp_{nivel}")
+            self._local.nivel_transaccion = nivel + 1
+            try:
+                yield conn
+            except BaseException:
+                if nivel == 0:
+                    conn.rollback()
+                else:
+                    conn.execute(f"ROLLBACK TO sp_{nivel}")
+                    conn.execute(f"RELEASE sp_{nivel}")
+                raise
+            else:
+                if nivel == 0:
+                    conn.commit()
+                else:
+                    conn.execute(f"RELEASE sp_{nivel}")
+            finally:
+                self._local.nivel_transaccion = nivel
+
+    def cerrar_conexiones(self):
+        """Close every pooled connection; threads reopen lazily on next use."""
+        with self._pool_lock:
+            conexiones, self._conexiones = self._conexiones, []
+            self._generacion += 1
+        with self._detector_lock:
+            if self._conexion_detector is not None:
+                conexiones.append(self._conexion_detector)
+                self._conexion_detector = None
+        for conn in conexiones:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def close(self):
+        self.detener_detector()
+        self.cerrar_conexiones()
+
+    def suscribir_cambios(self, callback):
+        """Call `callback()` whenever comprobar_cambios() sees a new commit."""
+        self._suscriptores.append(callback)
+
+    def cancelar_suscripcion(self, callback):
+        if callback in self._suscriptores:
+            self._suscriptores.remove(callback)
+
+    def _notificar_cambios(self):
+        for callback in list(self._suscriptores):
+            callback()
+
+    def comprobar_cambios(self):
+        """Poll PRAGMA data_version; notify subscribers and return True if it moved.
+
+        The pragma only reads the WAL index, so polling it every second or
+        so costs next to nothing. Commits from this process's pooled
+        connections count as changes too, since they use other connections.
+        """
+        with self._detector_lock:
+            version = self._leer_data_version()
+            # A reopened detector connection starts a new baseline
+            anterior = self._version_vista
+            cambio = anterior is not None and anterior[0] == version[0] and anterior != version
+            self._version_vista = version
+        if cambio:
+            self._notificar_cambios()
+        return cambio
+
+    def _leer_data_version(self):
+        """(detector connection number, data_version); call with _detector_lock held."""
+        if self._conexion_detector is None:
+            self._conexion_detector = sqlite3.connect(self.db_name, check_same_thread=False)
+            self._aperturas_detector += 1
+        return self._aperturas_detector, self._conexion_detector.execute("PRAGMA data_version").fetchone()[0]
+
+    def version_datos(self):
+        """Token that differs whenever anything was committed since it was last read.
+
+        Comes from the detector connection's data_version, so reading it is
+        as cheap as comprobar_cambios() and leaves that baseline alone. After
+        the connections are closed (e.g. by a restore) the token changes too.
+        """
+        with self._detector_lock:
+            return self._leer_data_version()
+
+    def iniciar_detector(self, intervalo=1.0):
+        """Poll for changes every `intervalo` seconds on a background thread.
+
+        Subscribers are then called from that thread; UI code should hand
+        the work over to its own event loop.
+        """
+        if self._detector:
+            return
+        self.comprobar_cambios()
+
+        def bucle():
+            while not self._detener_detector.wait(intervalo):
+                try:
+                    self.comprobar_cambios()
+                except sqlite3.Error:
+                    pass  # e.g. the file is being swapped by a restore; try again next tick
+
+        self._detener_detector.clear()
+        self._detector = threading.Thread(target=bucle, name="inventario-detector", daemon=True)
+        self._detector.start()
+
+    def detener_detector(self):
+        if self._detector:
+            self._detener_detector.set()
+            self._detector.join()
+            self._detector = None
+
+    def _migrar(self):
+        """Bring the schema up to VERSION_ESQUEMA.
+
+        Each pending step runs in its own transaction together with the
+        PRAGMA user_version bump, so an up-to-date database costs one read.
+        Files created before auto_vacuum was enabled are left as they are;
+        activar_auto_vacuum() converts them when the caller chooses.
+        """
+        with self.conexion() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for numero in range(version + 1, self.VERSION_ESQUEMA + 1):
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Another process may have migrated while we waited for the lock
+                    if conn.execute("PRAGMA user_version").fetchone()[0] >= numero:
+                        conn.rollback()
+                        continue
+                    getattr(self, self._MIGRACIONES[numero - 1])(conn)
+                    conn.execute(f"PRAGMA user_version = {numero}")
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+    # Stand-ins for the unique name index on legacy databases that hold duplicates
+    _GUARDAS_NOMBRE = {
+        'trg_productos_nombre_unico_insert': """
+        CREATE TRIGGER IF NOT EXISTS trg_productos_nombre_unico_insert
+        BEFORE INSERT ON productos WHEN NEW.eliminado_en IS NULL AND EXISTS (
+            SELECT 1 FROM productos WHERE nombre = NEW.nombre COLLATE NOCASE AND eliminado_en IS NULL
+        ) BEGIN
+            SELECT RAISE(ABORT, 'UNIQUE constraint failed: productos.nombre');
+        END
+        """,
+        # Only renames and revivals are checked, so the old duplicates stay editable
+        'trg_productos_nombre_unico_update': """
+        CREATE TRIGGER IF NOT EXISTS trg_productos_nombre_unico_update
+        BEFORE UPDATE OF nombre, eliminado_en ON productos
+        WHEN NEW.eliminado_en IS NULL
+            AND (NEW.nombre IS NOT OLD.nombre COLLATE NOCASE OR OLD.eliminado_en IS NOT NULL)
+            AND EXISTS (
+                SELECT 1 FROM productos
+                WHERE nombre = NEW.nombre COLLATE NOCASE AND eliminado_en IS NULL AND id != NEW.id
+            ) BEGIN
+            SELECT RAISE(ABORT, 'UNIQUE constraint failed: productos.nombre');
+        END
+        """,
+    }
+
+    def _proteger_nombres_duplicados(self, conn):
+        """Enforce unique names on a legacy database that already held duplicates.
+
+        There idx_productos_nombre_dup cannot reject new duplicates, so
+        triggers do, raising IntegrityError just like the unique index.
+        activar_nombres_unicos() swaps them for the real index later.
+        """
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_productos_nombre_dup'").fetchone():
+            self._promover_nombres_unicos(conn)
+
+    def _promover_nombres_unicos(self, conn):
+        """Create the unique name index if no live duplicates remain, else the guard triggers."""
+        if conn.execute(
+            "SELECT 1 FROM productos WHERE eliminado_en IS NULL "
+            "GROUP BY nombre COLLATE NOCASE HAVING COUNT(*) > 1 LIMIT 1"
+        ).fetchone():
+            for sql in self._GUARDAS_NOMBRE.values():
+                conn.execute(sql)
+            return False
+        for trigger in self._GUARDAS_NOMBRE:
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute("DROP INDEX idx_productos_nombre_dup")
+        conn.execute(
+            "CREATE UNIQUE INDEX idx_productos_nombre "
+            "ON productos(nombre COLLATE NOCASE) WHERE eliminado_en IS NULL"
+        )
+        return True
+
+    def activar_nombres_unicos(self):
+        """Replace the legacy name triggers with the unique index once duplicates are resolved.
 
-    def _crear_tabla(self):
-        self.cursor.execute("""
+        Returns True when names are enforced by the unique index. Databases
+        that never held duplicates answer with a single read and no lock.
+        """
+        consulta = "SELECT 1 FROM sqlite_master WHERE name = 'idx_productos_nombre_dup'"
+        with self.conexion() as conn:
+            if conn.execute(consulta).fetchone() is None:
+                return True
+        with self.transaction() as conn:
+            # Another process may have promoted it while we waited for the lock
+            if conn.execute(consulta).fetchone() is None:
+                return True
+            return self._promover_nombres_unicos(conn)
+
+    def _crear_tabla(self, conn):
+        conn.execute("""
         CREATE TABLE IF NOT EXISTS productos (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         nombre TEXT NOT NULL,
@@ -18,119 +484,1385 @@ class InventarioModel:
         stock_minimo INTEGER DEFAULT 10
         )
         """)
-        self.conn.commit()
-        
+
         # Add stock_minimo column if it doesn't exist (for existing databases)
+        columnas = [fila[1] for fila in conn.execute("PRAGMA table_info(productos)")]
+        if 'stock_minimo' not in columnas:
+            conn.execute("ALTER TABLE productos ADD COLUMN stock_minimo INTEGER DEFAULT 10")
+
+    def _crear_indices(self, conn):
+        """Create the lookup indexes used by duplicate and low-stock checks."""
+        try:
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_productos_nombre "
+                "ON productos(nombre COLLATE NOCASE)"
+            )
+        except sqlite3.IntegrityError:
+            # Legacy database that already holds duplicate names: keep the
+            # lookup fast even though uniqueness can't be enforced yet.
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_productos_nombre_dup "
+                "ON productos(nombre COLLATE NOCASE)"
+            )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_productos_bajo_stock "
+            "ON productos(id) WHERE cantidad <= stock_minimo"
+        )
+
+    @staticmethod
+    def _delta_estadisticas(fila, signo):
+        """SET clause adding (signo '+') or removing (signo '-') one row's contribution."""
+        return f"""
+            total_productos = total_productos {signo} 1,
+            valor_total = valor_total {signo} {fila}.cantidad * {fila}.precio,
+            stock_total = stock_total {signo} {fila}.cantidad,
+            stock_minimo_total = stock_minimo_total {signo} IFNULL({fila}.stock_minimo, 10),
+            bajo_stock = bajo_stock {signo} IFNULL({fila}.cantidad <= {fila}.stock_minimo, 0),
+            sin_stock = sin_stock {signo} ({fila}.cantidad = 0)"""
+
+    def _crear_estadisticas(self, conn):
+        """Create the single-row summary table and the triggers that maintain it."""
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS estadisticas_inventario (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_productos INTEGER NOT NULL DEFAULT 0,
+        valor_total REAL NOT NULL DEFAULT 0,
+        stock_total INTEGER NOT NULL DEFAULT 0,
+        stock_minimo_total INTEGER NOT NULL DEFAULT 0,
+        bajo_stock INTEGER NOT NULL DEFAULT 0,
+        sin_stock INTEGER NOT NULL DEFAULT 0
+        )
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_productos_estadisticas_insert
+        AFTER INSERT ON productos BEGIN
+            UPDATE estadisticas_inventario SET {self._delta_estadisticas('NEW', '+')}
+            WHERE id = 1;
+        END
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_productos_estadisticas_delete
+        AFTER DELETE ON productos BEGIN
+            UPDATE estadisticas_inventario SET {self._delta_estadisticas('OLD', '-')}
+            WHERE id = 1;
+        END
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_productos_estadisticas_update
+        AFTER UPDATE OF cantidad, precio, stock_minimo ON productos BEGIN
+            UPDATE estadisticas_inventario SET {self._delta_estadisticas('OLD', '-')}
+            WHERE id = 1;
+            UPDATE estadisticas_inventario SET {self._delta_estadisticas('NEW', '+')}
+            WHERE id = 1;
+        END
+        """)
+        if conn.execute("SELECT 1 FROM estadisticas_inventario WHERE id = 1").fetchone() is None:
+            self._reconstruir_estadisticas(conn, 'productos')
+
+    def _reconstruir_estadisticas(self, conn, origen='productos_activos'):
+        conn.execute(f"""
+        INSERT OR REPLACE INTO estadisticas_inventario
+            (id, total_productos, valor_total, stock_total, stock_minimo_total, bajo_stock, sin_stock)
+        SELECT 1,
+            COUNT(*),
+            IFNULL(SUM(cantidad * precio), 0),
+            IFNULL(SUM(cantidad), 0),
+            IFNULL(SUM(IFNULL(stock_minimo, 10)), 0),
+            IFNULL(SUM(IFNULL(cantidad <= stock_minimo, 0)), 0),
+            IFNULL(SUM(cantidad = 0), 0)
+        FROM {origen}
+        """)
+
+    def reconstruir_estadisticas(self):
+        """Recompute the summary table from scratch (consistency repair)."""
+        with self.transaction() as conn:
+            self._reconstruir_estadisticas(conn)
+        return self.obtener_estadisticas()
+
+    def _crear_busqueda(self, conn):
+        """Create the FTS5 name index (accent-insensitive) and its sync triggers."""
         try:
-            self.cursor.execute("ALTER TABLE productos ADD COLUMN stock_minimo INTEGER DEFAULT 10")
-            self.conn.commit()
+            conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts USING fts5(
+            nombre,
+            content='productos',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+            )
+            """)
         except sqlite3.OperationalError:
-            pass  # Column already exists
+            return  # SQLite built without FTS5: buscar_productos falls back to LIKE
 
-    def agregar_producto(self, nombre, cantidad, precio, stock_minimo=10):
-        self.cursor.execute(
-            "INSERT INTO productos (nombre, cantidad, precio, stock_minimo) VALUES (?, ?, ?, ?)",
-            (nombre, cantidad, precio, stock_minimo)
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_productos_fts_insert
+        AFTER INSERT ON productos BEGIN
+            INSERT INTO productos_fts (rowid, nombre) VALUES (NEW.id, NEW.nombre);
+        END
+        """)
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_productos_fts_delete
+        AFTER DELETE ON productos BEGIN
+            INSERT INTO productos_fts (productos_fts, rowid, nombre) VALUES ('delete', OLD.id, OLD.nombre);
+        END
+        """)
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_productos_fts_update
+        AFTER UPDATE OF nombre ON productos BEGIN
+            INSERT INTO productos_fts (productos_fts, rowid, nombre) VALUES ('delete', OLD.id, OLD.nombre);
+            INSERT INTO productos_fts (rowid, nombre) VALUES (NEW.id, NEW.nombre);
+        END
+        """)
+        conn.execute("INSERT INTO productos_fts (productos_fts) VALUES ('rebuild')")
+
+    def _crear_movimientos(self, conn):
+        """Create the append-only stock ledger and its per-product snapshots."""
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS movimientos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        producto_id INTEGER NOT NULL,
+        tipo TEXT NOT NULL CHECK (tipo IN ('entrada', 'venta', 'ajuste')),
+        cantidad INTEGER NOT NULL,
+        fecha TEXT NOT NULL
+        )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_movimientos_producto ON movimientos(producto_id)"
+        )
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS snapshots_stock (
+        producto_id INTEGER NOT NULL,
+        movimiento_id INTEGER NOT NULL,
+        fecha TEXT NOT NULL,
+        cantidad INTEGER NOT NULL,
+        PRIMARY KEY (producto_id, movimiento_id)
+        ) WITHOUT ROWID
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_snapshots_stock_fecha ON snapshots_stock(producto_id, fecha)"
+        )
+        # Opening balance for products that existed before the ledger
+        conn.execute(
+            "INSERT INTO movimientos (producto_id, tipo, cantidad, fecha) "
+            "SELECT id, 'entrada', cantidad, ? FROM productos WHERE cantidad != 0",
+            (self._ahora(),)
         )
-        self.conn.commit()
 
-    def eliminar_producto(self, producto_id):
-        self.cursor.execute("DELETE FROM productos WHERE id = ?", (producto_id,))
-        self.conn.commit()
+    def _crear_papelera(self, conn):
+        """Switch to soft deletes: a tombstone column hidden behind productos_activos.
 
-    def actualizar_producto(self, producto_id, nombre, cantidad, precio, stock_minimo=None):
-        if stock_minimo is not None:
-            self.cursor.execute(
-                "UPDATE productos SET nombre = ?, cantidad = ?, precio = ?, stock_minimo = ? WHERE id = ?",
-                (nombre, cantidad, precio, stock_minimo, producto_id)
+        Name uniqueness, the low-stock index and the statistics triggers are
+        rebuilt so they only cover live rows; purgar_eliminados() removes old
+        tombstones for good.
+        """
+        columnas = [fila[1] for fila in conn.execute("PRAGMA table_info(productos)")]
+        if 'eliminado_en' not in columnas:
+            conn.execute("ALTER TABLE productos ADD COLUMN eliminado_en TEXT")
+        conn.execute(f"""
+        CREATE VIEW IF NOT EXISTS productos_activos AS
+        SELECT {_SELECT_PRODUCTO} FROM productos WHERE eliminado_en IS NULL
+        """)
+
+        duplicados = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'idx_productos_nombre_dup'"
+        ).fetchone()
+        conn.execute("DROP INDEX IF EXISTS idx_productos_nombre")
+        conn.execute("DROP INDEX IF EXISTS idx_productos_nombre_dup")
+        # A deleted product's name can be reused, so only live rows are unique
+        conn.execute(
+            f"CREATE {'' if duplicados else 'UNIQUE '}INDEX "
+            f"idx_productos_nombre{'_dup' if duplicados else ''} "
+            "ON productos(nombre COLLATE NOCASE) WHERE eliminado_en IS NULL"
+        )
+        conn.execute("DROP INDEX IF EXISTS idx_productos_bajo_stock")
+        conn.execute(
+            "CREATE INDEX idx_productos_bajo_stock "
+            "ON productos(id) WHERE cantidad <= stock_minimo AND eliminado_en IS NULL"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_productos_eliminados "
+            "ON productos(eliminado_en) WHERE eliminado_en IS NOT NULL"
+        )
+
+        for evento in ('insert', 'delete', 'update'):
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_productos_estadisticas_{evento}")
+        conn.execute(f"""
+        CREATE TRIGGER trg_productos_estadisticas_insert
+        AFTER INSERT ON productos WHEN NEW.eliminado_en IS NULL BEGIN
+            UPDATE estadisticas_inventario SET {self._delta_estadisticas('NEW', '+')}
+            WHERE id = 1;
+        END
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER trg_productos_estadisticas_delete
+        AFTER DELETE ON productos WHEN OLD.eliminado_en IS NULL BEGIN
+            UPDATE estadisticas_inventario SET {self._delta_estadisticas('OLD', '-')}
+            WHERE id = 1;
+        END
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER trg_productos_estadisticas_update
+        AFTER UPDATE OF cantidad, precio, stock_minimo, eliminado_en ON productos BEGIN
+            UPDATE estadisticas_inventario SET {self._delta_estadisticas('OLD', '-')}
+            WHERE id = 1 AND OLD.eliminado_en IS NULL;
+            UPDATE estadisticas_inventario SET {self._delta_estadisticas('NEW', '+')}
+            WHERE id = 1 AND NEW.eliminado_en IS NULL;
+        END
+        """)
+        self._reconstruir_estadisticas(conn)
+
+    def _crear_ubicaciones(self, conn):
+        """Create locations, per-(product, location) stock and per-location totals.
+
+        productos.cantidad stays the company-wide total; stock_ubicaciones
+        splits it by location, and totales_ubicacion keeps each location's
+        rollup current through triggers so summaries never scan stock rows.
+        Existing stock starts out in the default location.
+        """
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS ubicaciones (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL
+        )
+        """)
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_ubicaciones_nombre ON ubicaciones(nombre COLLATE NOCASE)"
+        )
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_ubicaciones (
+        producto_id INTEGER NOT NULL,
+        ubicacion_id INTEGER NOT NULL,
+        cantidad INTEGER NOT NULL,
+        PRIMARY KEY (producto_id, ubicacion_id)
+        ) WITHOUT ROWID
+        """)
+        # Covering index for per-location listings and low-stock checks
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_stock_ubicaciones_ubicacion "
+            "ON stock_ubicaciones(ubicacion_id, producto_id, cantidad)"
+        )
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS totales_ubicacion (
+        ubicacion_id INTEGER PRIMARY KEY,
+        productos INTEGER NOT NULL DEFAULT 0,
+        unidades INTEGER NOT NULL DEFAULT 0,
+        valor REAL NOT NULL DEFAULT 0
+        )
+        """)
+
+        precio = "(SELECT precio FROM productos WHERE id = {fila}.producto_id)"
+        def delta(fila, signo):
+            return f"""
+                productos = productos {signo} ({fila}.cantidad != 0),
+                unidades = unidades {signo} {fila}.cantidad,
+                valor = valor {signo} {fila}.cantidad * {precio.format(fila=fila)}"""
+
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_ubicaciones_insert
+        AFTER INSERT ON ubicaciones BEGIN
+            INSERT INTO totales_ubicacion (ubicacion_id) VALUES (NEW.id);
+        END
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_stock_ubicaciones_insert
+        AFTER INSERT ON stock_ubicaciones BEGIN
+            UPDATE totales_ubicacion SET {delta('NEW', '+')}
+            WHERE ubicacion_id = NEW.ubicacion_id;
+        END
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_stock_ubicaciones_delete
+        AFTER DELETE ON stock_ubicaciones BEGIN
+            UPDATE totales_ubicacion SET {delta('OLD', '-')}
+            WHERE ubicacion_id = OLD.ubicacion_id;
+        END
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_stock_ubicaciones_update
+        AFTER UPDATE OF cantidad ON stock_ubicaciones BEGIN
+            UPDATE totales_ubicacion SET {delta('OLD', '-')}
+            WHERE ubicacion_id = OLD.ubicacion_id;
+            UPDATE totales_ubicacion SET {delta('NEW', '+')}
+            WHERE ubicacion_id = NEW.ubicacion_id;
+        END
+        """)
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_productos_precio_ubicaciones
+        AFTER UPDATE OF precio ON productos BEGIN
+            UPDATE totales_ubicacion SET valor = valor + (NEW.precio - OLD.precio) * (
+                SELECT s.cantidad FROM stock_ubicaciones s
+                WHERE s.producto_id = NEW.id AND s.ubicacion_id = totales_ubicacion.ubicacion_id
             )
-        else:
-            self.cursor.execute(
-                "UPDATE productos SET nombre = ?, cantidad = ?, precio = ? WHERE id = ?",
-                (nombre, cantidad, precio, producto_id)
+            WHERE ubicacion_id IN (SELECT ubicacion_id FROM stock_ubicaciones WHERE producto_id = NEW.id);
+        END
+        """)
+        conn.execute("""
+        CREATE VIEW IF NOT EXISTS resumen_ubicaciones AS
+        SELECT u.id, u.nombre, t.productos, t.unidades, t.valor
+        FROM ubicaciones u JOIN totales_ubicacion t ON t.ubicacion_id = u.id
+        """)
+
+        conn.execute(
+            "INSERT OR IGNORE INTO ubicaciones (id, nombre) VALUES (?, 'Principal')",
+            (self.UBICACION_PRINCIPAL,)
+        )
+        conn.execute(
+            "INSERT INTO stock_ubicaciones (producto_id, ubicacion_id, cantidad) "
+            "SELECT id, ?, cantidad FROM productos_activos WHERE cantidad != 0",
+            (self.UBICACION_PRINCIPAL,)
+        )
+
+    def _crear_archivo(self, conn):
+        """Track each product's last change so idle ones can be archived.
+
+        actualizado_en is stamped by triggers on insert and on any change to
+        the product's data or stock; existing rows start from their newest
+        ledger entry. The partial index only holds archival candidates.
+        """
+        columnas = [fila[1] for fila in conn.execute("PRAGMA table_info(productos)")]
+        if 'actualizado_en' not in columnas:
+            conn.execute("ALTER TABLE productos ADD COLUMN actualizado_en TEXT")
+        conn.execute(
+            "UPDATE productos SET actualizado_en = IFNULL("
+            "(SELECT MAX(fecha) FROM movimientos WHERE producto_id = productos.id), ?)",
+            (self._ahora(),)
+        )
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_productos_actividad_insert
+        AFTER INSERT ON productos WHEN NEW.actualizado_en IS NULL BEGIN
+            UPDATE productos SET actualizado_en = datetime('now', 'localtime') WHERE id = NEW.id;
+        END
+        """)
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_productos_actividad_update
+        AFTER UPDATE OF nombre, cantidad, precio, stock_minimo ON productos BEGIN
+            UPDATE productos SET actualizado_en = datetime('now', 'localtime') WHERE id = NEW.id;
+        END
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_productos_inactivos "
+            "ON productos(actualizado_en) WHERE cantidad = 0 AND eliminado_en IS NULL"
+        )
+
+    def _ajustar_ubicaciones(self, conn, ajustes):
+        """Apply (producto_id, ubicacion_id, delta) changes to per-location stock."""
+        conn.executemany(
+            "INSERT INTO stock_ubicaciones (producto_id, ubicacion_id, cantidad) VALUES (?, ?, ?) "
+            "ON CONFLICT (producto_id, ubicacion_id) DO UPDATE SET cantidad = cantidad + excluded.cantidad",
+            ajustes
+        )
+
+    def _validar_ubicacion(self, conn, ubicacion_id):
+        if conn.execute("SELECT 1 FROM ubicaciones WHERE id = ?", (ubicacion_id,)).fetchone() is None:
+            raise ValueError(f"Ubicación inexistente: {ubicacion_id}")
+
+    def _registrar_movimientos(self, conn, movimientos, ubicacion_id=StorageBackend.UBICACION_PRINCIPAL):
+        """Append (producto_id, tipo, cantidad, fecha) rows and snapshot busy products.
+
+        The deltas are also applied to `ubicacion_id`'s stock, unless it is
+        None because the caller already updated the locations itself. A
+        delta that would leave the location below zero (stock moved to
+        another location cannot be sold or edited away from this one)
+        raises ValueError, rolling back the caller's transaction.
+        """
+        if not movimientos:
+            return
+        if ubicacion_id is not None:
+            self._ajustar_ubicaciones(conn, [(m[0], ubicacion_id, m[2]) for m in movimientos])
+            faltante = conn.execute(
+                "SELECT producto_id FROM stock_ubicaciones WHERE ubicacion_id = ? AND cantidad < 0 "
+                "AND producto_id IN (SELECT value FROM json_each(?))",
+                (ubicacion_id, json.dumps(sorted({m[0] for m in movimientos})))
+            ).fetchone()
+            if faltante:
+                raise ValueError(f"Stock insuficiente en la ubicación {ubicacion_id}: {faltante[0]}")
+        # A back-dated movement voids the snapshots dated after it, so every
+        # movement past a snapshot is dated no earlier (stock_a_fecha relies on it)
+        primeras = {}
+        for producto_id, _, _, fecha in movimientos:
+            primeras[producto_id] = min(fecha, primeras.get(producto_id, fecha))
+        conn.executemany("DELETE FROM snapshots_stock WHERE producto_id = ? AND fecha > ?", primeras.items())
+        conn.executemany(
+            "INSERT INTO movimientos (producto_id, tipo, cantidad, fecha) VALUES (?, ?, ?, ?)",
+            movimientos
+        )
+        self._crear_snapshots(conn, self.MOVIMIENTOS_POR_SNAPSHOT, primeras)
+
+    def _crear_snapshots(self, conn, umbral, productos=None):
+        """Snapshot every product with at least `umbral` movements since its last snapshot.
+
+        The snapshot records the product's current quantity together with the
+        newest movement it covers, so it must run in the same transaction as
+        the writes it summarizes. Its fecha is the latest date among all the
+        movements it covers, earlier snapshots included, so back-dated
+        movements never make it answer for a date before one it contains.
+        """
+        filtro = ""
+        params = []
+        if productos is not None:
+            filtro = "AND mv.producto_id IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(sorted(productos)))
+        params.append(umbral)
+        cursor = conn.execute(f"""
+        INSERT OR REPLACE INTO snapshots_stock (producto_id, movimiento_id, fecha, cantidad)
+        SELECT p.id, m.ultimo, MAX(m.fecha, IFNULL((
+            SELECT MAX(s.fecha) FROM snapshots_stock s WHERE s.producto_id = p.id
+        ), m.fecha)), p.cantidad
+        FROM (
+            SELECT mv.producto_id, MAX(mv.id) AS ultimo, MAX(mv.fecha) AS fecha, COUNT(*) AS n
+            FROM movimientos mv
+            WHERE mv.id > IFNULL((
+                SELECT MAX(s.movimiento_id) FROM snapshots_stock s
+                WHERE s.producto_id = mv.producto_id
+            ), 0)
+            {filtro}
+            GROUP BY mv.producto_id
+        ) m
+        JOIN productos p ON p.id = m.producto_id
+        WHERE m.n >= ?
+        """, params)
+        return cursor.rowcount
+
+    def crear_snapshots(self, umbral=1):
+        """Snapshot all products with at least `umbral` new movements; returns how many."""
+        with self.transaction() as conn:
+            return self._crear_snapshots(conn, umbral)
+
+    def registrar_movimientos(self, movimientos, tamano_lote=1000, ubicacion_id=None):
+        """Apply stock movements in batches, one transaction per chunk.
+
+        `movimientos` is an iterable of (producto_id, tipo, cantidad[, fecha])
+        rows. 'entrada' adds and 'venta' subtracts abs(cantidad); 'ajuste'
+        applies cantidad as a signed delta. The stock changes at
+        `ubicacion_id` (the default location when None); a chunk that would
+        leave it below zero raises ValueError. Returns the number applied.
+        """
+        ubicacion_id = ubicacion_id or self.UBICACION_PRINCIPAL
+        aplicados = 0
+        for lote in self._lotes_movimientos(movimientos, tamano_lote):
+            with self.transaction() as conn:
+                self._validar_ubicacion(conn, ubicacion_id)
+                cursor = conn.executemany(
+                    "UPDATE productos SET cantidad = cantidad + ? WHERE id = ? AND eliminado_en IS NULL",
+                    [(m[2], m[0]) for m in lote]
+                )
+                if cursor.rowcount != len(lote):
+                    raise ValueError("El lote contiene movimientos de productos inexistentes")
+                self._registrar_movimientos(conn, lote, ubicacion_id)
+            aplicados += len(lote)
+        return aplicados
+
+    def ajustar_stock(self, producto_id, delta, tipo='ajuste', ubicacion_id=None):
+        """Add `delta` (negative to take stock out) to a product; returns the new quantity."""
+        return self.ajustar_stock_lote([(producto_id, delta)], tipo, ubicacion_id)[producto_id]
+
+    def ajustar_stock_lote(self, ajustes, tipo='ajuste', ubicacion_id=None):
+        """Apply (producto_id, delta) adjustments atomically; returns {id: new quantity}.
+
+        Each adjustment is one relative UPDATE guarded against going below
+        zero, so concurrent sellers cannot lose each other's updates. The
+        whole batch is one transaction: if any product is missing or short
+        of stock (in total or at `ubicacion_id`), nothing is applied and
+        ValueError is raised.
+        """
+        if tipo not in self.TIPOS_MOVIMIENTO:
+            raise ValueError(f"Tipo de movimiento no válido: {tipo}")
+        ubicacion_id = ubicacion_id or self.UBICACION_PRINCIPAL
+        ajustes = [(producto_id, int(delta)) for producto_id, delta in ajustes]
+        ahora = self._ahora()
+        nuevas = {}
+        with self.transaction() as conn:
+            self._validar_ubicacion(conn, ubicacion_id)
+            for producto_id, delta in ajustes:
+                fila = conn.execute(
+                    "UPDATE productos SET cantidad = cantidad + ? "
+                    "WHERE id = ? AND eliminado_en IS NULL AND cantidad + ? >= 0 RETURNING cantidad",
+                    (delta, producto_id, delta)
+                ).fetchone()
+                if fila is None:
+                    raise ValueError(f"Stock insuficiente o producto inexistente: {producto_id}")
+                nuevas[producto_id] = fila[0]
+            self._registrar_movimientos(
+                conn, [(producto_id, tipo, delta, ahora) for producto_id, delta in ajustes if delta], ubicacion_id
+            )
+        return nuevas
+
+    def obtener_movimientos(self, producto_id, limite=100):
+        """Most recent ledger entries for a product, newest first."""
+        with self.conexion() as conn:
+            return conn.execute(
+                "SELECT id, producto_id, tipo, cantidad, fecha FROM movimientos "
+                "WHERE producto_id = ? ORDER BY id DESC LIMIT ?",
+                (producto_id, limite)
+            ).fetchall()
+
+    def stock_a_fecha(self, producto_id, fecha):
+        """Stock of a product as of `fecha`: nearest snapshot plus the deltas after it.
+
+        Only the movements between that snapshot and the next one are read:
+        anything recorded after the next snapshot is dated after `fecha`.
+        """
+        fecha = self._fecha(fecha)
+        with self.conexion() as conn:
+            snapshot = conn.execute(
+                "SELECT movimiento_id, cantidad FROM snapshots_stock "
+                "WHERE producto_id = ? AND fecha <= ? "
+                "ORDER BY fecha DESC, movimiento_id DESC LIMIT 1",
+                (producto_id, fecha)
+            ).fetchone()
+            siguiente = conn.execute(
+                "SELECT movimiento_id FROM snapshots_stock "
+                "WHERE producto_id = ? AND fecha > ? "
+                "ORDER BY fecha, movimiento_id LIMIT 1",
+                (producto_id, fecha)
+            ).fetchone()
+            desde, base = snapshot if snapshot else (0, 0)
+            params = [producto_id, desde, fecha]
+            if siguiente:
+                params.append(siguiente[0])
+            delta = conn.execute(
+                "SELECT IFNULL(SUM(cantidad), 0) FROM movimientos "
+                f"WHERE producto_id = ? AND id > ? AND fecha <= ? {'AND id <= ?' if siguiente else ''}",
+                params
+            ).fetchone()[0]
+        return base + delta
+
+    def crear_ubicacion(self, nombre):
+        """Add a location (warehouse, store...); returns its id."""
+        with self.transaction() as conn:
+            return conn.execute("INSERT INTO ubicaciones (nombre) VALUES (?)", (nombre,)).lastrowid
+
+    def obtener_ubicaciones(self):
+        """Every location with its rollup: (id, nombre, productos, unidades, valor)."""
+        with self.conexion() as conn:
+            return conn.execute(
+                "SELECT id, nombre, productos, unidades, valor FROM resumen_ubicaciones ORDER BY id"
+            ).fetchall()
+
+    def obtener_stock_ubicaciones(self, producto_id):
+        """A product's stock split by location: (ubicacion_id, nombre, cantidad)."""
+        with self.conexion() as conn:
+            return conn.execute(
+                "SELECT u.id, u.nombre, s.cantidad FROM stock_ubicaciones s "
+                "JOIN ubicaciones u ON u.id = s.ubicacion_id "
+                "WHERE s.producto_id = ? AND s.cantidad != 0 ORDER BY u.id",
+                (producto_id,)
+            ).fetchall()
+
+    def transferir_stock(self, producto_id, origen_id, destino_id, cantidad):
+        """Move `cantidad` units of a product between locations atomically.
+
+        The company-wide total does not change, so nothing is written to the
+        ledger. Raises ValueError if the origin does not hold enough stock.
+        """
+        cantidad = int(cantidad)
+        if cantidad <= 0 or origen_id == destino_id:
+            raise ValueError("La transferencia necesita una cantidad positiva y dos ubicaciones distintas")
+        with self.transaction() as conn:
+            self._validar_ubicacion(conn, destino_id)
+            cursor = conn.execute(
+                "UPDATE stock_ubicaciones SET cantidad = cantidad - ? "
+                "WHERE producto_id = ? AND ubicacion_id = ? AND cantidad >= ?",
+                (cantidad, producto_id, origen_id, cantidad)
+            )
+            if cursor.rowcount != 1:
+                raise ValueError("Stock insuficiente en la ubicación de origen")
+            self._ajustar_ubicaciones(conn, [(producto_id, destino_id, cantidad)])
+
+    def obtener_productos_bajo_stock_ubicacion(self, ubicacion_id):
+        """Products a location carries at or below their stock_minimo."""
+        with self.conexion() as conn:
+            return self._consultar_productos(conn, f"""
+            SELECT {", ".join(("p." + c) if c != 'cantidad' else "s.cantidad" for c in COLUMNAS_PRODUCTO)}
+            FROM stock_ubicaciones s JOIN productos_activos p ON p.id = s.producto_id
+            WHERE s.ubicacion_id = ? AND s.cantidad <= p.stock_minimo
+            ORDER BY s.producto_id
+            """, (ubicacion_id,)).fetchall()
+
+    def agregar_producto(self, nombre, cantidad, precio, stock_minimo=10):
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO productos (nombre, cantidad, precio, stock_minimo) VALUES (?, ?, ?, ?)",
+                (nombre, cantidad, precio, stock_minimo)
+            )
+            if int(cantidad):
+                self._registrar_movimientos(
+                    conn, [(cursor.lastrowid, 'entrada', int(cantidad), self._ahora())]
+                )
+
+    def agregar_productos_lote(self, productos, tamano_lote=1000):
+        """Insert many products, committing once per chunk of `tamano_lote` rows.
+
+        `productos` is any iterable of (nombre, cantidad, precio[, stock_minimo])
+        rows. Returns a dict with inserted/rejected counts and throughput.
+        """
+        sql = "INSERT INTO productos (nombre, cantidad, precio, stock_minimo) VALUES (?, ?, ?, ?)"
+        tamano_lote = max(1, int(tamano_lote))
+        insertados = 0
+        rechazados = 0
+        inicio = time.perf_counter()
+
+        with self.conexion() as conn:
+            lote = []
+            for fila in productos:
+                fila = tuple(fila)
+                if len(fila) == 3:
+                    fila = fila + (10,)
+                if len(fila) != 4:
+                    rechazados += 1
+                    continue
+                lote.append(fila)
+                if len(lote) >= tamano_lote:
+                    ok, fallidos = self._insertar_lote(conn, sql, lote)
+                    insertados += ok
+                    rechazados += fallidos
+                    lote = []
+            if lote:
+                ok, fallidos = self._insertar_lote(conn, sql, lote)
+                insertados += ok
+                rechazados += fallidos
+
+        duracion = time.perf_counter() - inicio
+        return {
+            'insertados': insertados,
+            'rechazados': rechazados,
+            'duracion': duracion,
+            'filas_por_segundo': insertados / duracion if duracion > 0 else 0.0
+        }
+
+    def _insertar_lote(self, conn, sql, lote):
+        """Insert one chunk in a single transaction.
+
+        If any row violates a constraint the chunk is retried row by row so
+        the valid rows still go in and the rest are counted as rejected.
+        """
+        with self.transaction():
+            # AUTOINCREMENT ids only grow, so new rows are the ones above this
+            ultimo_id = conn.execute("SELECT IFNULL(MAX(id), 0) FROM productos").fetchone()[0]
+            try:
+                with self.transaction():
+                    conn.executemany(sql, lote)
+                insertados = len(lote)
+            except sqlite3.IntegrityError:
+                insertados = 0
+                for fila in lote:
+                    try:
+                        conn.execute(sql, fila)
+                        insertados += 1
+                    except sqlite3.IntegrityError:
+                        pass
+            conn.execute(
+                "INSERT INTO movimientos (producto_id, tipo, cantidad, fecha) "
+                "SELECT id, 'entrada', cantidad, ? FROM productos WHERE id > ? AND cantidad != 0",
+                (self._ahora(), ultimo_id)
+            )
+            conn.execute(
+                "INSERT INTO stock_ubicaciones (producto_id, ubicacion_id, cantidad) "
+                "SELECT id, ?, cantidad FROM productos WHERE id > ? AND cantidad != 0",
+                (self.UBICACION_PRINCIPAL, ultimo_id)
+            )
+        return insertados, len(lote) - insertados
+
+    # Matches idx_productos_nombre (partial, NOCASE) so SQLite accepts it as the conflict target.
+    # ?4 is reused: a row without stock_minimo keeps the existing one (10 for new products).
+    _SQL_UPSERT = """
+        INSERT INTO productos (nombre, cantidad, precio, stock_minimo) VALUES (?1, ?2, ?3, IFNULL(?4, 10))
+        ON CONFLICT (nombre COLLATE NOCASE) WHERE eliminado_en IS NULL DO UPDATE SET
+            cantidad = excluded.cantidad,
+            precio = excluded.precio,
+            stock_minimo = IFNULL(?4, stock_minimo)
+        WHERE cantidad != excluded.cantidad OR precio != excluded.precio
+            OR stock_minimo IS NOT IFNULL(?4, stock_minimo)
+    """
+    # Without that index (legacy files with duplicate names) ON CONFLICT has no
+    # target, so rows are updated by name first and inserted only if absent
+    _SQL_UPSERT_ACTUALIZAR = """
+        UPDATE productos SET cantidad = ?2, precio = ?3, stock_minimo = IFNULL(?4, stock_minimo)
+        WHERE nombre = ?1 COLLATE NOCASE AND eliminado_en IS NULL
+            AND (cantidad != ?2 OR precio != ?3 OR stock_minimo IS NOT IFNULL(?4, stock_minimo))
+    """
+    _SQL_UPSERT_INSERTAR = """
+        INSERT INTO productos (nombre, cantidad, precio, stock_minimo) SELECT ?1, ?2, ?3, IFNULL(?4, 10)
+        WHERE NOT EXISTS (SELECT 1 FROM productos_activos WHERE nombre = ?1 COLLATE NOCASE)
+    """
+
+    def upsert_productos_lote(self, productos, tamano_lote=1000):
+        """Insert new products and update existing ones (matched by name), chunk by chunk.
+
+        `productos` is any iterable of (nombre, cantidad, precio[, stock_minimo])
+        rows; updates overwrite quantity and price and, when given,
+        stock_minimo. Rows identical to what is stored are not rewritten.
+        Quantity changes land on the default location, so a chunk that would
+        take it below zero raises ValueError. Returns inserted/updated/unchanged/rejected counts and throughput.
+        """
+        tamano_lote = max(1, int(tamano_lote))
+        totales = dict.fromkeys(('insertados', 'actualizados', 'sin_cambios', 'rechazados'), 0)
+        inicio = time.perf_counter()
+
+        with self.conexion() as conn:
+            lote = []
+            for fila in productos:
+                fila = tuple(fila)
+                if len(fila) == 3:
+                    fila = fila + (None,)
+                if len(fila) != 4:
+                    totales['rechazados'] += 1
+                    continue
+                lote.append(fila)
+                if len(lote) >= tamano_lote:
+                    for clave, valor in self._upsert_lote(conn, lote).items():
+                        totales[clave] += valor
+                    lote = []
+            if lote:
+                for clave, valor in self._upsert_lote(conn, lote).items():
+                    totales[clave] += valor
+
+        duracion = time.perf_counter() - inicio
+        procesados = totales['insertados'] + totales['actualizados'] + totales['sin_cambios']
+        totales['duracion'] = duracion
+        totales['filas_por_segundo'] = procesados / duracion if duracion > 0 else 0.0
+        return totales
+
+    def _upsert_lote(self, conn, lote):
+        """Upsert one chunk in a single transaction and log the stock deltas.
+
+        The quantities of the rows about to be updated are read first, so
+        the ledger and the default location get the differences.
+        """
+        with self.transaction():
+            ultimo_id = conn.execute("SELECT IFNULL(MAX(id), 0) FROM productos").fetchone()[0]
+            nombres = json.dumps([str(fila[0]) for fila in lote])
+            consulta_cantidades = (
+                "SELECT id, cantidad FROM productos_activos "
+                "WHERE nombre COLLATE NOCASE IN (SELECT value FROM json_each(?))"
+            )
+            anteriores = dict(conn.execute(consulta_cantidades, (nombres,)).fetchall())
+            indice_unico = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'idx_productos_nombre'"
+            ).fetchone() is not None
+
+            def upsert(fila):
+                if indice_unico:
+                    return conn.execute(self._SQL_UPSERT, fila).rowcount
+                # Legacy duplicates all get the update but count as one row
+                if conn.execute(self._SQL_UPSERT_ACTUALIZAR, fila).rowcount:
+                    return 1
+                return conn.execute(self._SQL_UPSERT_INSERTAR, fila).rowcount
+
+            try:
+                with self.transaction():
+                    if indice_unico:
+                        cambios = conn.executemany(self._SQL_UPSERT, lote).rowcount
+                    else:
+                        cambios = sum(upsert(fila) for fila in lote)
+                rechazados = 0
+            except sqlite3.IntegrityError:
+                cambios = rechazados = 0
+                for fila in lote:
+                    try:
+                        cambios += upsert(fila)
+                    except sqlite3.IntegrityError:
+                        rechazados += 1
+
+            ahora = self._ahora()
+            insertados = conn.execute(
+                "SELECT COUNT(*) FROM productos WHERE id > ?", (ultimo_id,)
+            ).fetchone()[0]
+            movimientos = [
+                (producto_id, 'ajuste', cantidad - anteriores[producto_id], ahora)
+                for producto_id, cantidad in conn.execute(consulta_cantidades, (nombres,))
+                if producto_id in anteriores and cantidad != anteriores[producto_id]
+            ]
+            movimientos += [
+                (producto_id, 'entrada', cantidad, ahora)
+                for producto_id, cantidad in conn.execute(
+                    "SELECT id, cantidad FROM productos WHERE id > ? AND cantidad != 0", (ultimo_id,)
+                )
+            ]
+            self._registrar_movimientos(conn, movimientos)
+        return {
+            'insertados': insertados,
+            'actualizados': cambios - insertados,
+            'sin_cambios': len(lote) - cambios - rechazados,
+            'rechazados': rechazados,
+        }
+
+    def eliminar_producto(self, producto_id):
+        """Soft-delete a product; the tombstone stays until purgar_eliminados()."""
+        with self.transaction() as conn:
+            fila = conn.execute("SELECT cantidad FROM productos_activos WHERE id = ?", (producto_id,)).fetchone()
+            # Zero the tombstone and close the ledger to match, so as-of queries stay correct
+            conn.execute(
+                "UPDATE productos SET cantidad = 0, eliminado_en = ? WHERE id = ? AND eliminado_en IS NULL",
+                (self._ahora(), producto_id)
             )
-        self.conn.commit()
+            conn.execute("DELETE FROM stock_ubicaciones WHERE producto_id = ?", (producto_id,))
+            if fila and fila[0]:
+                self._registrar_movimientos(conn, [(producto_id, 'ajuste', -fila[0], self._ahora())], None)
+
+    def purgar_eliminados(self, dias=30, tamano_lote=500):
+        """Permanently remove products soft-deleted more than `dias` days ago.
+
+        Tombstones go together with their ledger history, `tamano_lote` per
+        transaction so writers are never blocked for long. The freed pages
+        are reclaimed by vacuum_incremental(). Returns how many were purged.
+        """
+        limite = self._fecha(datetime.now() - timedelta(days=dias))
+        purgados = 0
+        while True:
+            with self.transaction() as conn:
+                ids = [fila[0] for fila in conn.execute(
+                    "SELECT id FROM productos WHERE eliminado_en IS NOT NULL AND eliminado_en < ? LIMIT ?",
+                    (limite, tamano_lote)
+                )]
+                if not ids:
+                    break
+                lote = json.dumps(ids)
+                conn.execute("DELETE FROM snapshots_stock WHERE producto_id IN (SELECT value FROM json_each(?))", (lote,))
+                conn.execute("DELETE FROM movimientos WHERE producto_id IN (SELECT value FROM json_each(?))", (lote,))
+                conn.execute("DELETE FROM productos WHERE id IN (SELECT value FROM json_each(?))", (lote,))
+            purgados += len(ids)
+        return purgados
+
+    def vacuum_incremental(self, paginas=256):
+        """Return up to `paginas` free pages to the filesystem; returns how many.
+
+        Each call is a short write, unlike a full VACUUM, so it can run on
+        a schedule while the application is in use. It commits on its own,
+        so calling it inside transaction() raises RuntimeError.
+        """
+        if getattr(self._local, 'nivel_transaccion', 0):
+            raise RuntimeError("No se puede liberar espacio dentro de una transacción")
+        with self.conexion() as conn:
+            libres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            pendientes = min(libres, max(1, int(paginas)))
+            if not pendientes:
+                return 0
+            # The pragma frees one page per step and sqlite3 only steps a
+            # statement without result columns once, so repeat it in one commit
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for _ in range(pendientes):
+                    conn.execute("PRAGMA incremental_vacuum(1)")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return libres - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def activar_auto_vacuum(self):
+        """Switch a file created before auto_vacuum was enabled to incremental mode.
+
+        That takes one full VACUUM, which rewrites the whole file and holds
+        every other connection off until it finishes, so it never runs on
+        open: call it from a maintenance window, outside transaction().
+        Returns False when the file already uses it.
+        """
+        with self.conexion() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return False
+            # The connection already asked for INCREMENTAL; VACUUM applies it
+            conn.execute("VACUUM")
+            return True
+
+    @contextmanager
+    def _archivo_adjunto(self, crear=True):
+        """Attach the archive database as `archivo` to the thread's connection.
+
+        Yields None when the archive does not exist and `crear` is False.
+        ATTACH and DETACH cannot run inside a transaction, so neither can
+        callers of this.
+        """
+        if not crear and not os.path.exists(self.archivo):
+            yield None
+            return
+        with self.conexion() as conn:
+            conn.execute("ATTACH DATABASE ? AS archivo", (self.archivo,))
+            try:
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS archivo.productos (
+                id INTEGER PRIMARY KEY,
+                nombre TEXT NOT NULL,
+                cantidad INTEGER NOT NULL,
+                precio REAL NOT NULL,
+                stock_minimo INTEGER,
+                actualizado_en TEXT,
+                archivado_en TEXT NOT NULL
+                )
+                """)
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS archivo.idx_productos_nombre ON productos(nombre COLLATE NOCASE)"
+                )
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS archivo.movimientos (
+                id INTEGER PRIMARY KEY,
+                producto_id INTEGER NOT NULL,
+                tipo TEXT NOT NULL,
+                cantidad INTEGER NOT NULL,
+                fecha TEXT NOT NULL
+                )
+                """)
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS archivo.idx_movimientos_producto ON movimientos(producto_id)"
+                )
+                yield conn
+            finally:
+                conn.execute("DETACH DATABASE archivo")
+
+    def archivar_inactivos(self, dias=365, tamano_lote=500):
+        """Move out-of-stock products untouched for `dias` days to the archive database.
+
+        Each product goes with its ledger history, `tamano_lote` per batch;
+        products that still hold stock are never archived, so totals and
+        valuations do not change. Returns how many were moved. Call it
+        outside transaction().
+
+        A commit spanning main (WAL) and the archive is not atomic across
+        the two files, so every batch is two single-file transactions: the
+        archive copy commits first, then the products are deleted from main.
+        A crash in between leaves a duplicate, never a loss; copies of
+        products that are still in main are dropped at the start of the next
+        run, and INSERT OR REPLACE lets the batch simply be redone.
+        """
+        limite = self._fecha(datetime.now() - timedelta(days=dias))
+        idle = "cantidad = 0 AND eliminado_en IS NULL AND actualizado_en < ?"
+        archivados = 0
+        with self._archivo_adjunto() as conn:
+            with self.transaction():
+                self._descartar_copias_archivadas(conn, [fila[0] for fila in conn.execute(
+                    "SELECT a.id FROM archivo.productos a WHERE EXISTS (SELECT 1 FROM main.productos m WHERE m.id = a.id)"
+                )])
+            while True:
+                with self.transaction():
+                    ids = [fila[0] for fila in conn.execute(
+                        f"SELECT id FROM main.productos WHERE {idle} LIMIT ?", (limite, tamano_lote)
+                    )]
+                    if not ids:
+                        break
+                    lote = json.dumps(ids)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO archivo.productos "
+                        "SELECT id, nombre, cantidad, precio, stock_minimo, actualizado_en, ? "
+                        "FROM main.productos WHERE id IN (SELECT value FROM json_each(?))",
+                        (self._ahora(), lote)
+                    )
+                    conn.execute(
+                        "INSERT OR REPLACE INTO archivo.movimientos "
+                        "SELECT id, producto_id, tipo, cantidad, fecha "
+                        "FROM main.movimientos WHERE producto_id IN (SELECT value FROM json_each(?))",
+                        (lote,)
+                    )
+                with self.transaction():
+                    # Anything touched since the copy keeps its stamp fresh and stays
+                    movidos = [fila[0] for fila in conn.execute(
+                        f"SELECT id FROM main.productos WHERE id IN (SELECT value FROM json_each(?)) AND {idle}",
+                        (lote, limite)
+                    )]
+                    movidos_json = json.dumps(movidos)
+                    for tabla, columna in (('snapshots_stock', 'producto_id'), ('stock_ubicaciones', 'producto_id'),
+                                           ('movimientos', 'producto_id'), ('productos', 'id')):
+                        conn.execute(
+                            f"DELETE FROM main.{tabla} WHERE {columna} IN (SELECT value FROM json_each(?))",
+                            (movidos_json,)
+                        )
+                if len(movidos) < len(ids):
+                    with self.transaction():
+                        self._descartar_copias_archivadas(conn, sorted(set(ids) - set(movidos)))
+                archivados += len(movidos)
+        return archivados
+
+    def _descartar_copias_archivadas(self, conn, ids):
+        """Delete the archive's copies of products that are still live in main."""
+        if ids:
+            lote = json.dumps(ids)
+            conn.execute("DELETE FROM archivo.movimientos WHERE producto_id IN (SELECT value FROM json_each(?))", (lote,))
+            conn.execute("DELETE FROM archivo.productos WHERE id IN (SELECT value FROM json_each(?))", (lote,))
+
+    def buscar_archivados(self, texto='', limite=50):
+        """Archived products whose name contains `texto`, ordered by name."""
+        with self._archivo_adjunto(crear=False) as conn:
+            if conn is None:
+                return []
+            return self._consultar_productos(
+                conn,
+                f"SELECT {_SELECT_PRODUCTO} FROM archivo.productos "
+                "WHERE instr(lower(nombre), lower(?)) > 0 ORDER BY nombre COLLATE NOCASE LIMIT ?",
+                (str(texto).strip(), limite)
+            ).fetchall()
+
+    def obtener_movimientos_archivados(self, producto_id, limite=100):
+        """Ledger history of an archived product, newest first."""
+        with self._archivo_adjunto(crear=False) as conn:
+            if conn is None:
+                return []
+            return conn.execute(
+                "SELECT id, producto_id, tipo, cantidad, fecha FROM archivo.movimientos "
+                "WHERE producto_id = ? ORDER BY id DESC LIMIT ?",
+                (producto_id, limite)
+            ).fetchall()
+
+    def restaurar_archivados(self, producto_ids):
+        """Bring archived products and their history back; returns how many.
+
+        Ids are kept (AUTOINCREMENT never hands them out again). A name now
+        used by a live product raises sqlite3.IntegrityError and nothing is
+        restored. Call it outside transaction().
+        """
+        lote = json.dumps(sorted({int(i) for i in producto_ids}))
+        with self._archivo_adjunto(crear=False) as conn:
+            if conn is None:
+                return 0
+            with self.transaction():
+                restaurados = conn.execute(
+                    "INSERT INTO main.productos (id, nombre, cantidad, precio, stock_minimo) "
+                    "SELECT id, nombre, cantidad, precio, stock_minimo FROM archivo.productos "
+                    "WHERE id IN (SELECT value FROM json_each(?))",
+                    (lote,)
+                ).rowcount
+                conn.execute(
+                    "INSERT OR IGNORE INTO main.movimientos (id, producto_id, tipo, cantidad, fecha) "
+                    "SELECT id, producto_id, tipo, cantidad, fecha FROM archivo.movimientos "
+                    "WHERE producto_id IN (SELECT value FROM json_each(?))",
+                    (lote,)
+                )
+                conn.execute("DELETE FROM archivo.movimientos WHERE producto_id IN (SELECT value FROM json_each(?))", (lote,))
+                conn.execute("DELETE FROM archivo.productos WHERE id IN (SELECT value FROM json_each(?))", (lote,))
+            return restaurados
+
+    def actualizar_producto(self, producto_id, nombre, cantidad, precio, stock_minimo=None):
+        with self.transaction() as conn:
+            fila = conn.execute("SELECT cantidad FROM productos_activos WHERE id = ?", (producto_id,)).fetchone()
+            if fila is None:
+                return
+            if stock_minimo is not None:
+                conn.execute(
+                    "UPDATE productos SET nombre = ?, cantidad = ?, precio = ?, stock_minimo = ? WHERE id = ?",
+                    (nombre, cantidad, precio, stock_minimo, producto_id)
+                )
+            else:
+                conn.execute(
+                    "UPDATE productos SET nombre = ?, cantidad = ?, precio = ? WHERE id = ?",
+                    (nombre, cantidad, precio, producto_id)
+                )
+            if int(cantidad) != fila[0]:
+                self._registrar_movimientos(
+                    conn, [(producto_id, 'ajuste', int(cantidad) - fila[0], self._ahora())]
+                )
 
     def obtener_producto_por_id(self, producto_id):
-        self.cursor.execute("SELECT * FROM productos WHERE id = ?", (producto_id,))
-        return self.cursor.fetchone()
+        with self.conexion() as conn:
+            return self._consultar_productos(
+                conn, f"SELECT {_SELECT_PRODUCTO} FROM productos_activos WHERE id = ?", (producto_id,)
+            ).fetchone()
 
-    def obtener_productos(self):
-        self.cursor.execute("SELECT * FROM productos")
-        return self.cursor.fetchall()
+    def obtener_productos(self, columnas=None):
+        """Return every product as Producto rows, in id order.
 
-    def producto_existe(self, nombre, excluir_id=None):
-        if excluir_id:
-            self.cursor.execute("SELECT id FROM productos WHERE nombre = ? AND id != ?", (nombre, excluir_id))
+        Passing `columnas` (a subset of COLUMNAS_PRODUCTO) projects only
+        those columns and returns plain tuples in that order instead.
+        """
+        with self.conexion() as conn:
+            if columnas is None:
+                return self._consultar_productos(
+                    conn, f"SELECT {_SELECT_PRODUCTO} FROM productos_activos ORDER BY id"
+                ).fetchall()
+            desconocidas = set(columnas) - set(COLUMNAS_PRODUCTO)
+            if desconocidas or not columnas:
+                raise ValueError(f"Columnas no válidas: {sorted(desconocidas)}")
+            return conn.execute(f"SELECT {', '.join(columnas)} FROM productos_activos ORDER BY id").fetchall()
+
+    def obtener_productos_pagina(self, after_key=None, limit=100, order_by='id', filtro=''):
+        """Return one page of products using keyset (seek) pagination.
+
+        `order_by` is 'id' or 'nombre'. `after_key` is the cursor returned by
+        the previous page (None for the first page). The result holds the rows
+        and the cursor for the next page, or None when there are no more.
+        """
+        if order_by not in ('id', 'nombre'):
+            raise ValueError(f"order_by no soportado: {order_by}")
+        limit = max(1, int(limit))
+
+        condiciones = []
+        params = []
+        if filtro:
+            patron = filtro.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            condiciones.append("nombre LIKE ? ESCAPE '\\'")
+            params.append(f"%{patron}%")
+
+        if order_by == 'id':
+            if after_key is not None:
+                condiciones.append("id > ?")
+                params.append(after_key)
+            orden = "id"
         else:
-            self.cursor.execute("SELECT id FROM productos WHERE nombre = ?", (nombre,))
-        return self.cursor.fetchone() is not None
+            if after_key is not None:
+                # Spelled out rather than as a row value so SQLite seeks the name index
+                nombre, producto_id = after_key
+                condiciones.append(
+                    "nombre COLLATE NOCASE >= ? AND (nombre COLLATE NOCASE > ? OR id > ?)"
+                )
+                params.extend((nombre, nombre, producto_id))
+            orden = "nombre COLLATE NOCASE, id"
+
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        sql = f"SELECT {_SELECT_PRODUCTO} FROM productos_activos {where} ORDER BY {orden} LIMIT ?"
+        params.append(limit + 1)
+
+        with self.conexion() as conn:
+            filas = self._consultar_productos(conn, sql, params).fetchall()
+
+        siguiente = None
+        if len(filas) > limit:
+            filas = filas[:limit]
+            ultima = filas[-1]
+            siguiente = ultima.id if order_by == 'id' else (ultima.nombre, ultima.id)
+        return {'productos': filas, 'siguiente': siguiente}
+
+    def buscar_productos(self, texto, limite=50):
+        """Full-text search on product names, best matches first.
+
+        Every word in `texto` is matched as a prefix, ignoring case and
+        accents, and all words must match.
+        """
+        consulta = self._consulta_fts(texto)
+        if consulta is None:
+            return []
+
+        with self.conexion() as conn:
+            try:
+                return self._consultar_productos(conn, f"""
+                SELECT {", ".join("p." + c for c in COLUMNAS_PRODUCTO)} FROM productos_fts
+                JOIN productos_activos p ON p.id = productos_fts.rowid
+                WHERE productos_fts MATCH ?
+                ORDER BY productos_fts.rank
+                LIMIT ?
+                """, (consulta, limite)).fetchall()
+            except sqlite3.OperationalError:
+                # No FTS5 index available: plain substring match
+                return self.obtener_productos_pagina(limit=limite, order_by='nombre', filtro=texto)['productos']
+
+    @staticmethod
+    def _consulta_fts(texto):
+        """FTS5 query matching every word of `texto` as a prefix, or None if it has none."""
+        terminos = re.findall(r'\w+', texto or '')
+        if not terminos:
+            return None
+        return ' '.join(f'"{termino}"*' for termino in terminos)
+
+    def _seleccion(self, conn, filtro=None, ids=None):
+        """Ids of live products matching `filtro` (as buscar_productos, unlimited) and/or listed in `ids`."""
+        if not filtro and ids is None:
+            raise ValueError("Indique un filtro o una lista de productos")
+        condiciones = []
+        params = []
+        if ids is not None:
+            condiciones.append("id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps([int(i) for i in ids]))
+        if filtro:
+            consulta = self._consulta_fts(filtro)
+            if consulta is None:
+                return []
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'productos_fts'").fetchone():
+                condiciones.append("id IN (SELECT rowid FROM productos_fts WHERE productos_fts MATCH ?)")
+                params.append(consulta)
+            else:
+                patron = filtro.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                condiciones.append("nombre LIKE ? ESCAPE '\\'")
+                params.append(f"%{patron}%")
+        return [fila[0] for fila in conn.execute(
+            f"SELECT id FROM productos_activos WHERE {' AND '.join(condiciones)}", params
+        )]
+
+    def actualizar_precios_lote(self, porcentaje=0.0, importe=0.0, filtro=None, ids=None,
+                                precio_min=0.0, precio_max=None):
+        """Reprice every selected product by `porcentaje` percent plus `importe`, in one statement.
+
+        New prices are rounded to cents. If any would fall outside
+        [precio_min, precio_max] nothing changes and ValueError is raised.
+        Returns how many prices changed.
+        """
+        nuevo = "ROUND(precio * (1 + ? / 100.0) + ?, 2)"
+        ajuste = (float(porcentaje or 0), float(importe or 0))
+        with self.transaction() as conn:
+            lote = json.dumps(self._seleccion(conn, filtro, ids))
+            fuera = conn.execute(
+                f"SELECT COUNT(*) FROM productos WHERE id IN (SELECT value FROM json_each(?)) "
+                f"AND ({nuevo} < ? OR {nuevo} > ?)",
+                (lote, *ajuste, precio_min, *ajuste, float('inf') if precio_max is None else precio_max)
+            ).fetchone()[0]
+            if fuera:
+                raise ValueError(f"{fuera} productos quedarían con un precio fuera del rango permitido")
+            return conn.execute(
+                f"UPDATE productos SET precio = {nuevo} "
+                f"WHERE id IN (SELECT value FROM json_each(?)) AND precio != {nuevo}",
+                (*ajuste, lote, *ajuste)
+            ).rowcount
+
+    def actualizar_stock_minimo_lote(self, stock_minimo, filtro=None, ids=None):
+        """Set stock_minimo on every selected product; returns how many changed."""
+        with self.transaction() as conn:
+            lote = json.dumps(self._seleccion(conn, filtro, ids))
+            return conn.execute(
+                "UPDATE productos SET stock_minimo = ? "
+                "WHERE id IN (SELECT value FROM json_each(?)) AND stock_minimo IS NOT ?",
+                (int(stock_minimo), lote, int(stock_minimo))
+            ).rowcount
+
+    def eliminar_productos_lote(self, filtro=None, ids=None):
+        """Soft-delete every selected product at once, like eliminar_producto; returns how many."""
+        with self.transaction() as conn:
+            lote = json.dumps(self._seleccion(conn, filtro, ids))
+            ahora = self._ahora()
+            cierres = [
+                (producto_id, 'ajuste', -cantidad, ahora)
+                for producto_id, cantidad in conn.execute(
+                    "SELECT id, cantidad FROM productos WHERE id IN (SELECT value FROM json_each(?)) AND cantidad != 0",
+                    (lote,)
+                )
+            ]
+            eliminados = conn.execute(
+                "UPDATE productos SET cantidad = 0, eliminado_en = ? "
+                "WHERE id IN (SELECT value FROM json_each(?)) AND eliminado_en IS NULL",
+                (ahora, lote)
+            ).rowcount
+            conn.execute("DELETE FROM stock_ubicaciones WHERE producto_id IN (SELECT value FROM json_each(?))", (lote,))
+            self._registrar_movimientos(conn, cierres, None)
+            return eliminados
+
+    def producto_existe(self, nombre, excluir_id=None):
+        with self.conexion() as conn:
+            if excluir_id:
+                fila = conn.execute(
+                    "SELECT id FROM productos_activos WHERE nombre = ? COLLATE NOCASE AND id != ?",
+                    (nombre, excluir_id)
+                ).fetchone()
+            else:
+                fila = conn.execute(
+                    "SELECT id FROM productos_activos WHERE nombre = ? COLLATE NOCASE", (nombre,)
+                ).fetchone()
+            return fila is not None
 
     def obtener_productos_bajo_stock(self):
-        self.cursor.execute("SELECT * FROM productos WHERE cantidad <= stock_minimo")
-        return self.cursor.fetchall()
+        with self.conexion() as conn:
+            return self._consultar_productos(
+                conn, f"SELECT {_SELECT_PRODUCTO} FROM productos_activos WHERE cantidad <= stock_minimo"
+            ).fetchall()
 
-    def backup_database(self, backup_path):
-        import shutil
-        try:
-            # Close current connection
-            self.conn.close()
-            
-            # Copy database file
-            shutil.copy2(self.db_name if hasattr(self, 'db_name') else "inventario.db", backup_path)
-            
-            # Reopen connection
-            self.conn = sqlite3.connect(self.db_name if hasattr(self, 'db_name') else "inventario.db")
-            self.cursor = self.conn.cursor()
-            
-            return True
-        except Exception as e:
-            # Reopen connection if it failed
+    def backup_database(self, backup_path, progreso=None, paginas_por_paso=1024, pausa=0.005):
+        """Take an online, consistent copy through the SQLite backup API.
+
+        Pages are copied `paginas_por_paso` at a time, sleeping `pausa`
+        seconds between steps, all from one read snapshot: the copy is the
+        database as of the start and writers keep committing meanwhile. The
+        pooled connections stay open throughout. `progreso(copiadas, total)`
+        is called after every step. A .gz/.xz `backup_path` gets a compressed
+        copy, streamed from a scratch file once the pages are copied.
+        """
+        def _paso(status, restantes, total):
+            if progreso:
+                progreso(total - restantes, total)
+            if restantes and pausa:
+                time.sleep(pausa)
+
+        with self._destino_backup(backup_path) as ruta:
+            destino = sqlite3.connect(ruta)
             try:
-                self.conn = sqlite3.connect(self.db_name if hasattr(self, 'db_name') else "inventario.db")
-                self.cursor = self.conn.cursor()
-            except:
-                pass
-            raise e
+                with self.conexion() as conn:
+                    propia = not conn.in_transaction
+                    if propia:
+                        # Pin one WAL read snapshot across every step: commits
+                        # from other connections would otherwise restart the
+                        # copy from page 0, and under steady writes it would
+                        # never finish. Readers do not block writers in WAL.
+                        conn.execute("BEGIN")
+                        conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+                    try:
+                        conn.backup(destino, pages=paginas_por_paso, progress=_paso)
+                    finally:
+                        if propia:
+                            conn.rollback()
+            finally:
+                destino.close()
+        return True
 
     def restore_database(self, backup_path):
-        import shutil
+        """Replace the database with a backup while the application keeps running.
+
+        The backup is staged next to the live file (decompressed if needed),
+        checked with PRAGMA quick_check and against VERSION_ESQUEMA, and
+        migrated offline. Only then, once no thread is mid-query, are the
+        pooled connections closed and the staged file renamed over the live
+        one, so the outage is the rename and a corrupt backup leaves the
+        current data untouched. Threads reopen their connections lazily on
+        next use. If another instance (any process) has the file open the
+        restore is refused, since it would keep writing through the old
+        -wal/-shm files. Call it outside transaction().
+        """
+        temporal = self._temporal_junto_a(self.db_name)
+        try:
+            self._copiar_backup(backup_path, temporal)
+            version = self._validar_backup(temporal)
+            if version > self.VERSION_ESQUEMA:
+                raise ValueError(
+                    f"La copia de seguridad usa un esquema más nuevo ({version}) que esta versión "
+                    f"({self.VERSION_ESQUEMA})"
+                )
+            # Older backups may predate the current schema version; closing
+            # checkpoints the WAL so the staged file is self-contained
+            type(self)(temporal, self.busy_timeout).close()
+
+            with self._archivo_exclusivo():
+                self.cerrar_conexiones()
+                with self._detector_lock:
+                    # A change poll may have reopened it since cerrar_conexiones()
+                    if self._conexion_detector is not None:
+                        self._conexion_detector.close()
+                        self._conexion_detector = None
+                    with self._bloqueo_exclusivo():
+                        os.replace(temporal, self.db_name)
+        finally:
+            for sufijo in ('', '-wal', '-shm'):
+                if os.path.exists(temporal + sufijo):
+                    os.unlink(temporal + sufijo)
+        self._migrar()
+        # The detector's baseline was reset with the connections, so announce it here
+        self._notificar_cambios()
+        return True
+
+    @contextmanager
+    def _bloqueo_exclusivo(self):
+        """Hold the live file exclusively for the block; ValueError if anyone else has it open.
+
+        Leaving WAL only succeeds once every other connection, in any
+        process, has closed the file (it also folds the -wal back in), and
+        in rollback-journal mode BEGIN EXCLUSIVE then keeps new ones out.
+        The pooled connections switch back to WAL when they reopen. Call it
+        with this instance's own connections closed.
+        """
+        conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout / 1000, isolation_level=None)
         try:
-            # Close current connection
-            self.conn.close()
-            
-            # Copy backup file to current database
-            shutil.copy2(backup_path, self.db_name if hasattr(self, 'db_name') else "inventario.db")
-            
-            # Reopen connection
-            self.conn = sqlite3.connect(self.db_name if hasattr(self, 'db_name') else "inventario.db")
-            self.cursor = self.conn.cursor()
-            
-            return True
-        except Exception as e:
-            # Reopen connection if it failed
             try:
-                self.conn = sqlite3.connect(self.db_name if hasattr(self, 'db_name') else "inventario.db")
-                self.cursor = self.conn.cursor()
-            except:
-                pass
-            raise e
+                conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+                if conn.execute("PRAGMA journal_mode = DELETE").fetchone()[0].lower() != 'delete':
+                    raise sqlite3.OperationalError("database is locked")
+                conn.execute("BEGIN EXCLUSIVE")
+            except sqlite3.OperationalError:
+                raise ValueError(
+                    "La base de datos está abierta en otra instancia; ciérrela antes de restaurar"
+                ) from None
+            yield
+        finally:
+            conn.close()
 
     def obtener_estadisticas(self):
-        productos = self.obtener_productos()
-        
-        total_productos = len(productos)
-        valor_total = sum(p[2] * p[3] for p in productos)
-        bajo_stock = len(self.obtener_productos_bajo_stock())
-        
-        # Product statistics
-        productos_sin_stock = len([p for p in productos if p[2] == 0])
+        with self.conexion() as conn:
+            fila = conn.execute("""
+            SELECT total_productos, valor_total, stock_total, stock_minimo_total, bajo_stock, sin_stock
+            FROM estadisticas_inventario WHERE id = 1
+            """).fetchone()
+
+        total_productos, valor_total, stock_total, stock_minimo_total, bajo_stock, productos_sin_stock = fila
         valor_promedio = valor_total / total_productos if total_productos > 0 else 0
-        
-        # Stock statistics
-        stock_total = sum(p[2] for p in productos)
-        stock_minimo_total = sum(p[4] if len(p) > 4 else 10 for p in productos)
-        
+
         return {
             'total_productos': total_productos,
             'valor_total': valor_total,
@@ -140,4 +1872,4 @@ class InventarioModel:
             'stock_total': stock_total,
             'stock_minimo_total': stock_minimo_total,
             'productos_criticos': bajo_stock + productos_sin_stock
-        }
\ No newline at end of file
+        }
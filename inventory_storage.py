@@ -0,0 +1,927 @@
+"""
+Storage backends for inventory system.
+Defines the interface every backend implements, an in-memory backend and
+the factory that picks one from configuration.
+"""
+
+import bisect
+import gzip
+import lzma
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+
+class Producto(NamedTuple):
+    """One product row; a tuple subclass with no per-instance __dict__."""
+    id: int
+    nombre: str
+    cantidad: int
+    precio: float
+    stock_minimo: Optional[int] = 10
+
+    @property
+    def valor_total(self):
+        return self.cantidad * self.precio
+
+    @property
+    def bajo_stock(self):
+        return self.stock_minimo is not None and self.cantidad <= self.stock_minimo
+
+
+COLUMNAS_PRODUCTO = Producto._fields
+
+# Backups ending in one of these are compressed; anything else is a plain SQLite file
+COMPRESORES_BACKUP = {'.gz': gzip.open, '.xz': lzma.open}
+# Compression streams this much at a time, so memory use does not grow with the database
+BLOQUE_BACKUP = 1024 * 1024
+
+
+def backup_comprimido(ruta):
+    return os.path.splitext(ruta)[1].lower() in COMPRESORES_BACKUP
+
+
+class StorageBackend(ABC):
+    """Interface shared by the SQLite model and the in-memory backend.
+
+    Product rows are `Producto` records. Writing a name that already exists
+    (case-insensitive) raises sqlite3.IntegrityError whatever the backend,
+    which is what InventoryController relies on for duplicate detection.
+    """
+
+    TIPOS_MOVIMIENTO = ('entrada', 'venta', 'ajuste')
+    # Stock written without an explicit location lands here
+    UBICACION_PRINCIPAL = 1
+    # Whether more locations than the default one can be created; backends
+    # without them still answer the location queries for the default one
+    MULTIPLES_UBICACIONES = False
+
+    @staticmethod
+    def _ahora():
+        return datetime.now().isoformat(sep=' ', timespec='seconds')
+
+    @staticmethod
+    def _fecha(valor):
+        """Normalize a datetime/date/str to the ledger's ISO text format.
+
+        A bare date stands for the end of that day.
+        """
+        if valor is None:
+            return StorageBackend._ahora()
+        if isinstance(valor, datetime):
+            return valor.isoformat(sep=' ', timespec='seconds')
+        if hasattr(valor, 'isoformat'):
+            return f"{valor.isoformat()} 23:59:59"
+        return str(valor)
+
+    @staticmethod
+    def _temporal_junto_a(ruta):
+        """Create an empty scratch file in `ruta`'s directory and return its path.
+
+        Being on the same filesystem, it can later be renamed over `ruta` atomically.
+        """
+        descriptor, temporal = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(os.path.abspath(ruta)))
+        os.close(descriptor)
+        return temporal
+
+    @contextmanager
+    def _destino_backup(self, backup_path):
+        """Yield the path a backup should be written to as a plain SQLite file.
+
+        For a compressed `backup_path` that is a scratch file next to it,
+        streamed through the compressor once the block finishes; the final
+        file only appears when it is complete.
+        """
+        if not backup_comprimido(backup_path):
+            yield backup_path
+            return
+        temporal = self._temporal_junto_a(backup_path)
+        parcial = backup_path + '.part'
+        try:
+            yield temporal
+            comprimir = COMPRESORES_BACKUP[os.path.splitext(backup_path)[1].lower()]
+            with open(temporal, 'rb') as origen, comprimir(parcial, 'wb') as destino:
+                shutil.copyfileobj(origen, destino, BLOQUE_BACKUP)
+            os.replace(parcial, backup_path)
+        finally:
+            for ruta in (temporal, parcial):
+                if os.path.exists(ruta):
+                    os.unlink(ruta)
+
+    @staticmethod
+    def _copiar_backup(backup_path, destino):
+        """Stream `backup_path` into the plain file `destino`, decompressing if needed."""
+        abrir = COMPRESORES_BACKUP.get(os.path.splitext(backup_path)[1].lower(), open)
+        with abrir(backup_path, 'rb') as origen, open(destino, 'wb') as f:
+            shutil.copyfileobj(origen, f, BLOQUE_BACKUP)
+
+    @contextmanager
+    def _origen_backup(self, backup_path):
+        """Yield a plain SQLite file holding `backup_path`'s contents.
+
+        Compressed backups are decompressed chunk by chunk into a scratch
+        file in the system temp directory.
+        """
+        if not backup_comprimido(backup_path):
+            yield backup_path
+            return
+        descriptor, temporal = tempfile.mkstemp(suffix='.db')
+        os.close(descriptor)
+        try:
+            self._copiar_backup(backup_path, temporal)
+            yield temporal
+        finally:
+            os.unlink(temporal)
+
+    @staticmethod
+    def _validar_backup(ruta):
+        """Check a plain backup file before it replaces any data; returns its user_version.
+
+        Runs PRAGMA quick_check and makes sure it holds an inventory.
+        Raises ValueError describing what is wrong.
+        """
+        try:
+            # as_uri() percent-encodes the path, so '#', '?' or '%' in it stay literal
+            conn = sqlite3.connect(Path(ruta).resolve().as_uri() + "?mode=ro", uri=True)
+        except sqlite3.Error as e:
+            raise ValueError(f"No se pudo abrir la copia de seguridad: {e}") from e
+        try:
+            resultado = [fila[0] for fila in conn.execute("PRAGMA quick_check")]
+            if resultado != ['ok']:
+                raise ValueError(f"La copia de seguridad está dañada: {'; '.join(resultado[:5])}")
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'productos'").fetchone() is None:
+                raise ValueError("El archivo no es una copia de seguridad del inventario")
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"La copia de seguridad está dañada: {e}") from e
+        finally:
+            conn.close()
+
+    def _lotes_movimientos(self, movimientos, tamano_lote):
+        """Yield chunks of normalized (producto_id, tipo, delta, fecha) movements.
+
+        'entrada' adds and 'venta' subtracts abs(cantidad); 'ajuste' keeps
+        cantidad as a signed delta.
+        """
+        tamano_lote = max(1, int(tamano_lote))
+        lote = []
+        for movimiento in movimientos:
+            producto_id, tipo, cantidad = movimiento[0], movimiento[1], int(movimiento[2])
+            fecha = self._fecha(movimiento[3] if len(movimiento) > 3 else None)
+            if tipo not in self.TIPOS_MOVIMIENTO:
+                raise ValueError(f"Tipo de movimiento no válido: {tipo}")
+            if tipo == 'entrada':
+                cantidad = abs(cantidad)
+            elif tipo == 'venta':
+                cantidad = -abs(cantidad)
+            lote.append((producto_id, tipo, cantidad, fecha))
+            if len(lote) >= tamano_lote:
+                yield lote
+                lote = []
+        if lote:
+            yield lote
+
+    @contextmanager
+    def perfil_temporal(self, nombre):
+        """Run the block under another performance profile.
+
+        Only meaningful for SQLite; other backends ignore it.
+        """
+        yield
+
+    def purgar_eliminados(self, dias=30, tamano_lote=500):
+        """Permanently remove old soft-deleted products; returns how many.
+
+        Backends that delete immediately have nothing to purge.
+        """
+        return 0
+
+    def vacuum_incremental(self, paginas=256):
+        """Give up to `paginas` free pages back to the filesystem; returns how many."""
+        return 0
+
+    def activar_auto_vacuum(self):
+        """One-off conversion so vacuum_incremental() can free pages; False if not needed."""
+        return False
+
+    def activar_nombres_unicos(self):
+        """Enforce unique names with an index once legacy duplicates are gone; True when enforced.
+
+        Backends that always enforce them have nothing to do.
+        """
+        return True
+
+    def archivar_inactivos(self, dias=365, tamano_lote=500):
+        """Move long-idle, out-of-stock products to cold storage; returns how many.
+
+        Only meaningful for SQLite; other backends keep everything in place.
+        """
+        return 0
+
+    def buscar_archivados(self, texto='', limite=50):
+        """Archived products whose name contains `texto`."""
+        return []
+
+    def obtener_movimientos_archivados(self, producto_id, limite=100):
+        """Ledger history of an archived product, newest first."""
+        return []
+
+    def restaurar_archivados(self, producto_ids):
+        """Bring archived products back into the catalogue; returns how many."""
+        return 0
+
+    def suscribir_cambios(self, callback):
+        """Register `callback()` for data changes made outside this object.
+
+        Only meaningful for shared databases; other backends never call it.
+        """
+
+    def cancelar_suscripcion(self, callback):
+        """Remove a callback registered with suscribir_cambios()."""
+
+    def comprobar_cambios(self):
+        """Whether the data changed since the last check."""
+        return False
+
+    def version_datos(self):
+        """Opaque token that changes when the data does; None when unknown."""
+        return None
+
+    def iniciar_detector(self, intervalo=1.0):
+        """Check for changes periodically in the background."""
+
+    def detener_detector(self):
+        """Stop the background change checks."""
+
+    # Single-location defaults: all stock is at UBICACION_PRINCIPAL
+
+    def _validar_ubicacion_unica(self, ubicacion_id):
+        if ubicacion_id not in (None, self.UBICACION_PRINCIPAL):
+            raise ValueError(f"Ubicación inexistente: {ubicacion_id}")
+
+    def crear_ubicacion(self, nombre):
+        """Add a location; returns its id."""
+        raise ValueError(f"{type(self).__name__} solo maneja la ubicación principal")
+
+    def obtener_ubicaciones(self):
+        """Every location with its (id, nombre, productos, unidades, valor) rollup."""
+        stats = self.obtener_estadisticas()
+        return [(
+            self.UBICACION_PRINCIPAL, "Principal", stats['total_productos'] - stats['sin_stock'],
+            stats['stock_total'], stats['valor_total']
+        )]
+
+    def obtener_stock_ubicaciones(self, producto_id):
+        """A product's stock split by location: (ubicacion_id, nombre, cantidad)."""
+        producto = self.obtener_producto_por_id(producto_id)
+        if producto is None or not producto.cantidad:
+            return []
+        return [(self.UBICACION_PRINCIPAL, "Principal", producto.cantidad)]
+
+    def transferir_stock(self, producto_id, origen_id, destino_id, cantidad):
+        """Move stock between locations atomically."""
+        if int(cantidad) <= 0 or origen_id == destino_id:
+            raise ValueError("La transferencia necesita una cantidad positiva y dos ubicaciones distintas")
+        self._validar_ubicacion_unica(origen_id)
+        self._validar_ubicacion_unica(destino_id)
+
+    def obtener_productos_bajo_stock_ubicacion(self, ubicacion_id):
+        """Products a location carries at or below their stock_minimo."""
+        if ubicacion_id != self.UBICACION_PRINCIPAL:
+            return []
+        return self.obtener_productos_bajo_stock()
+
+    @abstractmethod
+    def transaction(self):
+        """Context manager grouping several mutations into one atomic unit."""
+
+    @abstractmethod
+    def agregar_producto(self, nombre, cantidad, precio, stock_minimo=10):
+        """Insert one product."""
+
+    @abstractmethod
+    def agregar_productos_lote(self, productos, tamano_lote=1000):
+        """Insert many products; returns inserted/rejected counts and throughput."""
+
+    @abstractmethod
+    def upsert_productos_lote(self, productos, tamano_lote=1000):
+        """Insert or update (by name) many products; returns inserted/updated/unchanged counts."""
+
+    @abstractmethod
+    def eliminar_producto(self, producto_id):
+        """Delete one product."""
+
+    @abstractmethod
+    def actualizar_producto(self, producto_id, nombre, cantidad, precio, stock_minimo=None):
+        """Overwrite one product's fields."""
+
+    # Set-based mutations: the selection is products matching `filtro` (as
+    # buscar_productos, without a limit) and/or listed in `ids`; at least one
+    # is required. Each runs in one transaction and returns how many changed.
+
+    @abstractmethod
+    def actualizar_precios_lote(self, porcentaje=0.0, importe=0.0, filtro=None, ids=None,
+                                precio_min=0.0, precio_max=None):
+        """Reprice the selection by a percentage plus an amount, all within bounds or not at all."""
+
+    @abstractmethod
+    def actualizar_stock_minimo_lote(self, stock_minimo, filtro=None, ids=None):
+        """Set stock_minimo on the selection."""
+
+    @abstractmethod
+    def eliminar_productos_lote(self, filtro=None, ids=None):
+        """Delete the selection."""
+
+    @abstractmethod
+    def obtener_producto_por_id(self, producto_id):
+        """Return one product or None."""
+
+    @abstractmethod
+    def obtener_productos(self, columnas=None):
+        """Return every product, or tuples of the requested columns."""
+
+    @abstractmethod
+    def obtener_productos_pagina(self, after_key=None, limit=100, order_by='id', filtro=''):
+        """Return {'productos': [...], 'siguiente': cursor-or-None}."""
+
+    @abstractmethod
+    def buscar_productos(self, texto, limite=50):
+        """Prefix, accent-insensitive name search, best matches first."""
+
+    @abstractmethod
+    def producto_existe(self, nombre, excluir_id=None):
+        """Whether another product already uses this name."""
+
+    @abstractmethod
+    def obtener_productos_bajo_stock(self):
+        """Products with cantidad <= stock_minimo."""
+
+    @abstractmethod
+    def obtener_estadisticas(self):
+        """Inventory summary dict."""
+
+    @abstractmethod
+    def reconstruir_estadisticas(self):
+        """Recompute the summary from scratch and return it."""
+
+    @abstractmethod
+    def registrar_movimientos(self, movimientos, tamano_lote=1000, ubicacion_id=None):
+        """Apply (producto_id, tipo, cantidad[, fecha]) movements at a location; returns how many."""
+
+    @abstractmethod
+    def ajustar_stock(self, producto_id, delta, tipo='ajuste', ubicacion_id=None):
+        """Add a signed delta to one product's stock; returns the new quantity."""
+
+    @abstractmethod
+    def ajustar_stock_lote(self, ajustes, tipo='ajuste', ubicacion_id=None):
+        """Apply (producto_id, delta) pairs all-or-nothing, never below zero; returns {id: quantity}."""
+
+    @abstractmethod
+    def obtener_movimientos(self, producto_id, limite=100):
+        """Most recent ledger entries for a product, newest first."""
+
+    @abstractmethod
+    def stock_a_fecha(self, producto_id, fecha):
+        """Stock of a product as of a date."""
+
+    @abstractmethod
+    def crear_snapshots(self, umbral=1):
+        """Snapshot products with new movements; returns how many."""
+
+    @abstractmethod
+    def backup_database(self, backup_path, progreso=None):
+        """Write a SQLite backup file, gzip/lzma compressed if it ends in .gz/.xz."""
+
+    @abstractmethod
+    def restore_database(self, backup_path):
+        """Replace the current data with a SQLite backup file, compressed or not."""
+
+    @abstractmethod
+    def close(self):
+        """Release resources."""
+
+
+def _clave_nombre(nombre):
+    return str(nombre).casefold()
+
+
+def _palabras(texto):
+    """Lower-case, accent-free words of a text (ñ matches n, á matches a)."""
+    sin_acentos = unicodedata.normalize('NFKD', str(texto))
+    sin_acentos = ''.join(c for c in sin_acentos if not unicodedata.combining(c))
+    return re.findall(r'\w+', sin_acentos.casefold())
+
+
+class MemoryBackend(StorageBackend):
+    """Pure in-memory backend for tests, benchmarks and simulations.
+
+    Products live in a dict keyed by id, with sorted lists backing id and
+    name ordering and a dict enforcing unique names. Statistics are kept
+    incrementally. Transactions record an undo log instead of copying state,
+    so a rollback costs as much as the work it undoes.
+    """
+
+    def __init__(self, db_name=":memory:"):
+        self.db_name = db_name
+        self._lock = threading.RLock()
+        # Bumped by every primitive change (and by restores); never reset
+        self._version = 0
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self._productos = {}
+        self._ids = []
+        self._por_nombre = []
+        self._nombres = {}
+        self._bajo_stock = set()
+        self._movimientos = []
+        self._mov_por_producto = {}
+        self._siguiente_id = 1
+        self._siguiente_movimiento = 1
+        self._stats = dict.fromkeys(
+            ('total_productos', 'valor_total', 'stock_total', 'stock_minimo_total', 'bajo_stock', 'sin_stock'), 0
+        )
+        self._deshacer = None
+
+    # Undo-logged primitives
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            exterior = self._deshacer is None
+            if exterior:
+                self._deshacer = []
+            marca = len(self._deshacer)
+            try:
+                yield self
+            except BaseException:
+                pendientes = self._deshacer[marca:]
+                del self._deshacer[marca:]
+                # Undo steps reuse the primitives, which must not log again
+                registro, self._deshacer = self._deshacer, None
+                try:
+                    for inversa in reversed(pendientes):
+                        inversa()
+                finally:
+                    self._deshacer = registro
+                raise
+            finally:
+                if exterior:
+                    self._deshacer = None
+
+    def _anotar(self, inversa):
+        self._version += 1
+        if self._deshacer is not None:
+            self._deshacer.append(inversa)
+
+    def _sumar_stats(self, producto, signo):
+        stats = self._stats
+        stats['total_productos'] += signo
+        stats['valor_total'] += signo * producto.cantidad * producto.precio
+        stats['stock_total'] += signo * producto.cantidad
+        stats['stock_minimo_total'] += signo * (producto.stock_minimo if producto.stock_minimo is not None else 10)
+        stats['bajo_stock'] += signo * producto.bajo_stock
+        stats['sin_stock'] += signo * (producto.cantidad == 0)
+
+    def _indexar(self, producto):
+        self._productos[producto.id] = producto
+        bisect.insort(self._ids, producto.id)
+        clave = _clave_nombre(producto.nombre)
+        bisect.insort(self._por_nombre, (clave, producto.id))
+        self._nombres[clave] = producto.id
+        if producto.bajo_stock:
+            self._bajo_stock.add(producto.id)
+        self._sumar_stats(producto, 1)
+
+    def _desindexar(self, producto):
+        del self._productos[producto.id]
+        del self._ids[bisect.bisect_left(self._ids, producto.id)]
+        clave = _clave_nombre(producto.nombre)
+        del self._por_nombre[bisect.bisect_left(self._por_nombre, (clave, producto.id))]
+        del self._nombres[clave]
+        self._bajo_stock.discard(producto.id)
+        self._sumar_stats(producto, -1)
+
+    def _poner(self, producto):
+        otro = self._nombres.get(_clave_nombre(producto.nombre))
+        if otro is not None and otro != producto.id:
+            raise sqlite3.IntegrityError("UNIQUE constraint failed: productos.nombre")
+        anterior = self._productos.get(producto.id)
+        if anterior is not None:
+            self._desindexar(anterior)
+        self._indexar(producto)
+        if anterior is not None:
+            self._anotar(lambda: self._poner(anterior))
+        else:
+            self._anotar(lambda: self._quitar(producto.id))
+
+    def _quitar(self, producto_id):
+        anterior = self._productos.get(producto_id)
+        if anterior is None:
+            return None
+        self._desindexar(anterior)
+        self._anotar(lambda: self._poner(anterior))
+        return anterior
+
+    def _mover(self, producto_id, tipo, cantidad, fecha):
+        movimiento = (self._siguiente_movimiento, producto_id, tipo, cantidad, fecha)
+        self._siguiente_movimiento += 1
+        self._movimientos.append(movimiento)
+        self._mov_por_producto.setdefault(producto_id, []).append(movimiento)
+
+        def deshacer():
+            self._movimientos.pop()
+            self._mov_por_producto[producto_id].pop()
+        self._anotar(deshacer)
+
+    # Mutators
+
+    def agregar_producto(self, nombre, cantidad, precio, stock_minimo=10):
+        with self.transaction():
+            producto = Producto(self._siguiente_id, nombre, cantidad, precio, stock_minimo)
+            self._poner(producto)
+            self._siguiente_id += 1
+            if int(cantidad):
+                self._mover(producto.id, 'entrada', int(cantidad), self._ahora())
+            return producto.id
+
+    def agregar_productos_lote(self, productos, tamano_lote=1000):
+        insertados = 0
+        rechazados = 0
+        inicio = time.perf_counter()
+        for fila in productos:
+            fila = tuple(fila)
+            if len(fila) == 3:
+                fila = fila + (10,)
+            if len(fila) != 4:
+                rechazados += 1
+                continue
+            try:
+                self.agregar_producto(*fila)
+                insertados += 1
+            except sqlite3.IntegrityError:
+                rechazados += 1
+        duracion = time.perf_counter() - inicio
+        return {
+            'insertados': insertados,
+            'rechazados': rechazados,
+            'duracion': duracion,
+            'filas_por_segundo': insertados / duracion if duracion > 0 else 0.0
+        }
+
+    def upsert_productos_lote(self, productos, tamano_lote=1000):
+        totales = dict.fromkeys(('insertados', 'actualizados', 'sin_cambios', 'rechazados'), 0)
+        inicio = time.perf_counter()
+        for fila in productos:
+            fila = tuple(fila)
+            if len(fila) not in (3, 4):
+                totales['rechazados'] += 1
+                continue
+            nombre, cantidad, precio = fila[0], int(fila[1]), float(fila[2])
+            stock_minimo = fila[3] if len(fila) == 4 else None
+            with self.transaction():
+                producto_id = self._nombres.get(_clave_nombre(nombre))
+                if producto_id is None:
+                    self.agregar_producto(nombre, cantidad, precio, 10 if stock_minimo is None else stock_minimo)
+                    totales['insertados'] += 1
+                    continue
+                anterior = self._productos[producto_id]
+                nuevo = anterior._replace(
+                    cantidad=cantidad,
+                    precio=precio,
+                    stock_minimo=anterior.stock_minimo if stock_minimo is None else stock_minimo
+                )
+                if nuevo == anterior:
+                    totales['sin_cambios'] += 1
+                    continue
+                self._poner(nuevo)
+                if cantidad != anterior.cantidad:
+                    self._mover(producto_id, 'ajuste', cantidad - anterior.cantidad, self._ahora())
+                totales['actualizados'] += 1
+        duracion = time.perf_counter() - inicio
+        procesados = totales['insertados'] + totales['actualizados'] + totales['sin_cambios']
+        totales['duracion'] = duracion
+        totales['filas_por_segundo'] = procesados / duracion if duracion > 0 else 0.0
+        return totales
+
+    def eliminar_producto(self, producto_id):
+        with self.transaction():
+            anterior = self._quitar(producto_id)
+            if anterior and anterior.cantidad:
+                self._mover(producto_id, 'ajuste', -anterior.cantidad, self._ahora())
+
+    def actualizar_producto(self, producto_id, nombre, cantidad, precio, stock_minimo=None):
+        with self.transaction():
+            anterior = self._productos.get(producto_id)
+            if anterior is None:
+                return
+            if stock_minimo is None:
+                stock_minimo = anterior.stock_minimo
+            self._poner(anterior._replace(nombre=nombre, cantidad=cantidad, precio=precio, stock_minimo=stock_minimo))
+            if int(cantidad) != anterior.cantidad:
+                self._mover(producto_id, 'ajuste', int(cantidad) - anterior.cantidad, self._ahora())
+
+    def _seleccion(self, filtro=None, ids=None):
+        if not filtro and ids is None:
+            raise ValueError("Indique un filtro o una lista de productos")
+        with self._lock:
+            seleccion = set(self._productos) if ids is None else {int(i) for i in ids} & self._productos.keys()
+            if filtro:
+                seleccion &= {p.id for p in self.buscar_productos(filtro, limite=len(self._productos))}
+            return sorted(seleccion)
+
+    def actualizar_precios_lote(self, porcentaje=0.0, importe=0.0, filtro=None, ids=None,
+                                precio_min=0.0, precio_max=None):
+        with self.transaction():
+            # Same expression and rounding as SQLite's ROUND(x, 2): halves of the shortest
+            # decimal form go away from zero (round() would send them to the even cent)
+            nuevos = {
+                producto_id: float(Decimal(repr(
+                    self._productos[producto_id].precio * (1 + float(porcentaje or 0) / 100) + float(importe or 0)
+                )).quantize(Decimal('0.01'), ROUND_HALF_UP))
+                for producto_id in self._seleccion(filtro, ids)
+            }
+            fuera = sum(1 for precio in nuevos.values()
+                        if precio < precio_min or (precio_max is not None and precio > precio_max))
+            if fuera:
+                raise ValueError(f"{fuera} productos quedarían con un precio fuera del rango permitido")
+            cambiados = 0
+            for producto_id, precio in nuevos.items():
+                if precio != self._productos[producto_id].precio:
+                    self._poner(self._productos[producto_id]._replace(precio=precio))
+                    cambiados += 1
+            return cambiados
+
+    def actualizar_stock_minimo_lote(self, stock_minimo, filtro=None, ids=None):
+        with self.transaction():
+            cambiados = 0
+            for producto_id in self._seleccion(filtro, ids):
+                if self._productos[producto_id].stock_minimo != int(stock_minimo):
+                    self._poner(self._productos[producto_id]._replace(stock_minimo=int(stock_minimo)))
+                    cambiados += 1
+            return cambiados
+
+    def eliminar_productos_lote(self, filtro=None, ids=None):
+        with self.transaction():
+            seleccion = self._seleccion(filtro, ids)
+            for producto_id in seleccion:
+                self.eliminar_producto(producto_id)
+            return len(seleccion)
+
+    def registrar_movimientos(self, movimientos, tamano_lote=1000, ubicacion_id=None):
+        self._validar_ubicacion_unica(ubicacion_id)
+        aplicados = 0
+        for lote in self._lotes_movimientos(movimientos, tamano_lote):
+            with self.transaction():
+                for producto_id, tipo, cantidad, fecha in lote:
+                    producto = self._productos.get(producto_id)
+                    if producto is None:
+                        raise ValueError("El lote contiene movimientos de productos inexistentes")
+                    self._poner(producto._replace(cantidad=producto.cantidad + cantidad))
+                    self._mover(producto_id, tipo, cantidad, fecha)
+                # Same check as SQLite: the lote's net effect must not leave a product short
+                faltante = sorted(m[0] for m in lote if self._productos[m[0]].cantidad < 0)
+                if faltante:
+                    raise ValueError(f"Stock insuficiente en la ubicación {self.UBICACION_PRINCIPAL}: {faltante[0]}")
+            aplicados += len(lote)
+        return aplicados
+
+    def ajustar_stock(self, producto_id, delta, tipo='ajuste', ubicacion_id=None):
+        return self.ajustar_stock_lote([(producto_id, delta)], tipo, ubicacion_id)[producto_id]
+
+    def ajustar_stock_lote(self, ajustes, tipo='ajuste', ubicacion_id=None):
+        if tipo not in self.TIPOS_MOVIMIENTO:
+            raise ValueError(f"Tipo de movimiento no válido: {tipo}")
+        self._validar_ubicacion_unica(ubicacion_id)
+        ahora = self._ahora()
+        nuevas = {}
+        with self.transaction():
+            for producto_id, delta in ajustes:
+                delta = int(delta)
+                producto = self._productos.get(producto_id)
+                if producto is None or producto.cantidad + delta < 0:
+                    raise ValueError(f"Stock insuficiente o producto inexistente: {producto_id}")
+                self._poner(producto._replace(cantidad=producto.cantidad + delta))
+                if delta:
+                    self._mover(producto_id, tipo, delta, ahora)
+                nuevas[producto_id] = producto.cantidad + delta
+        return nuevas
+
+    # Queries
+
+    def obtener_producto_por_id(self, producto_id):
+        with self._lock:
+            return self._productos.get(int(producto_id))
+
+    def obtener_productos(self, columnas=None):
+        with self._lock:
+            productos = [self._productos[i] for i in self._ids]
+        if columnas is None:
+            return productos
+        desconocidas = set(columnas) - set(COLUMNAS_PRODUCTO)
+        if desconocidas or not columnas:
+            raise ValueError(f"Columnas no válidas: {sorted(desconocidas)}")
+        return [tuple(getattr(p, c) for c in columnas) for p in productos]
+
+    def obtener_productos_pagina(self, after_key=None, limit=100, order_by='id', filtro=''):
+        if order_by not in ('id', 'nombre'):
+            raise ValueError(f"order_by no soportado: {order_by}")
+        limit = max(1, int(limit))
+        filtro = filtro.casefold() if filtro else ''
+
+        with self._lock:
+            if order_by == 'id':
+                inicio = bisect.bisect_right(self._ids, after_key) if after_key is not None else 0
+                candidatos = (self._productos[i] for i in self._ids[inicio:])
+            else:
+                inicio = 0
+                if after_key is not None:
+                    nombre, producto_id = after_key
+                    inicio = bisect.bisect_right(self._por_nombre, (_clave_nombre(nombre), producto_id))
+                candidatos = (self._productos[i] for _, i in self._por_nombre[inicio:])
+
+            filas = []
+            for producto in candidatos:
+                if filtro and filtro not in producto.nombre.casefold():
+                    continue
+                filas.append(producto)
+                if len(filas) > limit:
+                    break
+
+        siguiente = None
+        if len(filas) > limit:
+            filas = filas[:limit]
+            ultima = filas[-1]
+            siguiente = ultima.id if order_by == 'id' else (ultima.nombre, ultima.id)
+        return {'productos': filas, 'siguiente': siguiente}
+
+    def buscar_productos(self, texto, limite=50):
+        terminos = _palabras(texto or '')
+        if not terminos:
+            return []
+        resultados = []
+        with self._lock:
+            for _, producto_id in self._por_nombre:
+                producto = self._productos[producto_id]
+                palabras = _palabras(producto.nombre)
+                if all(any(p.startswith(t) for p in palabras) for t in terminos):
+                    resultados.append(producto)
+                    if len(resultados) >= limite:
+                        break
+        return resultados
+
+    def producto_existe(self, nombre, excluir_id=None):
+        with self._lock:
+            producto_id = self._nombres.get(_clave_nombre(nombre))
+        return producto_id is not None and producto_id != excluir_id
+
+    def obtener_productos_bajo_stock(self):
+        with self._lock:
+            return [self._productos[i] for i in sorted(self._bajo_stock)]
+
+    def obtener_estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+        total_productos = stats['total_productos']
+        stats['valor_promedio'] = stats['valor_total'] / total_productos if total_productos > 0 else 0
+        stats['productos_criticos'] = stats['bajo_stock'] + stats['sin_stock']
+        return stats
+
+    def reconstruir_estadisticas(self):
+        with self._lock:
+            for clave in self._stats:
+                self._stats[clave] = 0
+            for producto in self._productos.values():
+                self._sumar_stats(producto, 1)
+        return self.obtener_estadisticas()
+
+    def obtener_movimientos(self, producto_id, limite=100):
+        with self._lock:
+            return list(reversed(self._mov_por_producto.get(producto_id, [])[-limite:]))
+
+    def stock_a_fecha(self, producto_id, fecha):
+        fecha = self._fecha(fecha)
+        with self._lock:
+            return sum(m[3] for m in self._mov_por_producto.get(producto_id, []) if m[4] <= fecha)
+
+    def crear_snapshots(self, umbral=1):
+        # Per-product movement lists already make as-of queries cheap
+        return 0
+
+    # Backup / restore through a real SQLite file so backups are interchangeable
+
+    def backup_database(self, backup_path, progreso=None):
+        from inventory_model import InventarioModel
+        with self._lock:
+            productos = [self._productos[i] for i in self._ids]
+            movimientos = list(self._movimientos)
+
+        with self._destino_backup(backup_path) as ruta:
+            self._copiar_a_sqlite(InventarioModel(ruta), productos, movimientos)
+        if progreso:
+            progreso(len(productos), len(productos))
+        return True
+
+    def _copiar_a_sqlite(self, destino, productos, movimientos):
+        try:
+            with destino.transaction() as conn:
+                conn.execute("DELETE FROM productos")
+                conn.execute("DELETE FROM movimientos")
+                conn.execute("DELETE FROM snapshots_stock")
+                conn.execute("DELETE FROM stock_ubicaciones")
+                conn.executemany(
+                    "INSERT INTO productos (id, nombre, cantidad, precio, stock_minimo) VALUES (?, ?, ?, ?, ?)",
+                    productos
+                )
+                conn.execute(
+                    "INSERT INTO stock_ubicaciones (producto_id, ubicacion_id, cantidad) "
+                    "SELECT id, ?, cantidad FROM productos WHERE cantidad != 0",
+                    (self.UBICACION_PRINCIPAL,)
+                )
+                conn.executemany(
+                    "INSERT INTO movimientos (id, producto_id, tipo, cantidad, fecha) VALUES (?, ?, ?, ?, ?)",
+                    movimientos
+                )
+            destino.crear_snapshots()
+        finally:
+            destino.close()
+
+    def restore_database(self, backup_path):
+        with self._origen_backup(backup_path) as ruta:
+            self._validar_backup(ruta)
+            productos, movimientos, ultimo_id = self._leer_sqlite(ruta)
+
+        with self._lock:
+            self._reiniciar()
+            self._version += 1
+            for producto in productos:
+                self._indexar(producto)
+            for movimiento in movimientos:
+                self._movimientos.append(movimiento)
+                self._mov_por_producto.setdefault(movimiento[1], []).append(movimiento)
+            self._siguiente_id = ultimo_id + 1
+            self._siguiente_movimiento = (movimientos[-1][0] + 1) if movimientos else 1
+        return True
+
+    def _leer_sqlite(self, ruta):
+        origen = sqlite3.connect(ruta)
+        try:
+            columnas = {fila[1] for fila in origen.execute("PRAGMA table_info(productos)")}
+            # Soft-deleted rows are not part of the inventory
+            vivos = "WHERE eliminado_en IS NULL" if 'eliminado_en' in columnas else ""
+            productos = [Producto(*fila) for fila in origen.execute(
+                f"SELECT id, nombre, cantidad, precio, stock_minimo FROM productos {vivos} ORDER BY id"
+            )]
+            tablas = {fila[0] for fila in origen.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            movimientos = []
+            if 'movimientos' in tablas:
+                movimientos = origen.execute(
+                    "SELECT id, producto_id, tipo, cantidad, fecha FROM movimientos ORDER BY id"
+                ).fetchall()
+            # Ids of deleted or archived products are never handed out again:
+            # a new product must not inherit their ledger
+            usados = [
+                origen.execute("SELECT MAX(id) FROM productos").fetchone()[0],
+                max((m[1] for m in movimientos), default=None),
+            ]
+            if 'sqlite_sequence' in tablas:
+                usados += [fila[0] for fila in origen.execute(
+                    "SELECT seq FROM sqlite_sequence WHERE name = 'productos'"
+                )]
+        finally:
+            origen.close()
+        return productos, movimientos, max((u for u in usados if u is not None), default=0)
+
+    def version_datos(self):
+        return self._version
+
+    def close(self):
+        pass
+
+
+def create_backend(config):
+    """Build the storage backend selected by `database.backend` in config."""
+    backend = config.get('database', 'backend', 'sqlite')
+    nombre = config.get('database', 'name', 'inventario.db')
+    if backend == 'memory':
+        return MemoryBackend(nombre)
+    if backend == 'sqlite':
+        from inventory_model import InventarioModel
+        return InventarioModel(
+            nombre,
+            perfil=config.get('database', 'profile', 'balanced'),
+            perfiles=config.get('database', 'profiles'),
+            archivo=config.get('database', 'archive_name')
+        )
+    raise ValueError(f"Backend de almacenamiento desconocido: {backend}")
@@ -1,20 +1,22 @@
 import ttkbootstrap as tb
 from ttkbootstrap.constants import *
 from tkinter import messagebox, filedialog, Toplevel, Canvas, PanedWindow
-from inventory_model import InventarioModel
+from inventory_config import Config
+from inventory_storage import create_backend
 import csv
 from datetime import datetime
 import os
+import sqlite3
+import threading
 
 
 class InventarioUI:
     def __init__(self, controller=None):
         self.controller = controller
-        self.model = controller.model if controller else InventarioModel()
         
         # Load theme from configuration
-        from inventory_config import Config
         self.config = Config()
+        self.model = controller.model if controller else create_backend(self.config)
         self.current_theme = self.config.get('ui', 'theme', 'superhero')
         
         # Initialize app with dynamic theme
@@ -23,6 +25,17 @@ class InventarioUI:
         self.app.geometry("900x600")  # Updated for sidebar
         self.editando_id = None
         
+        # Keyset pagination state for the product table
+        self.page_size = self.config.get('ui', 'page_size', 200)
+        self.orden_pagina = 'id'
+        self.filtro_actual = ""
+        self.cursor_pagina = None
+        
+        # Refresh when another instance (or thread) commits to the database
+        self.intervalo_cambios = self.config.get('ui', 'change_poll_ms', 2000)
+        self._datos_cambiados = threading.Event()
+        self.model.suscribir_cambios(self._datos_cambiados.set)
+        
         # Available themes
         self.light_themes = ['cosmo', 'flatly', 'litera', 'minty', 'lumen', 'sandstone', 'yeti', 'pulse', 'united', 'morph', 'journal', 'simplex', 'cerculean']
         self.dark_themes = ['darkly', 'superhero', 'solar', 'cyborg', 'vapor']
@@ -33,6 +46,7 @@ class InventarioUI:
         self.actualizar_estadisticas()
         self.configurar_atajos()
         self.verificar_alertas_inicio()
+        self.vigilar_cambios()
         self.app.mainloop()
     
     def run(self):
@@ -147,7 +161,9 @@ class InventarioUI:
             "📦 Productos": [
                 ("➕ Agregar", self.agregar_producto, "success", "Ctrl+N"),
                 ("✏️ Editar", self.editar_producto, "info", ""),
-                ("🗑️ Eliminar", self.eliminar_producto, "danger", "Delete")
+                ("🗑️ Eliminar", self.eliminar_producto, "danger", "Delete"),
+                ("💲 Cambiar precios", self.cambiar_precios_lote, "primary", ""),
+                ("📉 Stock mínimo", self.cambiar_stock_minimo_lote, "secondary", "")
             ],
             "📊 Reportes": [
                 ("⚠️ Alertas", self.mostrar_alertas_stock, "warning", ""),
@@ -157,7 +173,9 @@ class InventarioUI:
             ],
             "⚙️ Herramientas": [
                 ("💾 Backup", self.backup_database, "primary", ""),
-                ("🔄 Restore", self.restore_database, "warning", "")
+                ("🔄 Restore", self.restore_database, "warning", ""),
+                ("🧮 Recalcular", self.recalcular_estadisticas, "info", ""),
+                ("🗜️ Compactar", self.compactar_base, "secondary", "")
             ],
             "🎨 Apariencia": [
                 ("🎨 Cambiar Tema", self.create_theme_selector, "dark", ""),
@@ -365,7 +383,8 @@ class InventarioUI:
         frame_tabla = tb.Frame(self.content_frame, padding=10)
         frame_tabla.pack(fill="both", expand=True)
 
-        self.tabla = tb.Treeview(frame_tabla, columns=("ID", "Producto", "Cantidad", "Precio", "Stock Mínimo"), show="headings")
+        self.tabla = tb.Treeview(frame_tabla, columns=("ID", "Producto", "Cantidad", "Precio", "Stock Mínimo"), show="headings",
+                                 selectmode="extended")
         for col in ("ID", "Producto", "Cantidad", "Precio", "Stock Mínimo"):
             self.tabla.heading(col, text=col, command=lambda c=col: self.ordenar_columna(c))
             if col == "ID":
@@ -374,6 +393,11 @@ class InventarioUI:
                 self.tabla.column(col, anchor=CENTER)
         self.tabla.pack(fill=BOTH, expand=True)
         
+        self.btn_cargar_mas = tb.Button(frame_tabla, text="⬇️ Cargar más", bootstyle=SECONDARY,
+                                        command=self.cargar_mas_productos)
+        self.btn_cargar_mas.pack(pady=(5, 0))
+        self.create_tooltip(self.btn_cargar_mas, "Cargar la siguiente página de productos")
+        
         # Bind right-click for context menu
         self.tabla.bind("<Button-3>", self.mostrar_menu_contextual)
 
@@ -395,11 +419,8 @@ class InventarioUI:
             messagebox.showwarning("Error", "Cantidad y Stock Mínimo deben ser números enteros, precio debe ser decimal")
             return
 
-        if self.model.producto_existe(nombre):
-            messagebox.showwarning("Error", f"El producto '{nombre}' ya existe")
+        if not self._guardar('add_product', 'agregar_producto', nombre, cantidad, precio, stock_minimo):
             return
-
-        self.model.agregar_producto(nombre, cantidad, precio, stock_minimo)
         self.limpiar_campos()
         self.cargar_productos()
         self.actualizar_estadisticas()
@@ -412,19 +433,18 @@ class InventarioUI:
 
         item = self.tabla.item(seleccionado)
         producto_id = item['values'][0]
-        producto = self.model.obtener_producto_por_id(producto_id)
+        producto = self._producto(producto_id)
         
         if producto:
             self.editando_id = producto_id
             self.entry_nombre.delete(0, "end")
-            self.entry_nombre.insert(0, producto[1])
+            self.entry_nombre.insert(0, producto.nombre)
             self.entry_cantidad.delete(0, "end")
-            self.entry_cantidad.insert(0, str(producto[2]))
+            self.entry_cantidad.insert(0, str(producto.cantidad))
             self.entry_precio.delete(0, "end")
-            self.entry_precio.insert(0, str(producto[3]))
+            self.entry_precio.insert(0, str(producto.precio))
             self.entry_stock_minimo.delete(0, "end")
-            stock_minimo = str(producto[4]) if len(producto) > 4 else "10"
-            self.entry_stock_minimo.insert(0, stock_minimo)
+            self.entry_stock_minimo.insert(0, str(producto.stock_minimo))
             
             # Note: Button modification removed - sidebar buttons are now used for all actions
             # Edit mode is indicated by the filled form fields
@@ -447,16 +467,32 @@ class InventarioUI:
             messagebox.showwarning("Error", "Cantidad y Stock Mínimo deben ser números enteros, precio debe ser decimal")
             return
 
-        if self.model.producto_existe(nombre, self.editando_id):
-            messagebox.showwarning("Error", f"El producto '{nombre}' ya existe")
+        if not self._guardar('update_product', 'actualizar_producto',
+                             self.editando_id, nombre, cantidad, precio, stock_minimo):
             return
-
-        self.model.actualizar_producto(self.editando_id, nombre, cantidad, precio, stock_minimo)
         self.limpiar_campos()
         self.cargar_productos()
         self.actualizar_estadisticas()
         self.restaurar_boton_agregar()
 
+    def _guardar(self, accion, metodo, *args, parent=None):
+        """Run a single-product write through the controller (the model without one); return True if applied."""
+        try:
+            if self.controller:
+                resultado = getattr(self.controller, accion)(*args)
+                if not resultado['success']:
+                    raise ValueError("\n".join(resultado['errors']))
+            else:
+                getattr(self.model, metodo)(*args)
+            return True
+        except sqlite3.IntegrityError:
+            # Only reached without a controller, which reports duplicates itself
+            messagebox.showwarning("Error", "Ya existe un producto con ese nombre", parent=parent)
+            return False
+        except ValueError as e:
+            messagebox.showerror("Error", f"No se guardaron los cambios:\n{str(e)}", parent=parent)
+            return False
+
     def restaurar_boton_agregar(self):
         self.editando_id = None
         # Note: Button restoration removed - sidebar buttons are now used for all actions
@@ -493,18 +529,108 @@ class InventarioUI:
         widget.bind("<Leave>", on_leave)
 
     def eliminar_producto(self):
-        seleccionado = self.tabla.focus()
-        if not seleccionado:
+        ids = self._ids_seleccionados()
+        if not ids:
             messagebox.showwarning("Error", "Seleccione un producto para eliminar")
             return
 
-        item = self.tabla.item(seleccionado)
-        producto_id = item['values'][0]
+        if len(ids) == 1:
+            pregunta = f"¿Está seguro de eliminar el producto ID: {ids[0]}?"
+        else:
+            pregunta = f"¿Está seguro de eliminar los {len(ids)} productos seleccionados?"
+        if messagebox.askyesno("Confirmar", pregunta):
+            # Every selected row goes in one transaction
+            if self._lote('delete_products', 'eliminar_productos_lote', ids=ids) is not None:
+                self.cargar_productos(self.entry_busqueda.get())
+                self.actualizar_estadisticas()
+
+    # Bulk operations apply to the selected rows, or to every product matching
+    # the current search when nothing is selected
+
+    def _ids_seleccionados(self):
+        return [self.tabla.item(item)['values'][0] for item in self.tabla.selection()]
+
+    def _objetivo_lote(self):
+        """Return (filtro, ids, descripción) for a bulk operation, or None if there is no target."""
+        ids = self._ids_seleccionados()
+        if ids:
+            return None, ids, f"{len(ids)} productos seleccionados"
+        filtro = self.entry_busqueda.get().strip()
+        if filtro:
+            return filtro, None, f"todos los productos que coinciden con '{filtro}'"
+        messagebox.showwarning("Error", "Seleccione productos o escriba una búsqueda")
+        return None
+
+    def _lote(self, accion, metodo, *args, filtro=None, ids=None):
+        """Run a bulk operation through the controller (the model without one); return the count."""
+        try:
+            if self.controller:
+                resultado = getattr(self.controller, accion)(*args, filtro=filtro, ids=ids)
+                if not resultado['success']:
+                    raise ValueError("\n".join(resultado['errors']))
+                return resultado['data']
+            return getattr(self.model, metodo)(*args, filtro=filtro, ids=ids)
+        except ValueError as e:
+            messagebox.showerror("Error", f"No se aplicó ningún cambio:\n{str(e)}")
+            return None
+
+    def _dialogo_lote(self, titulo, etiquetas, aplicar):
+        """Ask for the values of a bulk operation; `aplicar` gets them as strings."""
+        objetivo = self._objetivo_lote()
+        if not objetivo:
+            return
+        filtro, ids, descripcion = objetivo
         
-        if messagebox.askyesno("Confirmar", f"¿Está seguro de eliminar el producto ID: {producto_id}?"):
-            self.model.eliminar_producto(producto_id)
-            self.cargar_productos()
+        dialog = Toplevel(self.app)
+        dialog.title(titulo)
+        dialog.transient(self.app)
+        
+        tb.Label(dialog, text=f"Se aplicará a {descripcion}").grid(row=0, column=0, columnspan=2, padx=10, pady=5)
+        entradas = []
+        for fila, etiqueta in enumerate(etiquetas, start=1):
+            tb.Label(dialog, text=etiqueta).grid(row=fila, column=0, padx=10, pady=5, sticky=W)
+            entrada = tb.Entry(dialog)
+            entrada.grid(row=fila, column=1, padx=10, pady=5)
+            entradas.append(entrada)
+        
+        def confirmar():
+            cambiados = aplicar(*(e.get().strip() for e in entradas), filtro=filtro, ids=ids)
+            if cambiados is None:
+                return
+            dialog.destroy()
+            self.cargar_productos(self.entry_busqueda.get())
             self.actualizar_estadisticas()
+            messagebox.showinfo(titulo, f"✅ {cambiados} productos actualizados")
+        
+        tb.Button(dialog, text="Aplicar", bootstyle=SUCCESS, command=confirmar).grid(
+            row=len(etiquetas) + 1, column=0, columnspan=2, pady=10
+        )
+
+    def cambiar_precios_lote(self):
+        """Reprice the selection by a percentage and/or a fixed amount"""
+        def aplicar(porcentaje, importe, filtro, ids):
+            try:
+                porcentaje, importe = float(porcentaje or 0), float(importe or 0)
+            except ValueError:
+                messagebox.showerror("Error", "El porcentaje y el importe deben ser números")
+                return None
+            return self._lote('reprice_products', 'actualizar_precios_lote', porcentaje, importe,
+                              filtro=filtro, ids=ids)
+        
+        self._dialogo_lote("Cambiar precios", ["Porcentaje (%):", "Importe fijo:"], aplicar)
+
+    def cambiar_stock_minimo_lote(self):
+        """Set the same minimum stock on the selection"""
+        def aplicar(stock_minimo, filtro, ids):
+            try:
+                stock_minimo = int(stock_minimo)
+            except ValueError:
+                messagebox.showerror("Error", "El stock mínimo debe ser un número entero")
+                return None
+            return self._lote('set_minimum_stock', 'actualizar_stock_minimo_lote', stock_minimo,
+                              filtro=filtro, ids=ids)
+        
+        self._dialogo_lote("Stock mínimo", ["Stock mínimo:"], aplicar)
 
     def limpiar_campos(self):
         self.entry_nombre.delete(0, "end")
@@ -518,21 +644,56 @@ class InventarioUI:
         for item in self.tabla.get_children():
             self.tabla.delete(item)
         
-        productos = self.model.obtener_productos()
+        if filtro.strip():
+            # Ranked full-text matches, capped so each keystroke stays cheap
+            limite = self.config.get('ui', 'search_limit', 200)
+            for producto in self.model.buscar_productos(filtro, limite):
+                self._insertar_fila(producto)
+            self.cursor_pagina = None
+            self.btn_cargar_mas.config(state=DISABLED)
+            self.tabla.tag_configure("bajo_stock", background="#ffcccc")
+            return
         
-        if filtro:
-            productos = [p for p in productos if filtro.lower() in str(p[1]).lower()]
+        # Restart paging from the first page
+        self.filtro_actual = filtro
+        self.cursor_pagina = None
+        self.cargar_mas_productos()
+
+    def _insertar_fila(self, producto):
+        # Add visual indicators for low stock
+        tags = ("bajo_stock",) if producto.bajo_stock else ()
+        self.tabla.insert("", "end", values=producto, tags=tags)
+
+    def cargar_mas_productos(self):
+        pagina = self.model.obtener_productos_pagina(
+            self.cursor_pagina, self.page_size, self.orden_pagina, self.filtro_actual
+        )
         
-        for producto in productos:
-            item_id = self.tabla.insert("", "end", values=producto)
-            
-            # Add visual indicators for low stock
-            if len(producto) >= 3 and producto[2] <= (producto[4] if len(producto) > 4 else 10):
-                self.tabla.item(item_id, tags=("bajo_stock",))
+        for producto in pagina['productos']:
+            self._insertar_fila(producto)
+        
+        self.cursor_pagina = pagina['siguiente']
+        self.btn_cargar_mas.config(state=NORMAL if self.cursor_pagina is not None else DISABLED)
         
         # Configure tag colors for low stock
         self.tabla.tag_configure("bajo_stock", background="#ffcccc")
 
+    def vigilar_cambios(self):
+        """Poll for database changes and reload only when something was committed"""
+        try:
+            self.model.comprobar_cambios()
+        except Exception:
+            pass  # Transient errors (e.g. a restore in progress): try again next tick
+        
+        # Don't pull the rows out from under an edit in progress
+        if self._datos_cambiados.is_set() and self.editando_id is None:
+            self._datos_cambiados.clear()
+            self.cargar_productos(self.entry_busqueda.get())
+            self.actualizar_estadisticas()
+        
+        if self.intervalo_cambios:
+            self.app.after(self.intervalo_cambios, self.vigilar_cambios)
+
     def filtrar_productos(self, event=None):
         texto_busqueda = self.entry_busqueda.get()
         self.cargar_productos(texto_busqueda)
@@ -570,37 +731,49 @@ class InventarioUI:
         self.limpiar_campos()
 
     def ordenar_columna(self, columna):
+        # ID and name have a seekable index, so keep paging in that order
+        if columna in ("ID", "Producto"):
+            self.orden_pagina = 'id' if columna == "ID" else 'nombre'
+            self.cargar_productos(self.entry_busqueda.get())
+            return
+        
         productos = self.model.obtener_productos()
         
-        # Get column index
-        columnas = ["ID", "Producto", "Cantidad", "Precio", "Stock Mínimo"]
-        col_idx = columnas.index(columna)
+        # Map heading to Producto field
+        campos = {"Cantidad": "cantidad", "Precio": "precio", "Stock Mínimo": "stock_minimo"}
+        campo = campos[columna]
         
         # Sort products
-        productos.sort(key=lambda x: x[col_idx] if x[col_idx] is not None else "")
+        productos.sort(key=lambda p: getattr(p, campo) if getattr(p, campo) is not None else 0)
         
         # Reload table
         for item in self.tabla.get_children():
             self.tabla.delete(item)
         
         for producto in productos:
-            item_id = self.tabla.insert("", "end", values=producto)
-            
-            # Add visual indicators for low stock
-            if len(producto) >= 3 and producto[2] <= (producto[4] if len(producto) > 4 else 10):
-                self.tabla.item(item_id, tags=("bajo_stock",))
+            self._insertar_fila(producto)
+        
+        # Every row is already loaded
+        self.cursor_pagina = None
+        self.btn_cargar_mas.config(state=DISABLED)
 
     def mostrar_menu_contextual(self, event):
         seleccionado = self.tabla.identify_row(event.y)
         if seleccionado:
-            self.tabla.selection_set(seleccionado)
+            # Keep a multi-row selection when right-clicking inside it
+            if seleccionado not in self.tabla.selection():
+                self.tabla.selection_set(seleccionado)
             
             menu = tb.Menu(self.app, tearoff=0)
             menu.add_command(label="Editar", command=self.editar_producto)
             menu.add_command(label="Eliminar", command=self.eliminar_producto)
+            menu.add_command(label="Cambiar precios...", command=self.cambiar_precios_lote)
+            menu.add_command(label="Stock mínimo...", command=self.cambiar_stock_minimo_lote)
             menu.add_separator()
             menu.add_command(label="Copiar nombre", command=lambda: self.copiar_nombre(seleccionado))
             menu.add_command(label="Ver detalles", command=lambda: self.ver_detalles(seleccionado))
+            if self.model.MULTIPLES_UBICACIONES:
+                menu.add_command(label="Transferir stock", command=lambda: self.transferir_stock(seleccionado))
             
             menu.post(event.x_root, event.y_root)
 
@@ -614,27 +787,98 @@ class InventarioUI:
     def ver_detalles(self, item_id):
         item = self.tabla.item(item_id)
         producto_id = item['values'][0]
-        producto = self.model.obtener_producto_por_id(producto_id)
+        producto = self._producto(producto_id)
         
         if producto:
-            stock_minimo = producto[4] if len(producto) > 4 else 10
-            estado = "BAJO STOCK" if producto[2] <= stock_minimo else "OK"
-            color = "rojo" if producto[2] <= stock_minimo else "verde"
+            estado = "BAJO STOCK" if producto.bajo_stock else "OK"
+            color = "rojo" if producto.bajo_stock else "verde"
             
             detalles = f"""
-ID: {producto[0]}
-Producto: {producto[1]}
-Cantidad: {producto[2]}
-Precio: ${producto[3]:.2f}
-Stock Mínimo: {stock_minimo}
+ID: {producto.id}
+Producto: {producto.nombre}
+Cantidad: {producto.cantidad}
+Precio: ${producto.precio:.2f}
+Stock Mínimo: {producto.stock_minimo}
 Estado: {estado}
-Valor Total: ${producto[2] * producto[3]:.2f}
+Valor Total: ${producto.valor_total:.2f}
             """
             
+            ubicaciones = self.model.obtener_stock_ubicaciones(producto_id)
+            if self.model.MULTIPLES_UBICACIONES and ubicaciones:
+                detalles += "\nPor ubicación:\n" + "\n".join(
+                    f"• {nombre}: {cantidad}" for _, nombre, cantidad in ubicaciones
+                )
+            
             messagebox.showinfo("Detalles del Producto", detalles.strip())
 
+    def transferir_stock(self, item_id):
+        """Dialog to move units of the selected product between locations"""
+        producto_id = self.tabla.item(item_id)['values'][0]
+        if not self.model.MULTIPLES_UBICACIONES:
+            messagebox.showwarning("Transferir stock", "Este almacenamiento solo maneja la ubicación principal")
+            return
+        ubicaciones = self.model.obtener_ubicaciones()
+        nombres = [u[1] for u in ubicaciones]
+        ids = {u[1]: u[0] for u in ubicaciones}
+        
+        dialog = Toplevel(self.app)
+        dialog.title("Transferir stock")
+        dialog.transient(self.app)
+        
+        tb.Label(dialog, text="Origen:").grid(row=0, column=0, padx=10, pady=5, sticky=W)
+        origen = tb.Combobox(dialog, values=nombres, state="readonly")
+        origen.grid(row=0, column=1, padx=10, pady=5)
+        tb.Label(dialog, text="Destino:").grid(row=1, column=0, padx=10, pady=5, sticky=W)
+        destino = tb.Combobox(dialog, values=nombres, state="readonly")
+        destino.grid(row=1, column=1, padx=10, pady=5)
+        tb.Label(dialog, text="Cantidad:").grid(row=2, column=0, padx=10, pady=5, sticky=W)
+        cantidad = tb.Entry(dialog)
+        cantidad.grid(row=2, column=1, padx=10, pady=5)
+        if nombres:
+            origen.current(0)
+        
+        def confirmar():
+            try:
+                unidades = int(cantidad.get())
+            except ValueError:
+                messagebox.showerror("Error", "La cantidad debe ser un número entero", parent=dialog)
+                return
+            if not self._guardar('transfer_stock', 'transferir_stock', producto_id,
+                                 ids.get(origen.get()), ids.get(destino.get()), unidades, parent=dialog):
+                return
+            dialog.destroy()
+            self.cargar_productos(self.entry_busqueda.get())
+            self.actualizar_estadisticas()
+            messagebox.showinfo("Transferir stock", "✅ Transferencia realizada")
+        
+        tb.Button(dialog, text="Transferir", bootstyle=SUCCESS, command=confirmar).grid(
+            row=3, column=0, columnspan=2, pady=10
+        )
+
+    # Reads repeated on every refresh go through the controller's result cache
+
+    def _estadisticas(self):
+        if self.controller:
+            resultado = self.controller.get_statistics()
+            if resultado['success']:
+                return resultado['data']
+        return self.model.obtener_estadisticas()
+
+    def _productos_bajo_stock(self):
+        if self.controller:
+            resultado = self.controller.get_low_stock_products()
+            if resultado['success']:
+                return resultado['data']
+        return self.model.obtener_productos_bajo_stock()
+
+    def _producto(self, producto_id):
+        if self.controller:
+            resultado = self.controller.get_product_by_id(producto_id)
+            return resultado['data'] if resultado['success'] else None
+        return self.model.obtener_producto_por_id(producto_id)
+
     def mostrar_alertas_stock(self):
-        productos_bajo_stock = self.model.obtener_productos_bajo_stock()
+        productos_bajo_stock = self._productos_bajo_stock()
         
         if not productos_bajo_stock:
             messagebox.showinfo("Alertas de Stock", "✅ No hay productos con stock bajo")
@@ -642,8 +886,7 @@ Valor Total: ${producto[2] * producto[3]:.2f}
         
         mensaje = "⚠️ Productos con stock bajo:\n\n"
         for producto in productos_bajo_stock:
-            stock_minimo = producto[4] if len(producto) > 4 else 10
-            mensaje += f"• {producto[1]}: {producto[2]} unidades (Mínimo: {stock_minimo})\n"
+            mensaje += f"• {producto.nombre}: {producto.cantidad} unidades (Mínimo: {producto.stock_minimo})\n"
         
         mensaje += f"\nTotal: {len(productos_bajo_stock)} productos necesitan reabastecimiento"
         
@@ -654,7 +897,7 @@ Valor Total: ${producto[2] * producto[3]:.2f}
         for widget in self.stats_frame.winfo_children():
             widget.destroy()
         
-        stats = self.model.obtener_estadisticas()
+        stats = self._estadisticas()
         
         # Create stat labels
         stats_data = [
@@ -672,8 +915,31 @@ Valor Total: ${producto[2] * producto[3]:.2f}
             value_label = tb.Label(frame, text=str(value), font=("Arial", 12, "bold"), bootstyle=style)
             value_label.pack()
 
+    def recalcular_estadisticas(self):
+        """Rebuild the statistics summary table and refresh the panel"""
+        try:
+            self.model.reconstruir_estadisticas()
+            self.actualizar_estadisticas()
+            messagebox.showinfo("Estadísticas", "✅ Estadísticas recalculadas")
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudieron recalcular las estadísticas:\n{str(e)}")
+
+    def compactar_base(self):
+        """One-off full VACUUM so routine maintenance can reclaim space on older files"""
+        if not messagebox.askyesno(
+            "Compactar", "La base de datos quedará bloqueada mientras se compacta. ¿Continuar?"
+        ):
+            return
+        try:
+            convertida = self.model.activar_auto_vacuum()
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudo compactar la base de datos:\n{str(e)}")
+            return
+        mensaje = "✅ Base de datos compactada" if convertida else "La base de datos ya estaba preparada"
+        messagebox.showinfo("Compactar", mensaje)
+
     def mostrar_estadisticas(self):
-        stats = self.model.obtener_estadisticas()
+        stats = self._estadisticas()
         
         mensaje = f"""
 📊 ESTADÍSTICAS DEL INVENTARIO
@@ -693,14 +959,21 @@ Valor Total: ${producto[2] * producto[3]:.2f}
 📈 Porcentaje de Stock Cubierto: {(stats['stock_total']/stats['stock_minimo_total']*100):.1f}%
         """
         
+        ubicaciones = self.model.obtener_ubicaciones()
+        if len(ubicaciones) > 1:
+            mensaje += "\n🏬 POR UBICACIÓN\n" + "\n".join(
+                f"• {nombre}: {unidades} unidades en {productos} productos (${valor:,.2f})"
+                for _, nombre, productos, unidades, valor in ubicaciones
+            )
+        
         messagebox.showinfo("Estadísticas del Inventario", mensaje.strip())
 
     def verificar_alertas_inicio(self):
-        stats = self.model.obtener_estadisticas()
+        stats = self._estadisticas()
         productos_criticos = stats['productos_criticos']
         
         if productos_criticos > 0:
-            productos_bajo_stock = self.model.obtener_productos_bajo_stock()
+            productos_bajo_stock = self._productos_bajo_stock()
             
             mensaje = f"⚠️ ALERTAS DE INVENTARIO AL INICIAR\n\n"
             mensaje += f"📦 Productos con atención requerida: {productos_criticos}\n"
@@ -710,9 +983,8 @@ Valor Total: ${producto[2] * producto[3]:.2f}
             if productos_bajo_stock:
                 mensaje += "Productos críticos:\n"
                 for producto in productos_bajo_stock[:5]:  # Show max 5 products
-                    stock_minimo = producto[4] if len(producto) > 4 else 10
-                    estado = "🚫 SIN STOCK" if producto[2] == 0 else f"⚠️ {producto[2]} unidades"
-                    mensaje += f"• {producto[1]}: {estado}\n"
+                    estado = "🚫 SIN STOCK" if producto.cantidad == 0 else f"⚠️ {producto.cantidad} unidades"
+                    mensaje += f"• {producto.nombre}: {estado}\n"
                 
                 if len(productos_bajo_stock) > 5:
                     mensaje += f"... y {len(productos_bajo_stock) - 5} más\n"
@@ -740,7 +1012,7 @@ Valor Total: ${producto[2] * producto[3]:.2f}
             return
         
         productos = self.model.obtener_productos()
-        stats = self.model.obtener_estadisticas()
+        stats = self._estadisticas()
         
         if not productos:
             messagebox.showinfo("Información", "No hay productos para generar reporte")
@@ -804,23 +1076,14 @@ Valor Total: ${producto[2] * producto[3]:.2f}
                 
                 # Add products
                 for producto in productos:
-                    stock_minimo = producto[4] if len(producto) > 4 else 10
-                    valor_total = producto[2] * producto[3]
-                    
-                    row = [
-                        str(producto[0]),
-                        producto[1],
-                        str(producto[2]),
-                        f"${producto[3]:.2f}",
-                        str(stock_minimo),
-                        f"${valor_total:.2f}"
-                    ]
-                    
-                    # Color code for low stock
-                    if producto[2] <= stock_minimo:
-                        data.append(row)
-                    else:
-                        data.append(row)
+                    data.append([
+                        str(producto.id),
+                        producto.nombre,
+                        str(producto.cantidad),
+                        f"${producto.precio:.2f}",
+                        str(producto.stock_minimo),
+                        f"${producto.valor_total:.2f}"
+                    ])
                 
                 products_table = Table(data, colWidths=[0.5*inch, 2*inch, 1*inch, 1*inch, 1*inch, 1*inch])
                 products_table.setStyle(TableStyle([
@@ -837,8 +1100,7 @@ Valor Total: ${producto[2] * producto[3]:.2f}
                 
                 # Color low stock items
                 for i, producto in enumerate(productos):
-                    stock_minimo = producto[4] if len(producto) > 4 else 10
-                    if producto[2] <= stock_minimo:
+                    if producto.bajo_stock:
                         products_table.setStyle(TableStyle([
                             ('BACKGROUND', (0, i+1), (-1, i+1), colors.lightcoral)
                         ]))
@@ -862,26 +1124,81 @@ Valor Total: ${producto[2] * producto[3]:.2f}
             except Exception as e:
                 messagebox.showerror("Error", f"No se pudo generar el PDF: {str(e)}")
 
+    # Plain and compressed backups are both accepted everywhere
+    TIPOS_BACKUP = [
+        ("Backups", "*.db *.db.gz *.db.xz"),
+        ("Database files", "*.db"),
+        ("Compressed backups", "*.gz *.xz"),
+        ("All files", "*.*")
+    ]
+
     def backup_database(self):
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        default_filename = f"inventario_backup_{timestamp}.db"
+        if self.controller:
+            default_path = self.controller.default_backup_path()
+        else:
+            default_path = f"inventario_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
         
         filename = filedialog.asksaveasfilename(
-            defaultextension=".db",
-            filetypes=[("Database files", "*.db"), ("All files", "*.*")],
-            initialfile=default_filename
+            filetypes=self.TIPOS_BACKUP,
+            initialdir=os.path.dirname(os.path.abspath(default_path)),
+            initialfile=os.path.basename(default_path)
         )
         
         if filename:
+            self._ejecutar_backup_con_progreso(filename)
+
+    def _ejecutar_backup_con_progreso(self, filename):
+        """Run an online backup in a worker thread while showing its progress."""
+        dialog = Toplevel(self.app)
+        dialog.title("Copia de seguridad")
+        dialog.geometry("360x120")
+        dialog.transient(self.app)
+        dialog.grab_set()
+        
+        tb.Label(dialog, text="💾 Creando copia de seguridad...").pack(pady=(15, 5))
+        barra = tb.Progressbar(dialog, maximum=100, bootstyle="success-striped", length=300)
+        barra.pack(pady=5)
+        etiqueta = tb.Label(dialog, text="0%")
+        etiqueta.pack()
+        
+        # Shared state: the worker only writes here, Tk widgets are touched from the UI thread
+        estado = {'copiadas': 0, 'total': 0, 'terminado': False, 'error': None}
+        
+        def progreso(copiadas, total):
+            estado['copiadas'] = copiadas
+            estado['total'] = total
+        
+        def trabajo():
             try:
-                self.model.backup_database(filename)
-                messagebox.showinfo("Éxito", f"Copia de seguridad creada:\n{filename}")
+                self.model.backup_database(filename, progreso=progreso)
             except Exception as e:
-                messagebox.showerror("Error", f"No se pudo crear la copia de seguridad:\n{str(e)}")
+                estado['error'] = e
+            finally:
+                estado['terminado'] = True
+        
+        def actualizar():
+            if estado['total']:
+                porcentaje = estado['copiadas'] * 100 / estado['total']
+                barra['value'] = porcentaje
+                etiqueta.config(text=f"{porcentaje:.0f}% ({estado['copiadas']}/{estado['total']} páginas)")
+            
+            if not estado['terminado']:
+                self.app.after(100, actualizar)
+                return
+            
+            dialog.destroy()
+            if estado['error']:
+                messagebox.showerror("Error", f"No se pudo crear la copia de seguridad:\n{str(estado['error'])}")
+            else:
+                messagebox.showinfo("Éxito", f"Copia de seguridad creada:\n{filename}")
+        
+        threading.Thread(target=trabajo, daemon=True).start()
+        self.app.after(100, actualizar)
 
     def restore_database(self):
         filename = filedialog.askopenfilename(
-            filetypes=[("Database files", "*.db"), ("All files", "*.*")],
+            filetypes=self.TIPOS_BACKUP,
+            initialdir=self.config.get('database', 'backup_folder', 'backups'),
             title="Seleccionar copia de seguridad para restaurar"
         )
         
@@ -895,20 +1212,51 @@ Valor Total: ${producto[2] * producto[3]:.2f}
             ):
                 return
             
+            self._ejecutar_restore_en_segundo_plano(filename)
+
+    def _ejecutar_restore_en_segundo_plano(self, filename):
+        """Stage and validate the backup in a worker thread; the UI stays usable until the swap."""
+        dialog = Toplevel(self.app)
+        dialog.title("Restauración")
+        dialog.geometry("360x100")
+        dialog.transient(self.app)
+        
+        tb.Label(dialog, text="🔄 Verificando y preparando la copia de seguridad...").pack(pady=(15, 5))
+        barra = tb.Progressbar(dialog, mode="indeterminate", bootstyle="warning-striped", length=300)
+        barra.pack(pady=5)
+        barra.start(10)
+        
+        estado = {'terminado': False, 'error': None}
+        
+        def trabajo():
             try:
                 self.model.restore_database(filename)
-                
-                # Refresh UI
-                self.cargar_productos()
-                self.actualizar_estadisticas()
-                
-                messagebox.showinfo(
-                    "Éxito", 
-                    f"Base de datos restaurada exitosamente desde:\n{filename}\n\n"
-                    "La interfaz se ha actualizado con los datos restaurados."
-                )
             except Exception as e:
-                messagebox.showerror("Error", f"No se pudo restaurar la base de datos:\n{str(e)}")
+                estado['error'] = e
+            finally:
+                estado['terminado'] = True
+        
+        def comprobar():
+            if not estado['terminado']:
+                self.app.after(100, comprobar)
+                return
+            
+            dialog.destroy()
+            if estado['error']:
+                messagebox.showerror("Error", f"No se pudo restaurar la base de datos:\n{str(estado['error'])}")
+                return
+            
+            # Refresh UI
+            self.cargar_productos()
+            self.actualizar_estadisticas()
+            messagebox.showinfo(
+                "Éxito", 
+                f"Base de datos restaurada exitosamente desde:\n{filename}\n\n"
+                "La interfaz se ha actualizado con los datos restaurados."
+            )
+        
+        threading.Thread(target=trabajo, daemon=True).start()
+        self.app.after(100, comprobar)
 
     def exportar_csv(self):
         productos = self.model.obtener_productos()
@@ -930,9 +1278,8 @@ Valor Total: ${producto[2] * producto[3]:.2f}
                     writer.writerow(['ID', 'Producto', 'Cantidad', 'Precio', 'Stock Mínimo', 'Valor Total'])
                     
                     for producto in productos:
-                        stock_minimo = producto[4] if len(producto) > 4 else 10
-                        valor_total = producto[2] * producto[3]
-                        writer.writerow([producto[0], producto[1], producto[2], producto[3], stock_minimo, valor_total])
+                        writer.writerow([producto.id, producto.nombre, producto.cantidad, producto.precio,
+                                         producto.stock_minimo, producto.valor_total])
                 
                 messagebox.showinfo("Éxito", f"Se exportaron {len(productos)} productos a {filename}")
             except Exception as e:
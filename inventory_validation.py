@@ -95,6 +95,25 @@ class ProductValidator:
         
         return errors
     
+    def validate_delta(self, delta: Union[str, int]) -> List[str]:
+        """Validate a signed stock adjustment."""
+        errors = []
+        
+        if delta is None or not str(delta).strip():
+            errors.append("El ajuste es obligatorio")
+            return errors
+        
+        try:
+            delta_int = int(str(delta).strip())
+            
+            if abs(delta_int) > self.max_cantidad:
+                errors.append(f"El ajuste no puede exceder {self.max_cantidad} unidades")
+                
+        except ValueError:
+            errors.append("El ajuste debe ser un número entero")
+        
+        return errors
+    
     def validate_precio(self, precio: Union[str, float]) -> List[str]:
         """Validate product price."""
         errors = []
@@ -137,6 +156,29 @@ class ProductValidator:
             errors.append("El stock mínimo debe ser un número entero")
         
         return errors
+    
+    def validate_repricing(self, porcentaje: Union[str, float, None],
+                           importe: Union[str, float, None]) -> ValidationResult:
+        """Validate a bulk price change given as a percentage and/or an amount."""
+        errors = []
+        
+        if not porcentaje and not importe:
+            errors.append("Indique un porcentaje o un importe")
+            return ValidationResult(is_valid=False, errors=errors)
+        
+        try:
+            if porcentaje and float(porcentaje) <= -100:
+                errors.append("El porcentaje debe ser mayor que -100")
+        except ValueError:
+            errors.append("El porcentaje debe ser un número decimal")
+        
+        try:
+            if importe:
+                float(importe)
+        except ValueError:
+            errors.append("El importe debe ser un número decimal")
+        
+        return ValidationResult(is_valid=len(errors) == 0, errors=errors)
 
 
 class DatabaseValidator:
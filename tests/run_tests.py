@@ -13,6 +13,9 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from test_inventory_model import TestInventoryModel
 from test_validation import TestProductValidator, TestDatabaseValidator, TestFilterValidator, TestValidationResult
 from test_config import TestConfig
+from test_inventory_async import TestAsyncInventoryController
+from test_inventory_controller import TestInventoryController
+from test_storage import TestMemoryBackend, TestCreateBackend
 
 
 def run_all_tests():
@@ -28,6 +31,10 @@ def run_all_tests():
     test_suite.addTest(loader.loadTestsFromTestCase(TestFilterValidator))
     test_suite.addTest(loader.loadTestsFromTestCase(TestValidationResult))
     test_suite.addTest(loader.loadTestsFromTestCase(TestConfig))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestAsyncInventoryController))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestInventoryController))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestMemoryBackend))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestCreateBackend))
     
     # Run tests
     runner = unittest.TextTestRunner(verbosity=2)
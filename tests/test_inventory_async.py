@@ -0,0 +1,97 @@
+"""
+Unit tests for the asyncio inventory facade.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+from inventory_async import AsyncInventoryController
+from inventory_controller import InventoryController
+
+
+class TestAsyncInventoryController(unittest.IsolatedAsyncioTestCase):
+    """Test cases for AsyncInventoryController class."""
+    
+    def setUp(self):
+        """Set up a controller on a temporary database and config."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        config_file = os.path.join(self.tmpdir.name, 'config.json')
+        with open(config_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                "database": {"name": os.path.join(self.tmpdir.name, 'test.db')},
+                "logging": {"file": os.path.join(self.tmpdir.name, 'test.log')}
+            }, f)
+        self.controller = InventoryController(config_file)
+        self.facade = AsyncInventoryController(self.controller, max_concurrency=4, read_workers=3)
+    
+    async def asyncTearDown(self):
+        """Shut the facade down."""
+        await self.facade.shutdown()
+    
+    def tearDown(self):
+        """Clean up temporary files."""
+        self.tmpdir.cleanup()
+    
+    async def test_add_and_get_products(self):
+        """Test writes and reads round-trip through the executors."""
+        result = await self.facade.add_product("Async Product", 10, 9.99, 5)
+        self.assertTrue(result['success'])
+        
+        result = await self.facade.get_products()
+        self.assertEqual([p.nombre for p in result['data']], ["Async Product"])
+        
+        stats = await self.facade.get_statistics()
+        self.assertEqual(stats['data']['total_productos'], 1)
+    
+    async def test_concurrent_writes_are_serialized(self):
+        """Test many concurrent writers all succeed on one writer thread."""
+        escritores = set()
+        original = self.controller.add_product
+        
+        def add_product(*args):
+            escritores.add(threading.get_ident())
+            return original(*args)
+        
+        self.controller.add_product = add_product
+        results = await asyncio.gather(*(
+            self.facade.add_product(f"Item {i}", i + 1, 1.0, 5) for i in range(30)
+        ))
+        
+        self.assertTrue(all(r['success'] for r in results))
+        self.assertEqual(len(escritores), 1)
+        
+        reads = await asyncio.gather(*(self.facade.get_statistics() for _ in range(10)))
+        self.assertTrue(all(r['data']['total_productos'] == 30 for r in reads))
+    
+    async def test_concurrent_stock_decrements(self):
+        """Test concurrent POS decrements through the facade are all accounted for."""
+        await self.facade.add_product("POS Item", 10, 1.0, 5)
+        
+        results = await asyncio.gather(*(self.facade.adjust_stock(1, -1, 'venta') for _ in range(12)))
+        
+        self.assertEqual(sum(r['success'] for r in results), 10)
+        self.assertEqual(sorted(r['data'] for r in results if r['success']), list(range(10)))
+        product = await self.facade.get_product_by_id(1)
+        self.assertEqual(product['data'].cantidad, 0)
+    
+    async def test_cancellation(self):
+        """Test a cancelled call raises CancelledError and frees its slot."""
+        bloqueo = threading.Event()
+        self.controller.get_statistics = lambda: bloqueo.wait(5) and {'success': True}
+        
+        tarea = asyncio.ensure_future(self.facade.get_statistics())
+        await asyncio.sleep(0.05)
+        tarea.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await tarea
+        bloqueo.set()
+        
+        result = await self.facade.get_products()
+        self.assertTrue(result['success'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,236 @@
+"""
+Unit tests for the inventory controller.
+"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from unittest import mock
+from inventory_controller import InventoryController
+
+
+class TestInventoryController(unittest.TestCase):
+    """Test cases for InventoryController class."""
+
+    def setUp(self):
+        """Set up a controller on a temporary database and config."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.config_file = os.path.join(self.tmpdir.name, 'config.json')
+        self._escribir_config()
+        self.controller = InventoryController(self.config_file)
+
+    def _escribir_config(self, **ui):
+        with open(self.config_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                "database": {"name": os.path.join(self.tmpdir.name, 'test.db')},
+                "ui": ui,
+                "logging": {"file": os.path.join(self.tmpdir.name, 'test.log')}
+            }, f)
+
+    def tearDown(self):
+        """Clean up temporary files."""
+        self.controller.shutdown()
+        self.tmpdir.cleanup()
+
+    def test_cache_hits_and_write_invalidation(self):
+        """Test repeated reads are served from the cache until a write."""
+        self.controller.add_product("Cacheado", 5, 2.0, 10)
+
+        for _ in range(3):
+            self.assertEqual(self.controller.get_statistics()['data']['total_productos'], 1)
+            self.assertEqual(self.controller.get_product_by_id(1)['data'].cantidad, 5)
+        self.assertEqual(self.controller.cache_stats()['hits'], 4)
+        self.assertEqual(self.controller.cache_stats()['misses'], 2)
+
+        # Callers get their own copy
+        self.controller.get_products()['data'].clear()
+        self.assertEqual(len(self.controller.get_products()['data']), 1)
+
+        self.controller.update_product(1, "Cacheado", 50, 2.0, 10)
+        self.assertEqual(self.controller.get_product_by_id(1)['data'].cantidad, 50)
+        self.assertEqual(self.controller.get_statistics()['data']['valor_total'], 100.0)
+        self.controller.delete_product(1)
+        self.assertFalse(self.controller.get_product_by_id(1)['success'])
+        self.assertEqual(self.controller.get_products()['data'], [])
+
+    def test_cache_sees_writes_made_elsewhere(self):
+        """Test commits that bypass the controller still invalidate the cache."""
+        self.controller.add_product("Original", 1, 1.0, 10)
+        self.assertEqual(len(self.controller.get_products()['data']), 1)
+
+        self.controller.model.agregar_producto("Directo", 1, 1.0, 10)
+        self.assertEqual(len(self.controller.get_products()['data']), 2)
+        self.assertEqual(self.controller.get_products("dir")['data'][0].nombre, "Directo")
+
+    def test_cache_is_bounded(self):
+        """Test the least recently used entries are evicted past the configured size."""
+        self.controller.shutdown()
+        self._escribir_config(result_cache_size=2)
+        self.controller = InventoryController(self.config_file)
+        self.controller.add_product("Uno", 1, 1.0, 10)
+        self.controller.add_product("Dos", 1, 1.0, 10)
+
+        self.controller.get_product_by_id(1)
+        self.controller.get_product_by_id(2)
+        self.controller.get_product_by_id(1)
+        self.controller.get_statistics()
+        self.assertEqual(self.controller.cache_stats()['entradas'], 2)
+        self.controller.get_product_by_id(1)
+        self.controller.get_product_by_id(2)
+        self.assertEqual(self.controller.cache_stats()['hits'], 2)
+
+    def test_bulk_operations(self):
+        """Test bulk operations validate once, apply as a set and refresh cached reads."""
+        self.controller.add_products_bulk([("Cable rojo", 5, 10.0, 1), ("Cable azul", 5, 20.0, 1)])
+        self.assertEqual(self.controller.get_statistics()['data']['valor_total'], 150.0)
+
+        self.assertFalse(self.controller.reprice_products(filtro="cable")['success'])
+        self.assertFalse(self.controller.reprice_products(porcentaje=10)['success'])
+        self.assertFalse(self.controller.reprice_products(porcentaje=10, ids=[0])['success'])
+        result = self.controller.reprice_products(importe=999990, filtro="cable")
+        self.assertFalse(result['success'])
+        self.assertIn("fuera del rango", result['errors'][0])
+
+        self.assertEqual(self.controller.reprice_products(porcentaje=-10, filtro="cable")['data'], 2)
+        self.assertEqual(self.controller.get_statistics()['data']['valor_total'], 135.0)
+        for vacio in (None, '', ' '):
+            self.assertFalse(self.controller.set_minimum_stock(vacio, ids=[1])['success'])
+        self.assertEqual(self.controller.get_product_by_id(1)['data'].stock_minimo, 1)
+        self.assertEqual(self.controller.set_minimum_stock(0, ids=[2])['data'], 1)
+        self.assertEqual(self.controller.set_minimum_stock(8, ids=[1])['data'], 1)
+        self.assertEqual(len(self.controller.get_low_stock_products()['data']), 1)
+        self.assertEqual(self.controller.delete_products(ids=[1, 2])['data'], 2)
+        self.assertEqual(self.controller.get_products()['data'], [])
+
+    def test_upsert_keeps_zero_minimum_stock(self):
+        """Test an explicit stock_minimo of 0 is applied and a missing one keeps the stored value."""
+        self.controller.add_product("Tornillo", 5, 1.0, 7)
+        result = self.controller.upsert_products_bulk([("Tornillo", 6, 1.0), ("Tuerca", 2, 1.0, 0)])
+
+        self.assertTrue(result['success'])
+        self.assertEqual((result['data']['insertados'], result['data']['actualizados']), (1, 1))
+        self.assertEqual([(p.cantidad, p.stock_minimo) for p in self.controller.get_products()['data']],
+                         [(6, 7), (2, 0)])
+        self.controller.upsert_products_bulk([("Tornillo", 6, 1.0, 0)])
+        self.assertEqual(self.controller.get_product_by_id(1)['data'].stock_minimo, 0)
+
+    def test_movements_and_adjustments(self):
+        """Test ledger writes refresh cached reads and report rejected lotes."""
+        self.controller.add_product("Caja", 5, 1.0, 1)
+        self.assertEqual(self.controller.get_product_by_id(1)['data'].cantidad, 5)
+
+        result = self.controller.record_movements([(1, 'entrada', 10), (1, 'venta', 3)])
+        self.assertEqual(result['data']['aplicados'], 2)
+        self.assertEqual(self.controller.get_product_by_id(1)['data'].cantidad, 12)
+        self.assertFalse(self.controller.record_movements([(1, 'venta', 50)])['success'])
+        self.assertEqual(self.controller.adjust_stock(1, -2)['data'], 10)
+        self.assertFalse(self.controller.adjust_stock(1, -11)['success'])
+        self.assertEqual(self.controller.adjust_stock_bulk([(1, 1)])['data'], {1: 11})
+        self.assertEqual(self.controller.adjust_stock(1, "dos")['errors'], ["El ajuste debe ser un número entero"])
+        self.assertEqual(self.controller.adjust_stock_bulk([(1, 1), (1, None)])['errors'],
+                         ["Fila 2: El ajuste es obligatorio"])
+        self.assertEqual(self.controller.get_statistics()['data']['valor_total'], 11.0)
+
+    def test_run_maintenance(self):
+        """Test maintenance purges expired soft-deleted products and reports its counts."""
+        self.controller.add_product("Viejo", 1, 1.0, 1)
+        self.controller.add_product("Reciente", 1, 1.0, 1)
+        self.controller.delete_product(1)
+        self.controller.delete_product(2)
+        with self.controller.model.transaction() as conn:
+            conn.execute("UPDATE productos SET eliminado_en = '2000-01-01 00:00:00' WHERE id = 1")
+
+        result = self.controller.run_maintenance()
+        self.assertTrue(result['success'])
+        self.assertEqual(result['data']['purgados'], 1)
+        self.assertEqual(result['data']['archivados'], 0)
+        self.assertEqual(self.controller.run_maintenance()['data']['purgados'], 0)
+
+    def _carpeta_backups(self):
+        carpeta = os.path.join(self.tmpdir.name, 'backups')
+        self.controller.config.set('database', 'backup_folder', carpeta)
+        self.controller.config.set('export', 'backup_compression', 'none')
+        return carpeta
+
+    def test_scheduled_backup_skips_unchanged_data(self):
+        """Test scheduled backups only run again once something was committed."""
+        carpeta = self._carpeta_backups()
+        self.controller.add_product("Respaldado", 1, 1.0, 1)
+
+        primero = self.controller.run_scheduled_backup()['data']
+        self.assertTrue(os.path.exists(primero))
+        self.assertIsNone(self.controller.run_scheduled_backup()['data'])
+        self.controller.adjust_stock(1, 1)
+        segundo = self.controller.run_scheduled_backup()['data']
+        forzado = self.controller.run_scheduled_backup(force=True)['data']
+        self.assertEqual(len({primero, segundo, forzado}), 3)
+        self.assertEqual(len(os.listdir(carpeta)), 3)
+
+    def test_backup_names_never_collide(self):
+        """Test backups taken within the same clock tick get distinct names."""
+        carpeta = self._carpeta_backups()
+
+        class Reloj(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime(2026, 1, 2, 3, 4, 5, 600000)
+
+        with mock.patch('inventory_controller.datetime', Reloj):
+            for _ in range(3):
+                self.assertTrue(self.controller.run_scheduled_backup(force=True)['success'])
+        self.assertEqual(sorted(os.listdir(carpeta)), [
+            'inventario_backup_20260102_030405_600000.db',
+            'inventario_backup_20260102_030405_600000_1.db',
+            'inventario_backup_20260102_030405_600000_2.db',
+        ])
+
+    def test_purge_old_backups(self):
+        """Test only our backups older than the retention period are deleted."""
+        carpeta = self._carpeta_backups()
+        os.makedirs(carpeta)
+        hace_40_dias = time.time() - 40 * 86400
+        for nombre in ('inventario_backup_viejo.db.gz', 'inventario_backup_nuevo.db', 'notas.txt'):
+            with open(os.path.join(carpeta, nombre), 'w') as f:
+                f.write(nombre)
+        for nombre in ('inventario_backup_viejo.db.gz', 'notas.txt'):
+            os.utime(os.path.join(carpeta, nombre), (hace_40_dias, hace_40_dias))
+
+        self.assertEqual(self.controller.purge_old_backups(60)['data'], 0)
+        self.assertEqual(self.controller.purge_old_backups()['data'], 1)
+        self.assertEqual(sorted(os.listdir(carpeta)), ['inventario_backup_nuevo.db', 'notas.txt'])
+        self.assertEqual(self.controller.purge_old_backups(0)['data'], 0)
+
+    def test_next_backup_time(self):
+        """Test the scheduler picks the earliest of the interval and the daily times."""
+        ahora = datetime(2026, 1, 1, 10, 0)
+        self.assertIsNone(self.controller._proximo_backup(ahora, ahora))
+
+        self.controller.config.set('database', 'auto_backup_times', ['08:00', '20:00'])
+        self.assertEqual(self.controller._proximo_backup(ahora, ahora), datetime(2026, 1, 1, 20, 0))
+        tarde = datetime(2026, 1, 1, 21, 0)
+        self.assertEqual(self.controller._proximo_backup(tarde, tarde), datetime(2026, 1, 2, 8, 0))
+
+        self.controller.config.set('database', 'auto_backup_interval_minutes', 90)
+        self.assertEqual(self.controller._proximo_backup(ahora, datetime(2026, 1, 1, 9, 0)),
+                         datetime(2026, 1, 1, 10, 30))
+        self.assertEqual(self.controller._proximo_backup(tarde, tarde), datetime(2026, 1, 1, 22, 30))
+
+    def test_update_after_transfer_is_rejected_cleanly(self):
+        """Test an absolute edit that the main location cannot cover returns an error."""
+        self.controller.add_product("Repartido", 10, 1.0, 1)
+        tienda = self.controller.model.crear_ubicacion("Tienda")
+        self.assertTrue(self.controller.transfer_stock(1, 1, tienda, 8)['success'])
+
+        result = self.controller.update_product(1, "Repartido", 5, 1.0, 1)
+        self.assertFalse(result['success'])
+        self.assertIn("Stock insuficiente", result['errors'][0])
+        self.assertEqual(self.controller.get_product_by_id(1)['data'].cantidad, 10)
+        self.assertTrue(self.controller.update_product(1, "Repartido", 9, 1.0, 1)['success'])
+        self.assertEqual(self.controller.get_product_by_id(1)['data'].cantidad, 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,8 @@ import unittest
 import os
 import tempfile
 import sqlite3
-from inventory_model import InventarioModel
+import threading
+from inventory_model import InventarioModel, Producto
 
 
 class TestInventoryModel(unittest.TestCase):
@@ -20,8 +21,11 @@ class TestInventoryModel(unittest.TestCase):
     
     def tearDown(self):
         """Clean up test environment."""
-        self.model.conn.close()
-        os.unlink(self.test_db.name)
+        self.model.close()
+        for ruta in (self.test_db.name, self.model.archivo):
+            for suffix in ('', '-wal', '-shm', '-journal'):
+                if os.path.exists(ruta + suffix):
+                    os.unlink(ruta + suffix)
     
     def test_database_initialization(self):
         """Test database and table creation."""
@@ -33,6 +37,201 @@ class TestInventoryModel(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertEqual(result[0], 'productos')
     
+    def test_schema_version(self):
+        """Test migrations stamp PRAGMA user_version."""
+        version = self.model.conn.execute("PRAGMA user_version").fetchone()[0]
+        self.assertEqual(version, InventarioModel.VERSION_ESQUEMA)
+    
+    def test_migraciones_sin_escrituras(self):
+        """Test reopening an up-to-date database performs no writes."""
+        self.model.close()
+        self.model = InventarioModel(self.test_db.name)
+        self.assertEqual(os.path.getsize(self.test_db.name + '-wal'), 0)
+    
+    def test_migrar_base_antigua(self):
+        """Test a legacy database without stock_minimo is upgraded in place."""
+        self.model.close()
+        os.unlink(self.test_db.name)
+        conn = sqlite3.connect(self.test_db.name)
+        conn.execute(
+            "CREATE TABLE productos (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "nombre TEXT NOT NULL, cantidad INTEGER NOT NULL, precio REAL NOT NULL)"
+        )
+        conn.execute("INSERT INTO productos (nombre, cantidad, precio) VALUES ('Viejo', 3, 2.0)")
+        conn.commit()
+        conn.close()
+        
+        self.model = InventarioModel(self.test_db.name)
+        
+        self.assertEqual(self.model.obtener_productos()[0][4], 10)
+        self.assertEqual(self.model.obtener_estadisticas()['total_productos'], 1)
+        # Opening never rewrites the whole file; the conversion is explicit
+        self.assertEqual(self.model.conn.execute("PRAGMA auto_vacuum").fetchone()[0], 0)
+        self.assertTrue(self.model.activar_auto_vacuum())
+        self.assertEqual(self.model.conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+        self.assertFalse(self.model.activar_auto_vacuum())
+    
+    def test_base_antigua_con_nombres_duplicados(self):
+        """Test a legacy database with duplicate names rejects new ones until they are resolved."""
+        self.model.close()
+        os.unlink(self.test_db.name)
+        conn = sqlite3.connect(self.test_db.name)
+        conn.execute(
+            "CREATE TABLE productos (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "nombre TEXT NOT NULL, cantidad INTEGER NOT NULL, precio REAL NOT NULL)"
+        )
+        conn.executemany(
+            "INSERT INTO productos (nombre, cantidad, precio) VALUES (?, 1, 1.0)", [("Dup",), ("dup",), ("Otro",)]
+        )
+        conn.commit()
+        conn.close()
+
+        self.model = InventarioModel(self.test_db.name)
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.model.agregar_producto("DUP", 1, 1.0, 1)
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.model.actualizar_producto(3, "dup", 1, 1.0)
+        self.model.actualizar_producto(1, "Dup", 5, 1.0)
+        self.assertTrue(self.model.producto_existe("otro"))
+
+        # Supplier feeds fall back to update-then-insert without the unique index
+        result = self.model.upsert_productos_lote([("DUP", 7, 1.0), ("Otro", 1, 1.0), ("Nuevo", 2, 1.0)])
+        self.assertEqual(
+            [result[k] for k in ('insertados', 'actualizados', 'sin_cambios', 'rechazados')], [1, 1, 1, 0]
+        )
+        self.assertEqual(
+            sorted((p.nombre, p.cantidad) for p in self.model.obtener_productos()),
+            [("Dup", 7), ("Nuevo", 2), ("Otro", 1), ("dup", 7)]
+        )
+
+        # Resolving the duplicates lets the real unique index come back
+        self.assertFalse(self.model.activar_nombres_unicos())
+        self.model.actualizar_producto(2, "Dup viejo", 1, 1.0)
+        self.model.close()
+        self.model = InventarioModel(self.test_db.name)
+        self.assertIsNone(self.model.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'idx_productos_nombre'"
+        ).fetchone())
+        self.assertTrue(self.model.activar_nombres_unicos())
+        indices = {fila[0] for fila in self.model.conn.execute("SELECT name FROM sqlite_master")}
+        self.assertIn("idx_productos_nombre", indices)
+        self.assertNotIn("trg_productos_nombre_unico_insert", indices)
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.model.agregar_producto("DUP", 1, 1.0, 1)
+
+    def test_wal_journal_mode(self):
+        """Test pooled connections use WAL journaling."""
+        with self.model.conexion() as conn:
+            mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode.lower(), 'wal')
+
+    def test_performance_profile_applied(self):
+        """Test connections open with the configured profile's pragmas."""
+        model = InventarioModel(self.test_db.name, perfil='durable', perfiles={'durable': {'cache_size': -4000}})
+        self.addCleanup(model.close)
+
+        with model.conexion() as conn:
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 2)
+            self.assertEqual(conn.execute("PRAGMA cache_size").fetchone()[0], -4000)
+        with self.model.conexion() as conn:
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+            self.assertEqual(conn.execute("PRAGMA temp_store").fetchone()[0], 2)
+
+        with self.assertRaises(ValueError):
+            InventarioModel(self.test_db.name, perfil='turbo')
+        with self.assertRaises(ValueError):
+            InventarioModel(self.test_db.name, perfiles={'balanced': {'synchronous': 'OFF; DROP TABLE productos'}})
+
+    def test_detecta_cambios_externos(self):
+        """Test commits from another instance fire the data-changed signal once."""
+        avisos = []
+        self.model.suscribir_cambios(lambda: avisos.append(1))
+        self.assertFalse(self.model.comprobar_cambios())
+        self.assertFalse(self.model.comprobar_cambios())
+
+        otro = InventarioModel(self.test_db.name)
+        self.addCleanup(otro.close)
+        otro.agregar_producto("Desde otra instancia", 1, 1.0, 5)
+
+        self.assertTrue(self.model.comprobar_cambios())
+        self.assertFalse(self.model.comprobar_cambios())
+        self.assertEqual(avisos, [1])
+
+        # Background polling delivers the same signal
+        recibido = threading.Event()
+        self.model.suscribir_cambios(recibido.set)
+        self.model.iniciar_detector(intervalo=0.01)
+        otro.eliminar_producto(1)
+        self.assertTrue(recibido.wait(5))
+        self.model.detener_detector()
+
+    def test_version_datos(self):
+        """Test the change token only moves when something is committed."""
+        self.model.comprobar_cambios()
+        inicial = self.model.version_datos()
+        self.model.obtener_productos()
+        self.model.backup_database(self.test_db.name + '.bak')
+        self.addCleanup(os.unlink, self.test_db.name + '.bak')
+        self.assertEqual(self.model.version_datos(), inicial)
+
+        self.model.agregar_producto("Cambio", 1, 1.0, 1)
+        despues = self.model.version_datos()
+        self.assertNotEqual(despues, inicial)
+        # Reading the token leaves the change-detection baseline alone
+        self.assertTrue(self.model.comprobar_cambios())
+
+        self.model.cerrar_conexiones()
+        self.assertNotEqual(self.model.version_datos(), despues)
+
+    def test_temporary_profile(self):
+        """Test bulk work can switch profiles and the old settings come back."""
+        with self.model.perfil_temporal('bulk-load') as conn:
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 0)
+            self.model.agregar_productos_lote((f"Bulk {i}", i, 1.0) for i in range(50))
+
+        with self.model.conexion() as conn:
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+            self.assertEqual(conn.execute("PRAGMA cache_size").fetchone()[0], -65536)
+        self.assertEqual(len(self.model.obtener_productos()), 50)
+
+    def test_connection_per_thread(self):
+        """Test each thread gets its own connection and can write concurrently."""
+        conexiones = []
+        errores = []
+        
+        def worker(n):
+            try:
+                conexiones.append(self.model.conn)
+                for i in range(20):
+                    self.model.agregar_producto(f"Thread {n} Item {i}", i, 1.0, 5)
+                self.model.obtener_estadisticas()
+            except Exception as e:
+                errores.append(e)
+        
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        self.assertEqual(errores, [])
+        self.assertEqual(len({id(c) for c in conexiones}), 4)
+        self.assertEqual(len(self.model.obtener_productos()), 80)
+
+    def test_conexiones_de_hilos_terminados_se_cierran(self):
+        """Test short-lived threads do not leave their connections in the pool."""
+        self.model.obtener_productos()
+        conexiones = []
+        for _ in range(20):
+            hilo = threading.Thread(target=lambda: conexiones.append(self.model.conn))
+            hilo.start()
+            hilo.join()
+
+        self.assertEqual(len(self.model._conexiones), 1)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conexiones[0].execute("SELECT 1")
+        self.assertEqual(self.model.obtener_productos(), [])
+    
     def test_add_product(self):
         """Test adding a new product."""
         result = self.model.agregar_producto("Test Product", 10, 99.99, 5)
@@ -45,6 +244,79 @@ class TestInventoryModel(unittest.TestCase):
         self.assertEqual(products[0][3], 99.99)
         self.assertEqual(products[0][4], 5)
     
+    def test_agregar_productos_lote(self):
+        """Test bulk insert commits in chunks and reports counts."""
+        filas = [(f"Bulk {i}", i, 1.5, 3) for i in range(250)]
+        filas.append(("Sin stock minimo", 4, 2.0))
+        filas.append(("Fila invalida",))
+        
+        result = self.model.agregar_productos_lote(filas, tamano_lote=100)
+        
+        self.assertEqual(result['insertados'], 251)
+        self.assertEqual(result['rechazados'], 1)
+        self.assertGreater(result['filas_por_segundo'], 0)
+        self.assertEqual(len(self.model.obtener_productos()), 251)
+        self.assertFalse(self.model.conn.in_transaction)
+    
+    def test_transaction_commit_unico(self):
+        """Test mutators inside a unit of work commit once at the end."""
+        with self.model.transaction():
+            self.model.agregar_producto("A", 1, 1.0, 5)
+            self.model.agregar_producto("B", 2, 1.0, 5)
+            self.assertTrue(self.model.conn.in_transaction)
+        
+        self.assertFalse(self.model.conn.in_transaction)
+        self.assertEqual(len(self.model.obtener_productos()), 2)
+    
+    def test_transaction_rollback(self):
+        """Test a failing unit of work leaves no partial changes."""
+        self.model.agregar_producto("A", 1, 1.0, 5)
+        
+        with self.assertRaises(sqlite3.IntegrityError):
+            with self.model.transaction():
+                self.model.agregar_producto("B", 2, 1.0, 5)
+                self.model.agregar_producto("A", 3, 1.0, 5)
+        
+        self.assertEqual([p[1] for p in self.model.obtener_productos()], ["A"])
+        self.assertEqual(self.model.obtener_estadisticas()['total_productos'], 1)
+    
+    def test_transaction_savepoint(self):
+        """Test nested blocks roll back only their own work."""
+        with self.model.transaction():
+            self.model.agregar_producto("A", 1, 1.0, 5)
+            try:
+                with self.model.transaction():
+                    self.model.agregar_producto("B", 2, 1.0, 5)
+                    raise ValueError("abort inner")
+            except ValueError:
+                pass
+            self.model.agregar_producto("C", 3, 1.0, 5)
+        
+        self.assertEqual([p[1] for p in self.model.obtener_productos()], ["A", "C"])
+    
+    def test_filas_producto_tipadas(self):
+        """Test rows come back as Producto records and projections as tuples."""
+        self.model.agregar_producto("Typed", 4, 2.5, 5)
+        
+        producto = self.model.obtener_productos()[0]
+        self.assertIsInstance(producto, Producto)
+        self.assertEqual(producto.nombre, "Typed")
+        self.assertEqual(producto.valor_total, 10.0)
+        self.assertTrue(producto.bajo_stock)
+        self.assertFalse(hasattr(producto, '__dict__'))
+        self.assertEqual(self.model.obtener_producto_por_id(producto.id), producto)
+        
+        self.assertEqual(self.model.obtener_productos(columnas=('nombre', 'cantidad')), [("Typed", 4)])
+        with self.assertRaises(ValueError):
+            self.model.obtener_productos(columnas=('nombre', 'precio; DROP TABLE productos'))
+    
+    def test_obtener_productos_en_orden_de_id(self):
+        """Test listings come back in id order, as the memory backend returns them."""
+        self.model.agregar_productos_lote([("Zeta", 1, 1.0), ("Alfa", 1, 1.0), ("Mu", 1, 1.0)])
+
+        self.assertEqual([p.id for p in self.model.obtener_productos()], [1, 2, 3])
+        self.assertEqual(self.model.obtener_productos(columnas=('nombre',)), [("Zeta",), ("Alfa",), ("Mu",)])
+
     def test_get_product_by_id(self):
         """Test retrieving a product by ID."""
         # Add a product first
@@ -89,7 +361,108 @@ class TestInventoryModel(unittest.TestCase):
         # Verify deletion
         products = self.model.obtener_productos()
         self.assertEqual(len(products), 0)
-    
+
+    def test_soft_delete(self):
+        """Test deleted products keep a tombstone hidden from every query."""
+        self.model.agregar_producto("Borrado", 3, 2.0, 5)
+        self.model.agregar_producto("Vivo", 20, 1.0, 5)
+        self.model.eliminar_producto(1)
+
+        self.assertIsNone(self.model.obtener_producto_por_id(1))
+        self.assertEqual([p.nombre for p in self.model.obtener_productos_bajo_stock()], [])
+        self.assertEqual(self.model.buscar_productos("borrado"), [])
+        self.assertFalse(self.model.producto_existe("Borrado"))
+        self.assertEqual(self.model.obtener_estadisticas()['total_productos'], 1)
+        self.assertEqual(self.model.reconstruir_estadisticas()['valor_total'], 20.0)
+        tombstone = self.model.conn.execute(
+            "SELECT cantidad, eliminado_en FROM productos WHERE id = 1"
+        ).fetchone()
+        self.assertEqual(tombstone[0], 0)
+        self.assertIsNotNone(tombstone[1])
+
+        # The name is free again, and the tombstone can no longer be changed
+        self.model.agregar_producto("Borrado", 1, 1.0, 5)
+        self.model.actualizar_producto(1, "Otro", 9, 9.0)
+        with self.assertRaises(ValueError):
+            self.model.registrar_movimientos([(1, 'entrada', 5)])
+        self.assertEqual(self.model.obtener_estadisticas()['total_productos'], 2)
+
+    def test_purgar_y_vacuum_incremental(self):
+        """Test old tombstones are purged in batches and free pages reclaimed."""
+        self.assertEqual(self.model.conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+        self.model.agregar_productos_lote((f"Churn {i} {'x' * 200}", i + 1, 1.0) for i in range(300))
+        self.model.registrar_movimientos((i + 1, 'venta', 1) for i in range(300))
+        for producto_id in range(1, 301):
+            self.model.eliminar_producto(producto_id)
+
+        self.assertEqual(self.model.purgar_eliminados(dias=1), 0)
+        self.model.conn.execute("UPDATE productos SET eliminado_en = '2000-01-01 00:00:00'")
+        self.model.conn.commit()
+        self.assertEqual(self.model.purgar_eliminados(dias=1, tamano_lote=64), 300)
+        self.assertEqual(self.model.conn.execute("SELECT COUNT(*) FROM productos").fetchone()[0], 0)
+        self.assertEqual(self.model.conn.execute("SELECT COUNT(*) FROM movimientos").fetchone()[0], 0)
+
+        libres = self.model.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        self.assertGreater(libres, 4)
+        self.assertEqual(self.model.vacuum_incremental(paginas=4), 4)
+        self.assertEqual(self.model.vacuum_incremental(paginas=10000), libres - 4)
+        self.assertEqual(self.model.conn.execute("PRAGMA freelist_count").fetchone()[0], 0)
+
+    def test_vacuum_incremental_no_confirma_transacciones(self):
+        """Test reclaiming pages inside a unit of work is refused and commits nothing."""
+        with self.assertRaises(RuntimeError):
+            with self.model.transaction():
+                self.model.agregar_producto("Pendiente", 1, 1.0, 1)
+                self.model.vacuum_incremental()
+        self.assertEqual(self.model.obtener_productos(), [])
+
+    def test_archivar_y_restaurar(self):
+        """Test idle out-of-stock products move to the archive with their history and come back."""
+        self.model.agregar_productos_lote([("Viejo", 5, 1.0, 1), ("Otro viejo", 0, 2.0, 1), ("Con stock", 3, 1.0, 1)])
+        self.model.registrar_movimientos([(1, 'venta', 5)])
+        self.assertEqual(self.model.archivar_inactivos(dias=1), 0)
+        self.model.conn.execute("UPDATE productos SET actualizado_en = '2000-01-01 00:00:00'")
+        self.model.conn.commit()
+
+        self.assertEqual(self.model.archivar_inactivos(dias=1, tamano_lote=1), 2)
+        self.assertEqual([p.nombre for p in self.model.obtener_productos()], ["Con stock"])
+        self.assertEqual(self.model.obtener_estadisticas()['total_productos'], 1)
+        self.assertEqual(self.model.obtener_movimientos(1), [])
+        self.assertEqual([p.id for p in self.model.buscar_archivados("VIEJO")], [2, 1])
+        self.assertEqual([m[2:4] for m in self.model.obtener_movimientos_archivados(1)], [('venta', -5), ('entrada', 5)])
+
+        # A live product took the name meanwhile: nothing is restored
+        self.model.agregar_producto("Otro viejo", 1, 1.0, 1)
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.model.restaurar_archivados([1, 2])
+        self.assertEqual(self.model.restaurar_archivados([1]), 1)
+
+        self.assertEqual(self.model.obtener_producto_por_id(1), Producto(1, "Viejo", 0, 1.0, 1))
+        self.assertEqual(self.model.stock_a_fecha(1, "2999-01-01"), 0)
+        self.assertEqual(len(self.model.obtener_movimientos(1)), 2)
+        self.assertEqual([p.id for p in self.model.buscar_archivados()], [2])
+        self.assertEqual(self.model.obtener_estadisticas(), self.model.reconstruir_estadisticas())
+        # Restored products count as freshly active
+        self.assertEqual(self.model.archivar_inactivos(dias=1), 0)
+
+    def test_archivar_tras_corte_entre_commits(self):
+        """Test a run cut off between the archive and main commits is repaired by the next one."""
+        self.model.agregar_productos_lote([("Parado", 0, 1.0, 1), ("Repuesto", 0, 1.0, 1)])
+        self.model.conn.execute("UPDATE productos SET actualizado_en = '2000-01-01 00:00:00'")
+        self.model.conn.commit()
+        # Both copies committed, the delete from main did not; then one product was restocked
+        with self.model._archivo_adjunto() as conn:
+            conn.execute(
+                "INSERT INTO archivo.productos "
+                "SELECT id, nombre, cantidad, precio, stock_minimo, actualizado_en, '2001-01-01' FROM main.productos"
+            )
+            conn.commit()
+        self.model.registrar_movimientos([(2, 'entrada', 4)])
+
+        self.assertEqual(self.model.archivar_inactivos(dias=1), 1)
+        self.assertEqual([p.nombre for p in self.model.buscar_archivados()], ["Parado"])
+        self.assertEqual([p.nombre for p in self.model.obtener_productos()], ["Repuesto"])
+
     def test_producto_existe(self):
         """Test checking if product exists."""
         # Add a product
@@ -104,6 +477,30 @@ class TestInventoryModel(unittest.TestCase):
         product_id = products[0][0]
         self.assertFalse(self.model.producto_existe("Test Product", product_id))
     
+    def test_nombre_unico(self):
+        """Test the unique index rejects duplicate names regardless of case."""
+        self.model.agregar_producto("Test Product", 10, 99.99, 5)
+        
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.model.agregar_producto("test product", 1, 1.0, 5)
+        
+        result = self.model.agregar_productos_lote([("Test Product", 1, 1.0), ("Other", 1, 1.0)])
+        self.assertEqual(result['insertados'], 1)
+        self.assertEqual(result['rechazados'], 1)
+    
+    def test_consultas_usan_indices(self):
+        """Test duplicate and low-stock lookups are served by indexes."""
+        with self.model.conexion() as conn:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM productos_activos WHERE nombre = ? COLLATE NOCASE", ("x",)
+            ).fetchall()
+            self.assertIn("idx_productos_nombre", str(plan))
+            
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM productos_activos WHERE cantidad <= stock_minimo"
+            ).fetchall()
+            self.assertIn("idx_productos_bajo_stock", str(plan))
+    
     def test_obtener_estadisticas(self):
         """Test getting inventory statistics."""
         # Add test products
@@ -118,6 +515,29 @@ class TestInventoryModel(unittest.TestCase):
         self.assertEqual(stats['bajo_stock'], 1)  # Product 3 has low stock
         self.assertEqual(stats['stock_total'], 35)  # 10 + 20 + 5
     
+    def test_estadisticas_por_triggers(self):
+        """Test the trigger-maintained summary matches a full rebuild."""
+        self.model.agregar_producto("Product 1", 10, 100.0, 5)
+        self.model.agregar_producto("Product 2", 0, 200.0, 15)
+        self.model.agregar_producto("Product 3", 5, 50.0, 10)
+        productos = self.model.obtener_productos()
+        self.model.actualizar_producto(productos[0][0], "Product 1", 2, 10.0, 5)
+        self.model.eliminar_producto(productos[2][0])
+        
+        stats = self.model.obtener_estadisticas()
+        self.assertEqual(stats['total_productos'], 2)
+        self.assertEqual(stats['valor_total'], 20.0)
+        self.assertEqual(stats['bajo_stock'], 2)
+        self.assertEqual(stats['sin_stock'], 1)
+        self.assertEqual(stats['stock_total'], 2)
+        self.assertEqual(stats['stock_minimo_total'], 20)
+        
+        # Corrupt the summary and repair it
+        with self.model.conexion() as conn:
+            conn.execute("UPDATE estadisticas_inventario SET total_productos = 99")
+            conn.commit()
+        self.assertEqual(self.model.reconstruir_estadisticas(), stats)
+    
     def test_obtener_productos_bajo_stock(self):
         """Test getting products with low stock."""
         # Add test products
@@ -129,6 +549,280 @@ class TestInventoryModel(unittest.TestCase):
         self.assertEqual(len(low_stock_products), 1)
         self.assertEqual(low_stock_products[0][1], "Low Stock Product")
     
+    def test_obtener_productos_pagina(self):
+        """Test keyset pagination walks every row exactly once."""
+        self.model.agregar_productos_lote((f"Item {i:03d}", i, 1.0, 5) for i in range(25))
+        
+        for order_by in ('id', 'nombre'):
+            vistos = []
+            cursor = None
+            while True:
+                page = self.model.obtener_productos_pagina(cursor, 10, order_by)
+                vistos.extend(p[1] for p in page['productos'])
+                cursor = page['siguiente']
+                if cursor is None:
+                    break
+            self.assertEqual(vistos, [f"Item {i:03d}" for i in range(25)])
+        
+        page = self.model.obtener_productos_pagina(limit=10, filtro="item 01")
+        self.assertEqual([p[1] for p in page['productos']], [f"Item {i:03d}" for i in range(10, 20)])
+        self.assertIsNone(page['siguiente'])
+        
+        page = self.model.obtener_productos_pagina(limit=10, filtro="%")
+        self.assertEqual(page['productos'], [])
+    
+    def test_buscar_productos(self):
+        """Test full-text search matches prefixes ignoring case and accents."""
+        self.model.agregar_producto("Cañón de Agua", 1, 1.0, 5)
+        self.model.agregar_producto("Canasta Grande", 1, 1.0, 5)
+        self.model.agregar_producto("Ácido Cítrico", 1, 1.0, 5)
+        
+        self.assertEqual(len(self.model.buscar_productos("can")), 2)
+        self.assertEqual([p[1] for p in self.model.buscar_productos("canon agu")], ["Cañón de Agua"])
+        self.assertEqual([p[1] for p in self.model.buscar_productos("ACIDO")], ["Ácido Cítrico"])
+        self.assertEqual(len(self.model.buscar_productos("can", limite=1)), 1)
+        self.assertEqual(self.model.buscar_productos("  "), [])
+        
+        # Index follows renames and deletes
+        producto_id = self.model.buscar_productos("canasta")[0][0]
+        self.model.actualizar_producto(producto_id, "Cesta Grande", 1, 1.0)
+        self.assertEqual(self.model.buscar_productos("canasta"), [])
+        self.assertEqual(len(self.model.buscar_productos("cesta")), 1)
+        self.model.eliminar_producto(producto_id)
+        self.assertEqual(self.model.buscar_productos("cesta"), [])
+    
+    def test_movimientos_registran_cambios_de_cantidad(self):
+        """Test every quantity change is written to the ledger."""
+        self.model.agregar_producto("Ledger", 10, 1.0, 5)
+        producto_id = self.model.obtener_productos()[0][0]
+        self.model.actualizar_producto(producto_id, "Ledger", 7, 1.0, 5)
+        self.model.actualizar_producto(producto_id, "Ledger renombrado", 7, 2.0, 5)
+        self.model.registrar_movimientos([
+            (producto_id, 'entrada', 5),
+            (producto_id, 'venta', 3),
+            (producto_id, 'ajuste', -1),
+        ])
+        
+        movimientos = self.model.obtener_movimientos(producto_id)
+        self.assertEqual([(m[2], m[3]) for m in reversed(movimientos)],
+                         [('entrada', 10), ('ajuste', -3), ('entrada', 5), ('venta', -3), ('ajuste', -1)])
+        self.assertEqual(self.model.obtener_producto_por_id(producto_id)[2], 8)
+        
+        with self.assertRaises(ValueError):
+            self.model.registrar_movimientos([(producto_id, 'venta', 1), (9999, 'venta', 1)])
+        self.assertEqual(self.model.obtener_producto_por_id(producto_id)[2], 8)
+    
+    def test_stock_a_fecha_con_snapshots(self):
+        """Test as-of queries combine the nearest snapshot with later deltas."""
+        self.model.MOVIMIENTOS_POR_SNAPSHOT = 10
+        self.model.agregar_producto("Historico", 0, 1.0, 5)
+        producto_id = self.model.obtener_productos()[0][0]
+        
+        dias = [f"2026-01-{dia:02d} 12:00:00" for dia in range(1, 31)]
+        self.model.registrar_movimientos(
+            ((producto_id, 'entrada', dia, fecha) for dia, fecha in enumerate(dias, start=1)),
+            tamano_lote=7
+        )
+        
+        with self.model.conexion() as conn:
+            snapshots = conn.execute("SELECT COUNT(*) FROM snapshots_stock").fetchone()[0]
+        self.assertGreater(snapshots, 0)
+        
+        self.assertEqual(self.model.stock_a_fecha(producto_id, "2025-12-31"), 0)
+        self.assertEqual(self.model.stock_a_fecha(producto_id, "2026-01-05 23:59:59"), 15)
+        self.assertEqual(self.model.stock_a_fecha(producto_id, "2026-01-20 12:00:00"), 210)
+        self.assertEqual(self.model.stock_a_fecha(producto_id, "2026-02-01"), 465)
+        
+        self.model.crear_snapshots()
+        self.assertEqual(self.model.stock_a_fecha(producto_id, "2026-01-20 12:00:00"), 210)
+
+    def test_stock_a_fecha_con_movimientos_atrasados(self):
+        """Test snapshots stay correct when a feed brings back-dated movements."""
+        self.model.MOVIMIENTOS_POR_SNAPSHOT = 1
+        self.model.agregar_producto("Atrasado", 10, 1.0, 5)
+        producto_id = self.model.obtener_productos()[0].id
+        self.model.registrar_movimientos([(producto_id, 'entrada', 100, "2030-12-01 09:00:00")])
+        self.model.registrar_movimientos([
+            (producto_id, 'venta', 1, "2030-01-10 09:00:00"),
+            (producto_id, 'venta', 1, "2030-01-20 09:00:00"),
+        ])
+
+        self.assertEqual(self.model.stock_a_fecha(producto_id, "2030-01-15"), 9)
+        self.assertEqual(self.model.stock_a_fecha(producto_id, "2030-06-01"), 8)
+        self.assertEqual(self.model.stock_a_fecha(producto_id, "2031-01-01"), 108)
+
+    def test_stock_a_fecha_acotado_por_el_siguiente_snapshot(self):
+        """Test as-of answers match the full ledger when back-dated movements follow snapshots."""
+        self.model.MOVIMIENTOS_POR_SNAPSHOT = 2
+        self.model.agregar_producto("Acotado", 0, 1.0, 5)
+        producto_id = self.model.obtener_productos()[0].id
+        for mes in range(1, 10):
+            self.model.registrar_movimientos([(producto_id, 'entrada', mes, f"2031-{mes:02d}-15 09:00:00")])
+        self.model.registrar_movimientos([(producto_id, 'venta', 7, "2031-03-01 09:00:00")])
+
+        # The back-dated sale voided the snapshots it would have been recorded after
+        with self.model.conexion() as conn:
+            fechas = [fila[0] for fila in conn.execute(
+                "SELECT fecha FROM snapshots_stock WHERE producto_id = ? ORDER BY movimiento_id", (producto_id,)
+            )]
+        self.assertEqual(fechas, sorted(fechas))
+        self.assertTrue(all(fecha <= "2031-03-01 09:00:00" for fecha in fechas[:-1]))
+
+        movimientos = self.model.obtener_movimientos(producto_id)
+        for dia in ("2031-01-01", "2031-02-20", "2031-03-10", "2031-06-30", "2031-12-31"):
+            esperado = sum(m[3] for m in movimientos if m[4] <= f"{dia} 23:59:59")
+            self.assertEqual(self.model.stock_a_fecha(producto_id, dia), esperado, dia)
+
+    def test_ajustar_stock_concurrente(self):
+        """Test relative adjustments from many threads never lose updates or go negative."""
+        self.model.agregar_producto("Caja", 100, 1.0, 5)
+        rechazados = []
+        
+        def vendedor():
+            for _ in range(30):
+                try:
+                    self.model.ajustar_stock(1, -1, 'venta')
+                except ValueError:
+                    rechazados.append(1)
+        
+        threads = [threading.Thread(target=vendedor) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        self.assertEqual(self.model.obtener_producto_por_id(1).cantidad, 0)
+        self.assertEqual(len(rechazados), 20)
+        self.assertEqual(self.model.stock_a_fecha(1, "2999-01-01"), 0)
+        self.assertEqual(self.model.obtener_stock_ubicaciones(1), [])
+    
+    def test_ajustar_stock_lote_atomico(self):
+        """Test a batch with one short product applies nothing."""
+        self.model.agregar_producto("A", 5, 1.0, 1)
+        self.model.agregar_producto("B", 1, 1.0, 1)
+        
+        self.assertEqual(self.model.ajustar_stock_lote([(1, -2), (2, 3)]), {1: 3, 2: 4})
+        with self.assertRaises(ValueError):
+            self.model.ajustar_stock_lote([(1, -1), (2, -5)])
+        with self.assertRaises(ValueError):
+            self.model.ajustar_stock(99, 1)
+        
+        self.assertEqual([p.cantidad for p in self.model.obtener_productos()], [3, 4])
+        self.assertEqual(self.model.obtener_estadisticas()['stock_total'], 7)
+
+    def test_upsert_productos_lote(self):
+        """Test a supplier feed inserts, updates and skips rows by name."""
+        self.model.agregar_productos_lote([("Tornillo", 10, 0.5, 5), ("Tuerca", 20, 0.25, 5), ("Arandela", 5, 0.1, 2)])
+        self.model.eliminar_producto(3)
+
+        result = self.model.upsert_productos_lote([
+            ("tornillo", 15, 0.5),          # quantity change, keeps stock_minimo
+            ("Tuerca", 20, 0.25, 5),        # identical
+            ("Arandela", 7, 0.1),           # tombstoned name: new product
+            ("Clavo", 0, 0.05, 1),
+            ("Mal",),
+        ], tamano_lote=2)
+
+        self.assertEqual(
+            [result[k] for k in ('insertados', 'actualizados', 'sin_cambios', 'rechazados')],
+            [2, 1, 1, 1]
+        )
+        self.assertEqual(
+            sorted((p.nombre, p.cantidad, p.stock_minimo) for p in self.model.obtener_productos()),
+            [("Arandela", 7, 10), ("Clavo", 0, 1), ("Tornillo", 15, 5), ("Tuerca", 20, 5)]
+        )
+        self.assertEqual(self.model.obtener_movimientos(1)[0][2:4], ('ajuste', 5))
+        self.assertEqual(self.model.stock_a_fecha(1, "2999-01-01"), 15)
+        self.assertEqual(self.model.obtener_stock_ubicaciones(1), [(1, "Principal", 15)])
+        self.assertEqual(self.model.obtener_estadisticas()['stock_total'], 42)
+
+    def test_actualizaciones_por_lote(self):
+        """Test set-based repricing, minimum stock and deletes by filter or IDs."""
+        self.model.agregar_productos_lote([
+            ("Tornillo largo", 10, 1.0, 5), ("Tornillo corto", 0, 2.0, 5), ("Tuerca", 4, 10.0, 5)
+        ])
+
+        self.assertEqual(self.model.actualizar_precios_lote(porcentaje=10, filtro="tornillo"), 2)
+        self.assertEqual(self.model.actualizar_precios_lote(importe=-0.5, ids=[1, 3, 99]), 2)
+        self.assertEqual([p.precio for p in sorted(self.model.obtener_productos())], [0.6, 2.2, 9.5])
+        with self.assertRaises(ValueError):
+            self.model.actualizar_precios_lote(porcentaje=-50, filtro="tornillo", precio_min=1.0)
+        self.assertEqual([p.precio for p in sorted(self.model.obtener_productos())], [0.6, 2.2, 9.5])
+        with self.assertRaises(ValueError):
+            self.model.actualizar_precios_lote(porcentaje=10)
+
+        self.assertEqual(self.model.actualizar_stock_minimo_lote(20, filtro="tornillo", ids=[2, 3]), 1)
+        self.assertEqual([p.stock_minimo for p in sorted(self.model.obtener_productos())], [5, 20, 5])
+
+        self.assertEqual(self.model.eliminar_productos_lote(filtro="tornillo"), 2)
+        self.assertEqual([p.nombre for p in self.model.obtener_productos()], ["Tuerca"])
+        self.assertEqual(self.model.obtener_movimientos(1)[0][2:4], ('ajuste', -10))
+        self.assertEqual(self.model.obtener_estadisticas(), self.model.reconstruir_estadisticas())
+        self.assertEqual(self.model.obtener_estadisticas()['valor_total'], 38.0)
+
+    def test_ubicaciones_y_transferencias(self):
+        """Test per-location stock, atomic transfers and location rollups."""
+        self.model.agregar_producto("Tornillo", 100, 0.5, 30)
+        self.model.agregar_productos_lote([("Tuerca", 40, 0.25, 10)])
+        norte = self.model.crear_ubicacion("Bodega Norte")
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.model.crear_ubicacion("bodega norte")
+
+        self.model.registrar_movimientos([(2, 'entrada', 20)], ubicacion_id=norte)
+        self.model.transferir_stock(1, InventarioModel.UBICACION_PRINCIPAL, norte, 80)
+        with self.assertRaises(ValueError):
+            self.model.transferir_stock(1, InventarioModel.UBICACION_PRINCIPAL, norte, 21)
+        with self.assertRaises(ValueError):
+            self.model.transferir_stock(1, norte, 999, 1)
+
+        self.assertEqual(self.model.obtener_producto_por_id(1).cantidad, 100)
+        self.assertEqual(self.model.obtener_producto_por_id(2).cantidad, 60)
+        self.assertEqual(
+            self.model.obtener_stock_ubicaciones(1),
+            [(1, "Principal", 20), (norte, "Bodega Norte", 80)]
+        )
+        self.assertEqual(
+            self.model.obtener_ubicaciones(),
+            [(1, "Principal", 2, 60, 20.0), (norte, "Bodega Norte", 2, 100, 45.0)]
+        )
+        self.assertEqual([p.id for p in self.model.obtener_productos_bajo_stock_ubicacion(1)], [1])
+        self.assertEqual(self.model.obtener_productos_bajo_stock_ubicacion(1)[0].cantidad, 20)
+
+        # Price changes and deletes keep the per-location rollups current
+        self.model.actualizar_producto(2, "Tuerca", 60, 1.0)
+        self.model.eliminar_producto(1)
+        self.assertEqual(
+            self.model.obtener_ubicaciones(),
+            [(1, "Principal", 1, 40, 40.0), (norte, "Bodega Norte", 1, 20, 20.0)]
+        )
+
+        with self.model.conexion() as conn:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT producto_id, cantidad FROM stock_ubicaciones WHERE ubicacion_id = ?",
+                (norte,)
+            ).fetchall()
+        self.assertIn("idx_stock_ubicaciones_ubicacion", str(plan))
+
+    def test_ubicaciones_nunca_negativas(self):
+        """Test edits, sales and feeds cannot take more from a location than it holds."""
+        self.model.agregar_producto("Tornillo", 10, 0.5, 3)
+        norte = self.model.crear_ubicacion("Norte")
+        self.model.transferir_stock(1, InventarioModel.UBICACION_PRINCIPAL, norte, 8)
+
+        with self.assertRaises(ValueError):
+            self.model.actualizar_producto(1, "Tornillo", 0, 0.5)
+        with self.assertRaises(ValueError):
+            self.model.registrar_movimientos([(1, 'venta', 3)])
+        with self.assertRaises(ValueError):
+            self.model.upsert_productos_lote([("Tornillo", 1, 0.5)])
+        self.assertEqual(self.model.obtener_producto_por_id(1).cantidad, 10)
+        self.assertEqual(self.model.obtener_stock_ubicaciones(1), [(1, "Principal", 2), (norte, "Norte", 8)])
+
+        self.model.actualizar_producto(1, "Tornillo", 8, 0.5)
+        self.model.registrar_movimientos([(1, 'venta', 3)], ubicacion_id=norte)
+        self.assertEqual(self.model.obtener_stock_ubicaciones(1), [(norte, "Norte", 5)])
+        self.assertEqual(self.model.obtener_ubicaciones()[0][3:], (0, 0.0))
+
     def test_backup_restore(self):
         """Test database backup and restore."""
         # Add a product
@@ -165,6 +859,178 @@ class TestInventoryModel(unittest.TestCase):
             if os.path.exists(backup_file.name):
                 os.unlink(backup_file.name)
 
+    def test_restore_en_carpeta_con_caracteres_de_uri(self):
+        """Test restores work when the path holds characters that mean something in a URI."""
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        carpeta = os.path.join(tmpdir.name, "dir#1 %20")
+        os.mkdir(carpeta)
+        model = InventarioModel(os.path.join(carpeta, 'inventario.db'))
+        self.addCleanup(model.close)
+        model.agregar_producto("Respaldado", 1, 1.0, 1)
+        backup = os.path.join(carpeta, 'copia.db.gz')
+        model.backup_database(backup)
+        model.agregar_producto("Posterior", 1, 1.0, 1)
+
+        model.restore_database(backup)
+        self.assertEqual([p.nombre for p in model.obtener_productos()], ["Respaldado"])
+    
+    def test_backup_online_con_progreso(self):
+        """Test online backup reports progress and keeps the connection open."""
+        self.model.agregar_productos_lote((f"Item {i}", i, 1.0, 5) for i in range(2000))
+        conn = self.model.conn
+        pasos = []
+        
+        backup_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        backup_file.close()
+        try:
+            self.model.backup_database(
+                backup_file.name, progreso=lambda c, t: pasos.append((c, t)), paginas_por_paso=2
+            )
+            
+            self.assertGreater(len(pasos), 1)
+            self.assertEqual(pasos[-1][0], pasos[-1][1])
+            self.assertIs(self.model.conn, conn)
+            
+            copia = sqlite3.connect(backup_file.name)
+            try:
+                total = copia.execute("SELECT COUNT(*) FROM productos").fetchone()[0]
+            finally:
+                copia.close()
+            self.assertEqual(total, 2000)
+        finally:
+            os.unlink(backup_file.name)
+
+    def test_backup_con_escrituras_concurrentes(self):
+        """Test commits from other connections during the copy do not restart it."""
+        self.model.agregar_productos_lote((f"Item {i}", 100, 1.0, 5) for i in range(2000))
+        copiadas = []
+
+        def vender(c, t):
+            copiadas.append(c)
+            # Another pooled connection commits between every pair of steps
+            escritor = threading.Thread(target=self.model.ajustar_stock, args=(1, -1, 'venta'))
+            escritor.start()
+            escritor.join()
+
+        backup_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        backup_file.close()
+        try:
+            self.model.backup_database(backup_file.name, progreso=vender, paginas_por_paso=2, pausa=0)
+
+            self.assertEqual(copiadas, sorted(copiadas))
+            self.assertEqual(self.model.obtener_producto_por_id(1).cantidad, 100 - len(copiadas))
+            copia = sqlite3.connect(backup_file.name)
+            try:
+                self.assertEqual(copia.execute("PRAGMA quick_check").fetchone()[0], "ok")
+                self.assertEqual(copia.execute("SELECT cantidad FROM productos WHERE id = 1").fetchone()[0], 100)
+            finally:
+                copia.close()
+        finally:
+            os.unlink(backup_file.name)
+
+    def test_restore_valida_antes_de_reemplazar(self):
+        """Test bad backups are rejected and leave the live database untouched."""
+        self.model.agregar_producto("Vivo", 1, 1.0, 1)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        carpeta = os.path.dirname(self.test_db.name)
+        antes = set(os.listdir(carpeta))
+
+        basura = os.path.join(tmpdir.name, 'basura.db')
+        with open(basura, 'wb') as f:
+            f.write(b'SQLite format 3\x00' + os.urandom(8192))
+        futura = os.path.join(tmpdir.name, 'futura.db')
+        self.model.backup_database(futura)
+        conn = sqlite3.connect(futura)
+        conn.execute(f"PRAGMA user_version = {InventarioModel.VERSION_ESQUEMA + 1}")
+        conn.close()
+        ajena = os.path.join(tmpdir.name, 'ajena.db')
+        sqlite3.connect(ajena).execute("CREATE TABLE otra (x)").connection.close()
+
+        for ruta in (basura, futura, ajena):
+            with self.assertRaises(ValueError):
+                self.model.restore_database(ruta)
+        self.assertEqual([p.nombre for p in self.model.obtener_productos()], ["Vivo"])
+        self.assertEqual(set(os.listdir(carpeta)), antes)
+
+    def test_restore_rechazado_con_otra_instancia_abierta(self):
+        """Test a restore is refused while another instance has the database open."""
+        self.model.agregar_producto("Respaldado", 1, 1.0, 1)
+        backup = self.test_db.name + '.bak'
+        self.model.backup_database(backup)
+        self.addCleanup(os.unlink, backup)
+        self.model.agregar_producto("Posterior", 1, 1.0, 1)
+        self.model.close()
+        self.model = InventarioModel(self.test_db.name, busy_timeout=100)
+
+        otra = InventarioModel(self.test_db.name)
+        otra.obtener_productos()
+        try:
+            with self.assertRaises(ValueError):
+                self.model.restore_database(backup)
+            otra.agregar_producto("Desde la otra", 1, 1.0, 1)
+            self.assertEqual(len(self.model.obtener_productos()), 3)
+        finally:
+            otra.close()
+
+        self.model.restore_database(backup)
+        self.assertEqual([p.nombre for p in self.model.obtener_productos()], ["Respaldado"])
+        with self.model.conexion() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0].lower(), 'wal')
+
+    def test_restore_en_caliente(self):
+        """Test readers on other threads keep working across a restore."""
+        self.model.agregar_productos_lote((f"Item {i}", i, 1.0, 5) for i in range(100))
+        backup = tempfile.NamedTemporaryFile(suffix='.db.gz', delete=False)
+        backup.close()
+        self.addCleanup(os.unlink, backup.name)
+        self.model.backup_database(backup.name)
+        self.model.agregar_producto("Posterior", 1, 1.0, 1)
+
+        errores = []
+        parar = threading.Event()
+
+        def lector():
+            while not parar.is_set():
+                try:
+                    self.assertIn(len(self.model.obtener_productos()), (100, 101))
+                except Exception as e:
+                    errores.append(e)
+
+        hilo = threading.Thread(target=lector)
+        hilo.start()
+        try:
+            self.model.restore_database(backup.name)
+        finally:
+            parar.set()
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(len(self.model.obtener_productos()), 100)
+        self.assertFalse(self.model.producto_existe("Posterior"))
+
+    def test_backup_comprimido(self):
+        """Test .gz/.xz backups are compressed and restore transparently."""
+        self.model.agregar_productos_lote((f"Item {i} {'x' * 50}", i, 1.0, 5) for i in range(500))
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        plano = os.path.join(tmpdir.name, 'backup.db')
+        self.model.backup_database(plano)
+
+        for extension, firma in (('.gz', b'\x1f\x8b'), ('.xz', b'\xfd7zXZ')):
+            ruta = plano + extension
+            self.model.backup_database(ruta)
+            with open(ruta, 'rb') as f:
+                self.assertEqual(f.read(len(firma)), firma)
+            self.assertLess(os.path.getsize(ruta), os.path.getsize(plano))
+
+            self.model.eliminar_producto(1)
+            self.model.restore_database(ruta)
+            self.assertEqual(len(self.model.obtener_productos()), 500)
+        # Only the finished backups are left behind
+        self.assertEqual(sorted(os.listdir(tmpdir.name)), ['backup.db', 'backup.db.gz', 'backup.db.xz'])
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,282 @@
+"""
+Unit tests for storage backends.
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from inventory_config import Config
+from inventory_model import InventarioModel
+from inventory_storage import MemoryBackend, Producto, StorageBackend, create_backend
+
+
+class TestMemoryBackend(unittest.TestCase):
+    """Test cases for MemoryBackend class."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.backend = MemoryBackend()
+    
+    def test_implements_interface(self):
+        """Test both backends implement the storage interface."""
+        self.assertIsInstance(self.backend, StorageBackend)
+        self.assertTrue(issubclass(InventarioModel, StorageBackend))
+    
+    def test_add_and_get_product(self):
+        """Test adding and retrieving products."""
+        self.backend.agregar_producto("Test Product", 10, 99.99, 5)
+        
+        products = self.backend.obtener_productos()
+        self.assertEqual(products, [Producto(1, "Test Product", 10, 99.99, 5)])
+        self.assertEqual(self.backend.obtener_producto_por_id(1).nombre, "Test Product")
+        self.assertEqual(self.backend.obtener_productos(columnas=('nombre',)), [("Test Product",)])
+    
+    def test_unique_names(self):
+        """Test duplicate names raise IntegrityError like SQLite."""
+        self.backend.agregar_producto("Test Product", 10, 99.99, 5)
+        
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.backend.agregar_producto("TEST PRODUCT", 1, 1.0, 5)
+        self.assertTrue(self.backend.producto_existe("test product"))
+        self.assertFalse(self.backend.producto_existe("test product", 1))
+    
+    def test_statistics(self):
+        """Test incremental statistics after adds, updates and deletes."""
+        self.backend.agregar_producto("Product 1", 10, 100.0, 5)
+        self.backend.agregar_producto("Product 2", 20, 200.0, 15)
+        self.backend.agregar_producto("Product 3", 5, 50.0, 10)
+        self.backend.actualizar_producto(2, "Product 2", 0, 200.0)
+        self.backend.eliminar_producto(1)
+        
+        stats = self.backend.obtener_estadisticas()
+        self.assertEqual(stats['total_productos'], 2)
+        self.assertEqual(stats['valor_total'], 250.0)
+        self.assertEqual(stats['bajo_stock'], 2)
+        self.assertEqual(stats['sin_stock'], 1)
+        self.assertEqual(self.backend.reconstruir_estadisticas(), stats)
+        self.assertEqual([p.id for p in self.backend.obtener_productos_bajo_stock()], [2, 3])
+    
+    def test_transaction_rollback(self):
+        """Test a failing transaction undoes every change, nested ones included."""
+        self.backend.agregar_producto("A", 1, 1.0, 5)
+        
+        with self.assertRaises(ValueError):
+            with self.backend.transaction():
+                self.backend.actualizar_producto(1, "A2", 9, 2.0, 1)
+                with self.backend.transaction():
+                    self.backend.agregar_producto("B", 2, 1.0, 5)
+                self.backend.eliminar_producto(1)
+                raise ValueError("abort")
+        
+        self.assertEqual(self.backend.obtener_productos(), [Producto(1, "A", 1, 1.0, 5)])
+        self.assertEqual(self.backend.obtener_estadisticas()['total_productos'], 1)
+        self.assertEqual(len(self.backend.obtener_movimientos(1)), 1)
+        self.assertFalse(self.backend.producto_existe("B"))
+    
+    def test_pagination_and_search(self):
+        """Test keyset pages and accent-insensitive prefix search."""
+        self.backend.agregar_productos_lote((f"Item {i:02d}", i, 1.0) for i in range(25))
+        self.backend.agregar_producto("Cañón", 1, 1.0, 5)
+        
+        for order_by in ('id', 'nombre'):
+            vistos = []
+            cursor = None
+            while True:
+                page = self.backend.obtener_productos_pagina(cursor, 10, order_by, filtro="item")
+                vistos.extend(p.nombre for p in page['productos'])
+                cursor = page['siguiente']
+                if cursor is None:
+                    break
+            self.assertEqual(vistos, [f"Item {i:02d}" for i in range(25)])
+        
+        self.assertEqual([p.nombre for p in self.backend.buscar_productos("canon")], ["Cañón"])
+        self.assertEqual(len(self.backend.buscar_productos("item", limite=5)), 5)
+    
+    def test_movements_and_stock_as_of(self):
+        """Test the ledger and as-of queries."""
+        self.backend.agregar_producto("Ledger", 0, 1.0, 5)
+        self.backend.registrar_movimientos([
+            (1, 'entrada', 10, "2026-01-01 10:00:00"),
+            (1, 'venta', 4, "2026-01-02 10:00:00"),
+        ])
+        
+        self.assertEqual(self.backend.obtener_producto_por_id(1).cantidad, 6)
+        self.assertEqual(self.backend.stock_a_fecha(1, "2026-01-01 23:59:59"), 10)
+        with self.assertRaises(ValueError):
+            self.backend.registrar_movimientos([(1, 'venta', 1), (99, 'venta', 1)])
+        self.assertEqual(self.backend.obtener_producto_por_id(1).cantidad, 6)
+        with self.assertRaises(ValueError):
+            self.backend.registrar_movimientos([(1, 'entrada', 1)], ubicacion_id=2)
+
+    def test_movements_never_go_negative(self):
+        """Test both backends reject a lote that leaves stock below zero, atomically."""
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        model = InventarioModel(os.path.join(tmpdir.name, 'paridad.db'))
+        self.addCleanup(model.close)
+
+        for backend in (self.backend, model):
+            with self.subTest(backend=type(backend).__name__):
+                backend.agregar_producto("Escaso", 1, 1.0, 1)
+                backend.agregar_producto("Otro", 3, 1.0, 1)
+                with self.assertRaisesRegex(ValueError, "Stock insuficiente"):
+                    backend.registrar_movimientos([(2, 'venta', 1), (1, 'venta', 5)])
+                self.assertEqual([p.cantidad for p in backend.obtener_productos()], [1, 3])
+                self.assertEqual([m[2] for m in backend.obtener_movimientos(2)], ['entrada'])
+                # Only the lote's net effect counts
+                self.assertEqual(backend.registrar_movimientos([(1, 'entrada', 4), (1, 'venta', 5)]), 2)
+                self.assertEqual(backend.obtener_producto_por_id(1).cantidad, 0)
+
+    def test_ubicacion_unica(self):
+        """Test the location API answers for the single default location."""
+        self.backend.agregar_producto("Perno", 4, 2.0, 5)
+        self.backend.agregar_producto("Clavo", 0, 1.0, 5)
+        principal = StorageBackend.UBICACION_PRINCIPAL
+
+        self.assertFalse(self.backend.MULTIPLES_UBICACIONES)
+        self.assertTrue(InventarioModel.MULTIPLES_UBICACIONES)
+        self.assertEqual(self.backend.obtener_ubicaciones(), [(principal, "Principal", 1, 4, 8.0)])
+        self.assertEqual(self.backend.obtener_stock_ubicaciones(1), [(principal, "Principal", 4)])
+        self.assertEqual(self.backend.obtener_stock_ubicaciones(2), [])
+        self.assertEqual([p.id for p in self.backend.obtener_productos_bajo_stock_ubicacion(principal)], [1, 2])
+        self.assertEqual(self.backend.obtener_productos_bajo_stock_ubicacion(2), [])
+        with self.assertRaises(ValueError):
+            self.backend.crear_ubicacion("Bodega")
+        with self.assertRaises(ValueError):
+            self.backend.transferir_stock(1, principal, 2, 1)
+        with self.assertRaises(ValueError):
+            self.backend.ajustar_stock(1, -1, 'venta', ubicacion_id=2)
+        self.assertEqual(self.backend.obtener_producto_por_id(1).cantidad, 4)
+    
+    def test_ajustar_stock(self):
+        """Test relative adjustments are guarded and all-or-nothing."""
+        self.backend.agregar_producto("A", 5, 1.0, 1)
+        self.backend.agregar_producto("B", 1, 1.0, 1)
+        
+        self.assertEqual(self.backend.ajustar_stock(1, -5, 'venta'), 0)
+        with self.assertRaises(ValueError):
+            self.backend.ajustar_stock_lote([(2, 1), (1, -1)])
+        self.assertEqual([p.cantidad for p in self.backend.obtener_productos()], [0, 1])
+        self.assertEqual(self.backend.obtener_movimientos(1)[0][2:4], ('venta', -5))
+
+    def test_upsert_productos_lote(self):
+        """Test upserts match names case-insensitively and skip unchanged rows."""
+        self.backend.agregar_producto("A", 5, 1.0, 1)
+        result = self.backend.upsert_productos_lote([("a", 8, 1.0), ("B", 2, 2.0), ("A", 8, 1.0, 1)])
+
+        self.assertEqual(
+            [result[k] for k in ('insertados', 'actualizados', 'sin_cambios', 'rechazados')],
+            [1, 1, 1, 0]
+        )
+        self.assertEqual([(p.nombre, p.cantidad) for p in self.backend.obtener_productos()], [("A", 8), ("B", 2)])
+        self.assertEqual(self.backend.obtener_movimientos(1)[0][2:4], ('ajuste', 3))
+
+    def test_actualizaciones_por_lote(self):
+        """Test bulk operations select by filter and IDs and reject out-of-range prices whole."""
+        self.backend.agregar_productos_lote([("Perno", 3, 1.0, 1), ("Pasador", 0, 4.0, 1), ("Clavo", 2, 1.0, 1)])
+
+        self.assertEqual(self.backend.actualizar_precios_lote(porcentaje=50, filtro="p"), 2)
+        with self.assertRaises(ValueError):
+            self.backend.actualizar_precios_lote(importe=-2, ids=[1, 2])
+        self.assertEqual([p.precio for p in self.backend.obtener_productos()], [1.5, 6.0, 1.0])
+        self.assertEqual(self.backend.actualizar_stock_minimo_lote(4, ids=[2, 3]), 2)
+        self.assertEqual(self.backend.eliminar_productos_lote(filtro="p", ids=[1, 3]), 1)
+        self.assertEqual([p.nombre for p in self.backend.obtener_productos()], ["Pasador", "Clavo"])
+        self.assertEqual(self.backend.obtener_estadisticas(), self.backend.reconstruir_estadisticas())
+
+    def test_repricing_rounds_like_sqlite(self):
+        """Test both backends round half-cent prices the same way."""
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        model = InventarioModel(os.path.join(tmpdir.name, 'precios.db'))
+        self.addCleanup(model.close)
+
+        for backend in (self.backend, model):
+            backend.agregar_productos_lote([("Medio", 1, 1.0, 1), ("Tercio", 1, 2.5, 1), ("Par", 1, 0.5, 1)])
+            backend.actualizar_precios_lote(importe=0.125, ids=[1, 2, 3])
+        self.assertEqual([p.precio for p in self.backend.obtener_productos()], [1.13, 2.63, 0.63])
+        self.assertEqual(self.backend.obtener_productos(), model.obtener_productos())
+
+    def test_backup_restore_interoperable(self):
+        """Test memory backups are SQLite files either backend can restore."""
+        self.backend.agregar_producto("Backup Test", 15, 75.0, 5)
+        
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        backup = os.path.join(tmpdir.name, 'backup.db')
+        self.backend.backup_database(backup)
+        
+        model = InventarioModel(backup)
+        self.addCleanup(model.close)
+        self.assertEqual(model.obtener_productos()[0].nombre, "Backup Test")
+        self.assertEqual(model.obtener_estadisticas()['valor_total'], 1125.0)
+        
+        model.agregar_producto("From SQLite", 1, 1.0, 5)
+        model.close()
+        restored = MemoryBackend()
+        restored.restore_database(backup)
+        self.assertEqual([p.nombre for p in restored.obtener_productos()], ["Backup Test", "From SQLite"])
+        self.assertEqual(restored.agregar_producto("Next", 1, 1.0, 5), 3)
+
+    def test_restore_no_reutiliza_ids_eliminados(self):
+        """Test a restored memory backend never hands out a deleted product's id."""
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        ruta = os.path.join(tmpdir.name, 'origen.db')
+        model = InventarioModel(ruta)
+        model.agregar_producto("Vivo", 1, 1.0, 1)
+        model.agregar_producto("Borrado", 5, 1.0, 1)
+        model.eliminar_producto(2)
+        model.close()
+
+        self.backend.restore_database(ruta)
+        self.assertEqual([p.nombre for p in self.backend.obtener_productos()], ["Vivo"])
+        nuevo = self.backend.agregar_producto("Nuevo", 2, 1.0, 1)
+        self.assertEqual(nuevo, 3)
+        self.assertEqual([m[3] for m in self.backend.obtener_movimientos(nuevo)], [2])
+
+    def test_backup_comprimido(self):
+        """Test compressed memory backups restore into either backend."""
+        self.backend.agregar_producto("Comprimido", 2, 3.0, 1)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        backup = os.path.join(tmpdir.name, 'backup.db.xz')
+        self.backend.backup_database(backup)
+
+        restored = MemoryBackend()
+        restored.restore_database(backup)
+        self.assertEqual(restored.obtener_productos(), self.backend.obtener_productos())
+        model = InventarioModel(os.path.join(tmpdir.name, 'vivo.db'))
+        self.addCleanup(model.close)
+        model.restore_database(backup)
+        self.assertEqual(model.obtener_productos(), [Producto(1, "Comprimido", 2, 3.0, 1)])
+
+
+class TestCreateBackend(unittest.TestCase):
+    """Test cases for create_backend factory."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_config = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        self.test_config.close()
+        self.config = Config(self.test_config.name)
+    
+    def tearDown(self):
+        """Clean up test environment."""
+        os.unlink(self.test_config.name)
+    
+    def test_memory_backend_selected(self):
+        """Test database.backend = memory selects the in-memory backend."""
+        self.config.set("database", "backend", "memory")
+        self.assertIsInstance(create_backend(self.config), MemoryBackend)
+    
+    def test_unknown_backend(self):
+        """Test an unknown backend name is rejected."""
+        self.config.set("database", "backend", "cassandra")
+        with self.assertRaises(ValueError):
+            create_backend(self.config)
+
+
+if __name__ == '__main__':
+    unittest.main()
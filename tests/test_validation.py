@@ -82,6 +82,15 @@ class TestProductValidator(unittest.TestCase):
         
         self.assertTrue(result.is_valid)
         self.assertEqual(len(result.errors), 0)
+    
+    def test_validate_delta(self):
+        """Test stock adjustments must be signed integers within range."""
+        self.assertEqual(self.validator.validate_delta(-5), [])
+        self.assertEqual(self.validator.validate_delta(" 3 "), [])
+        self.assertIn("obligatorio", self.validator.validate_delta(None)[0])
+        self.assertIn("entero", self.validator.validate_delta("abc")[0])
+        self.assertIn("entero", self.validator.validate_delta(1.5)[0])
+        self.assertIn("exceder", self.validator.validate_delta(-1000000)[0])
 
 
 class TestDatabaseValidator(unittest.TestCase):